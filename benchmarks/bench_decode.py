@@ -0,0 +1,34 @@
+# Benchmark - received packet decoder
+# Compare the structured packet decoder against the legacy string scan
+# Run from the repository root: python benchmarks/bench_decode.py
+import os
+import sys
+import timeit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import makeTextPacket
+from meshpacket import decodeTextPacket
+from meshpacket import scanTextPacketLegacy
+
+def main():
+    number = 20000
+    packet = makeTextPacket()
+
+    # Legacy path includes the str() conversion of the packet
+    legacy = timeit.timeit(lambda: scanTextPacketLegacy(str(f"{packet}")), number=number)
+    structured = timeit.timeit(lambda: decodeTextPacket(packet), number=number)
+
+    # Missing fields fallback path
+    sparse = {'from': 2729235412, 'decoded': {'portnum': 'TEXT_MESSAGE_APP', 'payload': b'hi'}}
+    fallback = timeit.timeit(lambda: decodeTextPacket(sparse), number=number)
+
+    print ("Legacy string scan   : %10.0f ops/sec" % (number / legacy))
+    print ("Structured decoder   : %10.0f ops/sec" % (number / structured))
+    print ("Fallback decoder     : %10.0f ops/sec" % (number / fallback))
+    print ("Speed up             : %10.1fx" % (legacy / structured))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# Benchmark - packet capture replay
+# Feed a packet capture (see the CAPTURE macro) through the gateway onReceive
+# and the mesh nodes update path, in process, with a local node red TCP server
+# receiving the text messages, and report the throughput, the onReceive latency
+# and the end to end latency from the packet feed to the node red delivery
+# Compare against the stored baseline, exit 1 if a figure regress beyond the threshold
+# Run from the repository root:
+#   python benchmarks/bench_replay.py capture.gz                        # maximum speed
+#   python benchmarks/bench_replay.py capture.gz --speed 10             # ten times the recorded pace
+#   python benchmarks/bench_replay.py capture.gz --macros NODEEVENTS    # extra gateway macros
+#   python benchmarks/bench_replay.py capture.gz --save-baseline        # store the new baseline
+#   python benchmarks/bench_replay.py capture.gz --simulate 3600        # record one hour of simulated traffic first
+import argparse
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(REPO_DIR, 'benchmarks', 'replay_baseline.json')
+sys.path.insert(0, REPO_DIR)
+
+from meshcapture import CaptureWriter
+from meshcapture import ReplayDriver
+from meshcapture import updateInterfaceNodes
+from meshcapture import percentile
+
+# Simulated traffic speed while recording
+SIMULATE_SPEED = 1000.0
+
+# Local node red TCP server, record the arrival time of each delimited message
+class SinkServer(object):
+    def __init__(self, delimiter=b'\n'):
+        self.delimiter = delimiter
+        self.arrivals = []
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read, args=(conn, ), daemon=True).start()
+
+    def _read(self, conn):
+        buffer = b''
+        while True:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            now = time.perf_counter()
+            buffer += data
+            count = buffer.count(self.delimiter)
+            if count > 0:
+                buffer = buffer[buffer.rfind(self.delimiter) + len(self.delimiter):]
+                self.arrivals.extend([now] * count)
+
+    def close(self):
+        self.sock.close()
+
+# Get a free local TCP port
+def freePort():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+# Write a settings module for the benchmark gateway
+def writeSettings(settingsDir, portRxMsg):
+    with open(os.path.join(settingsDir, 'settings.py'), 'w') as settingsFile:
+        settingsFile.write("localip = '127.0.0.1'\n")
+        settingsFile.write("portrxmesh = %d\n" % (freePort()))
+        settingsFile.write("portrxmsg = %d\n" % (portRxMsg))
+        settingsFile.write("portserver = %d\n" % (freePort()))
+        settingsFile.write("outqueuesize = 1000000\n")
+        settingsFile.write("spoolpath = ''\n")
+        settingsFile.write("msghistorypath = ''\n")
+        settingsFile.write("loglevel = 'ERROR'\n")
+
+# Record simulated traffic as a capture, simSec [s] of mesh time
+def recordSimulated(path, simSec, nodeCount, seed):
+    from meshsim import SimInterface
+
+    if os.path.exists(path):
+        os.remove(path)
+    writer = CaptureWriter(path)
+    simStart = time.time()
+
+    def publish(topic, packet=None, interface=None):
+        # Capture time follow the simulated pace
+        if packet != None:
+            writer.write(packet, simStart + (time.time() - simStart) * SIMULATE_SPEED)
+
+    sim = SimInterface(nodeCount, textRate=0.05 * nodeCount / 20.0, speed=SIMULATE_SPEED, seed=seed, publish=publish)
+    time.sleep(simSec / SIMULATE_SPEED)
+    sim.close()
+    writer.flush()
+    print("Recorded %d simulated packets to %s" % (writer.written, path))
+
+# Replay the capture through the gateway, return the report dictionary
+def replay(capturePath, speed, macros, timeout):
+    settingsDir = tempfile.mkdtemp()
+    sink = SinkServer()
+    writeSettings(settingsDir, sink.port)
+
+    # The gateway read its macros and settings at import
+    sys.argv = [sys.argv[0]] + macros
+    sys.path.insert(0, settingsDir)
+    try:
+        import lorameshgw
+        from meshnodes import ingestInterfaceNodes
+        from msghistory import MessageHistory
+        from nodetable import formatNodesTable
+        from nodetable import parseNodesTable
+
+        lorameshgw.messageHistory = MessageHistory()
+        threading.Thread(target=lorameshgw.thread_outbound_NodeRed, args=(1, ), daemon=True).start()
+
+        nodes = {}
+        feedTimes = []
+        state = {'lastPoll' : None}
+
+        def handler(packet):
+            updateInterfaceNodes(nodes, packet)
+
+            # Mesh nodes poll, every nodePollSec of capture time
+            rxTime = packet.get('rxTime') or 0
+            if state['lastPoll'] == None or rxTime - state['lastPoll'] >= lorameshgw.nodePollSec:
+                if lorameshgw.nodeTableParse == True:
+                    parseNodesTable(formatNodesTable(list(nodes.values())), lorameshgw.meshNodeRegistry)
+                else:
+                    ingestInterfaceNodes(lorameshgw.meshNodeRegistry, nodes)
+                state['lastPoll'] = rxTime
+
+            # Every text message queued for node red by this packet
+            enqueued = lorameshgw.outQueue.enqueued
+            fedAt = time.perf_counter()
+            lorameshgw.onReceive(packet, None)
+            feedTimes.extend([fedAt] * (lorameshgw.outQueue.enqueued - enqueued))
+
+        # Keep the recorded receive time, the nodes poll follow the capture time
+        report = ReplayDriver(capturePath, handler, speed, retime=False).run()
+
+        # Wait for the node red delivery of the queued text messages
+        deadline = time.monotonic() + timeout
+        while len(sink.arrivals) < len(feedTimes) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        report['queued'] = len(feedTimes)
+        report['delivered'] = len(sink.arrivals)
+        report['dropped'] = lorameshgw.outQueue.dropped
+        report['e2eP50Ms'] = None
+        report['e2eP99Ms'] = None
+
+        # Node red delivery keep the queue order, match the arrivals to the feeds
+        if report['dropped'] == 0 and len(feedTimes) > 0:
+            e2e = sorted([arrival - fedAt for (arrival, fedAt) in zip(sink.arrivals, feedTimes)])
+            if len(e2e) > 0:
+                report['e2eP50Ms'] = round(percentile(e2e, 50) * 1000, 3)
+                report['e2eP99Ms'] = round(percentile(e2e, 99) * 1000, 3)
+        return report
+    finally:
+        sink.close()
+        shutil.rmtree(settingsDir, ignore_errors=True)
+
+# Compare against the baseline, return list of regression text
+def compareBaseline(results, baseline, threshold):
+    regressions = []
+    if results.get('packetsPerSec') and baseline.get('packetsPerSec'):
+        if results['packetsPerSec'] < baseline['packetsPerSec'] * (1.0 - threshold):
+            regressions.append("packetsPerSec %.1f below the baseline %.1f by more than %d%%" % \
+                               (results['packetsPerSec'], baseline['packetsPerSec'], threshold * 100))
+
+    for key in ('latencyP99Ms', 'e2eP99Ms'):
+        if results.get(key) == None or baseline.get(key) == None:
+            continue
+        if results[key] > baseline[key] * (1.0 + threshold):
+            regressions.append("%s %.3f exceed the baseline %.3f by more than %d%%" % (key, results[key], baseline[key], threshold * 100))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Packet capture replay benchmark')
+    parser.add_argument('capture', help='capture file, gzip compressed if ending with .gz')
+    parser.add_argument('--speed', type=float, default=0.0, help='replay pace multiplier, 0 - maximum speed')
+    parser.add_argument('--macros', nargs='*', default=[], help='gateway macros, e.g. NODEEVENTS')
+    parser.add_argument('--timeout', type=float, default=10.0, help='node red delivery wait after the replay [s]')
+    parser.add_argument('--simulate', type=float, default=0.0, help='first record this much simulated traffic [s] to the capture file')
+    parser.add_argument('--sim-nodes', type=int, default=50)
+    parser.add_argument('--sim-seed', type=int, default=1)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed regression ratio')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.simulate > 0:
+        recordSimulated(args.capture, args.simulate, args.sim_nodes, args.sim_seed)
+
+    results = replay(args.capture, args.speed, args.macros, args.timeout)
+    for key in sorted(results.keys()):
+        print("%-15s %s" % (key + ':', 'n/a' if results[key] == None else results[key]))
+
+    # Baseline per capture, macros and speed
+    baselineKey = '%s %s x%s' % (os.path.basename(args.capture), ' '.join(args.macros), args.speed)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+
+    if args.save_baseline:
+        baseline[baselineKey] = results
+        with open(args.baseline, 'w') as baselineFile:
+            json.dump(baseline, baselineFile, indent=2, sort_keys=True)
+        print("Baseline saved to %s" % (args.baseline))
+        return 0
+
+    regressions = compareBaseline(results, baseline.get(baselineKey, {}), args.threshold)
+    for text in regressions:
+        print("REGRESSION: %s" % (text))
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# Load test - REST API
+# Hammer one REST API endpoint with persistent HTTP/1.1 connections and report
+# the requests/sec and latency percentiles
+# Start the gateway first, once with the flask development server and once with
+# the production WSGI server ('WSGI' macro), then compare:
+#   python benchmarks/bench_rest.py --url http://127.0.0.1:9000/meshnodesinfo
+#   python benchmarks/bench_rest.py --url http://127.0.0.1:9000/meshnodesinfo --clients 32 --duration 20
+import argparse
+import http.client
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+# One client thread, send requests back to back on one connection until the deadline
+def runClient(url, deadline, headers, results):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+
+    latencies = []
+    errors = 0
+    conn = None
+
+    while time.monotonic() < deadline:
+        # (Re)connect, the server may close the connection (e.g. HTTP/1.0 or keep alive limit)
+        if conn == None:
+            if parts.scheme == 'https':
+                conn = http.client.HTTPSConnection(parts.hostname, parts.port or 443, timeout=10, context=ssl._create_unverified_context())
+            else:
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = None
+            continue
+        latencies.append(time.perf_counter() - start)
+
+    if conn != None:
+        conn.close()
+    results.append((latencies, errors))
+
+# Latency percentile [ms]
+def percentile(sortedValues, pct):
+    if len(sortedValues) == 0:
+        return 0.0
+    return sortedValues[min(int(len(sortedValues) * pct / 100.0), len(sortedValues) - 1)] * 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description='REST API load test')
+    parser.add_argument('--url', default='http://127.0.0.1:9000/meshnodesinfo')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent connections')
+    parser.add_argument('--duration', type=float, default=10.0, help='test duration [s]')
+    parser.add_argument('--gzip', action='store_true', help='send Accept-Encoding: gzip')
+    args = parser.parse_args()
+
+    headers = {'Accept-Encoding' : 'gzip'} if args.gzip else {}
+    results = []
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=runClient, args=(args.url, deadline, headers, results)) for n in range(args.clients)]
+
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies = sorted([latency for (clientLatencies, errors) in results for latency in clientLatencies])
+    errors = sum([errors for (clientLatencies, errors) in results])
+
+    print("URL:          %s" % (args.url))
+    print("Clients:      %d, duration %.1fs" % (args.clients, elapsed))
+    print("Requests:     %d, errors %d" % (len(latencies), errors))
+    print("Requests/sec: %.1f" % (len(latencies) / elapsed))
+    print("Latency [ms]: p50 %.2f, p90 %.2f, p99 %.2f, max %.2f" % \
+          (percentile(latencies, 50), percentile(latencies, 90), percentile(latencies, 99), percentile(latencies, 100)))
+
+if __name__ == "__main__":
+    main()
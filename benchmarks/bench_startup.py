@@ -0,0 +1,179 @@
+# Benchmark - gateway start up
+# Measure, each in a fresh interpreter:
+#   - import time and peak RSS of the lorameshgw module (pandas must NOT be loaded)
+#   - time until the REST API accept connections
+#   - time until the first mesh nodes snapshot reach the node red TCP server port
+# The gateway run on the simulated mesh by default (SIMULATOR macro), no radio needed
+# Compare against the stored baseline, exit 1 if a figure regress beyond the threshold
+# Run from the repository root:
+#   python benchmarks/bench_startup.py                       # measure and compare
+#   python benchmarks/bench_startup.py --save-baseline       # store the new baseline
+#   python benchmarks/bench_startup.py --macros SIMULATOR NODEEVENTS   # other gateway macros
+#   python benchmarks/bench_startup.py --macros              # serial radio attached
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(REPO_DIR, 'benchmarks', 'startup_baseline.json')
+
+# REST API port of the gateway
+REST_PORT = 9000
+
+# Import measurement, run in a fresh interpreter
+IMPORT_CODE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import lorameshgw
+importSec = time.perf_counter() - start
+print(json.dumps({'importSec' : importSec,
+                  'maxRssMb' : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+                  'pandasLoaded' : 'pandas' in sys.modules}))
+'''
+
+# Get a free local TCP port
+def freePort():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+# Write a settings module for the benchmark gateway
+def writeSettings(settingsDir, portRxMesh, portRxMsg, portServer):
+    with open(os.path.join(settingsDir, 'settings.py'), 'w') as settingsFile:
+        settingsFile.write("localip = '127.0.0.1'\n")
+        settingsFile.write("portrxmesh = %d\n" % (portRxMesh))
+        settingsFile.write("portrxmsg = %d\n" % (portRxMsg))
+        settingsFile.write("portserver = %d\n" % (portServer))
+        settingsFile.write("spoolpath = ''\n")
+        settingsFile.write("msghistorypath = ''\n")
+        # Same simulated mesh every run
+        settingsFile.write("simnodes = 20\n")
+        settingsFile.write("simseed = 1\n")
+
+def benchEnv(settingsDir):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([REPO_DIR, settingsDir, env.get('PYTHONPATH', '')])
+    return env
+
+# Measure the module import
+def measureImport(settingsDir):
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_CODE], env=benchEnv(settingsDir), cwd=settingsDir)
+    return json.loads(output.decode().strip().split('\n')[-1])
+
+# Measure the time to the REST API and to the first mesh nodes snapshot
+def measureRun(settingsDir, meshSink, macros, timeout):
+    result = {'restReadySec' : None, 'firstSnapshotSec' : None}
+
+    start = time.monotonic()
+    proc = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, 'lorameshgw.py')] + macros, env=benchEnv(settingsDir), cwd=settingsDir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    meshSink.settimeout(0.01)
+    conn = None
+
+    try:
+        while time.monotonic() - start < timeout and (result['restReadySec'] == None or result['firstSnapshotSec'] == None):
+            if proc.poll() != None:
+                break
+
+            # REST API accept connections
+            if result['restReadySec'] == None:
+                try:
+                    socket.create_connection(('127.0.0.1', REST_PORT), timeout=0.05).close()
+                    result['restReadySec'] = time.monotonic() - start
+                except OSError:
+                    pass
+
+            # First mesh nodes data on the node red TCP server port
+            if result['firstSnapshotSec'] == None:
+                try:
+                    if conn == None:
+                        conn, addr = meshSink.accept()
+                        conn.settimeout(0.01)
+                    if conn.recv(65536):
+                        result['firstSnapshotSec'] = time.monotonic() - start
+                except OSError:
+                    pass
+
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        if conn != None:
+            conn.close()
+
+    return result
+
+# Compare against the baseline, return list of regression text
+def compareBaseline(results, baseline, threshold):
+    regressions = []
+    if results.get('pandasLoaded'):
+        regressions.append("pandas loaded at import")
+
+    for key in ('importSec', 'maxRssMb', 'restReadySec', 'firstSnapshotSec'):
+        if results.get(key) == None or baseline.get(key) == None:
+            continue
+        limit = baseline[key] * (1.0 + threshold)
+        if results[key] > limit:
+            regressions.append("%s %.3f exceed the baseline %.3f by more than %d%%" % (key, results[key], baseline[key], threshold * 100))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Gateway start up benchmark')
+    parser.add_argument('--macros', nargs='*', default=['SIMULATOR'], help='gateway macros, default SIMULATOR')
+    parser.add_argument('--repeat', type=int, default=3, help='import measurement repeat, best one kept')
+    parser.add_argument('--timeout', type=float, default=30.0, help='gateway run timeout [s]')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed regression ratio')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    settingsDir = tempfile.mkdtemp()
+    meshSink = socket.socket()
+    meshSink.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    meshSink.bind(('127.0.0.1', 0))
+    meshSink.listen(4)
+    writeSettings(settingsDir, meshSink.getsockname()[1], freePort(), freePort())
+
+    try:
+        imports = [measureImport(settingsDir) for n in range(args.repeat)]
+        results = min(imports, key=lambda result: result['importSec'])
+        results.update(measureRun(settingsDir, meshSink, args.macros, args.timeout))
+    finally:
+        meshSink.close()
+        shutil.rmtree(settingsDir, ignore_errors=True)
+
+    for key in ('importSec', 'maxRssMb', 'restReadySec', 'firstSnapshotSec'):
+        value = results.get(key)
+        print("%-17s %s" % (key + ':', 'n/a' if value == None else '%.3f' % (value)))
+    print("%-17s %s" % ('pandasLoaded:', results['pandasLoaded']))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baselineFile:
+            json.dump(results, baselineFile, indent=2, sort_keys=True)
+            baselineFile.write('\n')
+        print("Baseline saved to %s" % (args.baseline))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+
+    regressions = compareBaseline(results, baseline, args.threshold)
+    for text in regressions:
+        print("REGRESSION: %s" % (text))
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+# Offline benchmark suite
+# Measure the packet decoding, the mesh nodes ingestion (structured and legacy
+# showNodes() table scraping), the node red string building and the REST API
+# serialization on 10, 100 and 1000 node fixtures, no radio needed
+# Report ops/sec and the peak memory allocated by one operation, and compare
+# against the stored baseline JSON
+# Run from the repository root:
+#   python benchmarks/bench_suite.py                    # run and compare
+#   python benchmarks/bench_suite.py --filter nodered   # only the matching benchmarks
+#   python benchmarks/bench_suite.py --save-baseline    # store the new baseline
+#   python benchmarks/bench_suite.py --check            # exit 1 on regression
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import makeInterfaceNodes
+from fixtures import makeShowNodesTable
+from fixtures import makeTextPacket
+from fixtures import makePositionPacket
+
+from meshpacket import decodeTextPacket
+from meshpacket import scanTextPacketLegacy
+from meshnodes import MeshNodeRegistry
+from meshnodes import NodesInfoCache
+from meshnodes import ingestInterfaceNodes
+from meshnodes import applyNodePacket
+from nodered import formatNodeSnapshot
+from nodered import formatNodeDelta
+from nodetable import parseNodesTable
+
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Fixture sizes [nodes]
+NODE_COUNTS = (10, 100, 1000)
+
+# Check whether pandas are available for the legacy table benchmarks
+def havePandas():
+    try:
+        import pandas
+        return True
+    except ImportError:
+        return False
+
+# Run the operation for at least minTime [s], return ops/sec
+def measureOps(op, minTime, maxOps):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for n in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= minTime or number >= maxOps:
+            return number / elapsed
+        number = min(max(number * 2, int(number * minTime / max(elapsed, 1e-6))), maxOps)
+
+# Peak memory allocated by one operation [bytes]
+def measureAlloc(op):
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        op()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+# Registry filled with the interface nodes fixture
+def makeRegistry(count):
+    registry = MeshNodeRegistry()
+    ingestInterfaceNodes(registry, makeInterfaceNodes(count))
+    return registry
+
+# Build the benchmark list of (name, operation, max ops)
+def buildBenchmarks():
+    benchmarks = []
+
+    # Received packet decoding
+    packet = makeTextPacket()
+    packetText = str(packet)
+
+    # Both decoders must agree on the fixture, else the legacy timing measure a failed scan
+    decoded = decodeTextPacket(packet)
+    legacyDecoded = scanTextPacketLegacy(packetText)
+    assert legacyDecoded == (decoded.text, str(decoded.rxTime), decoded.senderId), \
+        "legacy decoder %s disagree with the structured decoder %s" % (legacyDecoded, decoded)
+    benchmarks.append(('decode.legacy_scan', lambda: scanTextPacketLegacy(packetText), 100000))
+    benchmarks.append(('decode.structured', lambda: decodeTextPacket(packet), 1000000))
+
+    # Node packet applied to the registry (NODEEVENTS mode)
+    positionPacket = makePositionPacket()
+    eventRegistry = makeRegistry(100)
+    benchmarks.append(('nodes.apply_packet', lambda: applyNodePacket(eventRegistry, positionPacket), 1000000))
+
+    for count in NODE_COUNTS:
+        interfaceNodes = makeInterfaceNodes(count)
+        registry = makeRegistry(count)
+
+        # Structured ingestion, first poll (every node converted) and steady state (nothing changed)
+        benchmarks.append(('nodes.ingest_first.%d' % (count), lambda nodes=interfaceNodes: ingestInterfaceNodes(MeshNodeRegistry(), nodes), 10000))
+        benchmarks.append(('nodes.ingest_unchanged.%d' % (count), lambda nodes=interfaceNodes, reg=registry: ingestInterfaceNodes(reg, nodes), 100000))
+
+        # Legacy showNodes() table scraping, quadratic in the node count
+        if havePandas():
+            table = makeShowNodesTable(count)
+            benchmarks.append(('nodes.parse_table.%d' % (count), lambda table=table: parseNodesTable(table, MeshNodeRegistry()), 20 if count < 1000 else 1))
+
+        # Node red TCP client string building
+        benchmarks.append(('nodered.snapshot.%d' % (count), lambda reg=registry: formatNodeSnapshot(reg.legacyList()), 10000))
+
+        # One node heard again since the last push
+        def delta(reg=registry, record=registry.records()[0]):
+            version = reg.version
+            reg.update(record.nodeId, lastHeard=record.lastHeard + 1)
+            upserts, removedIds, pushVersion = reg.changesSince(version)
+            return formatNodeDelta(upserts, removedIds)
+        benchmarks.append(('nodered.delta.%d' % (count), delta, 100000))
+
+        # '/meshnodesinfo' serialization, uncached (jsonify of the legacy list) and cached
+        benchmarks.append(('rest.meshnodesinfo_build.%d' % (count), lambda reg=registry: json.dumps({'MeshNodesInfo' : reg.legacyList()}, sort_keys=True), 10000))
+        cache = NodesInfoCache(registry)
+        now = time.time()
+        cache.get(now)
+        benchmarks.append(('rest.meshnodesinfo_cached.%d' % (count), lambda cache=cache, now=now: cache.get(now), 1000000))
+
+    return benchmarks
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite')
+    parser.add_argument('--filter', default='', help='only run the benchmarks whose name contain this text')
+    parser.add_argument('--min-time', type=float, default=0.5, help='minimum run time per benchmark [s]')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed ops/sec regression ratio')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit 1 if a benchmark regress beyond the threshold')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+
+    if not havePandas():
+        print("pandas not installed, legacy table benchmarks skipped")
+
+    results = {}
+    regressions = []
+    print("%-36s %14s %14s %10s" % ('Benchmark', 'ops/sec', 'peak B/op', 'vs base'))
+    for (name, op, maxOps) in buildBenchmarks():
+        if args.filter not in name:
+            continue
+
+        opsPerSec = measureOps(op, args.min_time, maxOps)
+        peakAlloc = measureAlloc(op)
+        results[name] = {'opsPerSec' : round(opsPerSec, 1), 'peakAllocBytes' : peakAlloc}
+
+        change = ''
+        if name in baseline:
+            ratio = opsPerSec / baseline[name]['opsPerSec']
+            change = '%+.0f%%' % ((ratio - 1.0) * 100)
+            if ratio < 1.0 - args.threshold:
+                regressions.append(name)
+                change += ' !'
+        print("%-36s %14.1f %14d %10s" % (name, opsPerSec, peakAlloc, change))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baselineFile:
+            json.dump(baseline, baselineFile, indent=2, sort_keys=True)
+            baselineFile.write('\n')
+        print("Baseline saved to %s" % (args.baseline))
+
+    for name in regressions:
+        print("REGRESSION: %s" % (name))
+    if args.check and len(regressions) > 0:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Benchmark fixtures
+# Deterministic mesh data for the offline benchmarks: received packet
+# dictionaries, meshtastic interface.nodes dictionaries and showNodes()
+# fancy grid tables, generated from a fixed random seed
+import random
+
+from nodetable import formatNodesTable
+
+# Fixture reference time, fixed so the tables are identical between runs
+FIXTURE_NOW = 1697500000
+
+# Generate the mesh nodes, list of interface.nodes style dictionaries
+def makeNodes(count, seed=1):
+    rng = random.Random(seed)
+    nodes = []
+    for n in range(count):
+        nodeNum = 0xa2000000 + n * 7919
+        node = {
+            'num' : nodeNum,
+            'user' : {
+                'id' : '!%08x' % (nodeNum),
+                'longName' : 'Field Node %d' % (n + 1),
+                'shortName' : 'F%03d' % (n % 1000),
+                'hwModel' : 'TBEAM',
+            },
+            'snr' : round(rng.uniform(-15.0, 12.0), 2),
+            'lastHeard' : FIXTURE_NOW - rng.randint(0, 86400),
+        }
+        # Some nodes never reported a position or metrics
+        if rng.random() < 0.9:
+            node['position'] = {
+                'latitude' : round(rng.uniform(1.0, 6.5), 7),
+                'longitude' : round(rng.uniform(100.0, 119.0), 7),
+                'altitude' : rng.randint(0, 900),
+            }
+        if rng.random() < 0.8:
+            node['deviceMetrics'] = {'batteryLevel' : rng.randint(5, 100)}
+        nodes.append(node)
+    return nodes
+
+# interface.nodes dictionary, keyed by node ID
+def makeInterfaceNodes(count, seed=1):
+    return dict([(node['user']['id'], node) for node in makeNodes(count, seed)])
+
+# showNodes() output, tabulate 'fancy_grid' table
+def makeShowNodesTable(count, seed=1):
+    return formatNodesTable(makeNodes(count, seed), FIXTURE_NOW)
+
+# Raw MeshPacket of a received text message, str() give the protobuf text format
+# scanned by the legacy decoder, shared by every decode benchmark
+class RawMeshPacket(object):
+    def __init__(self, fromNum, text, packetId):
+        self.fromNum = fromNum
+        self.text = text
+        self.packetId = packetId
+
+    def __str__(self):
+        return ('from: %d\nto: 4294967295\ndecoded {\n  portnum: TEXT_MESSAGE_APP\n'
+                '  payload: "%s"\n}\nid: %d\nrx_time: %d\n'
+                'rx_snr: 6.25\nhop_limit: 3\nrx_rssi: -42\n') % (self.fromNum, self.text, self.packetId, FIXTURE_NOW)
+
+    # Packet dictionary string representation use repr() of the values
+    __repr__ = __str__
+
+# Received text message packet dictionary
+def makeTextPacket(fromNum=0xa2ac7cd4, text='Hello from the field gateway', packetId=1790512345):
+    return {
+        'from' : fromNum,
+        'to' : 4294967295,
+        'decoded' : {
+            'portnum' : 'TEXT_MESSAGE_APP',
+            'payload' : text.encode(),
+            'text' : text,
+        },
+        'id' : packetId,
+        'rxTime' : FIXTURE_NOW,
+        'rxSnr' : 6.25,
+        'hopLimit' : 3,
+        'rxRssi' : -42,
+        'raw' : RawMeshPacket(fromNum, text, packetId),
+        'fromId' : '!%08x' % (fromNum),
+        'toId' : '^all',
+    }
+
+# Received position packet dictionary
+def makePositionPacket(fromNum=0xa2ac7cd4, latitude=3.1234567, longitude=101.6543210):
+    return {
+        'from' : fromNum,
+        'to' : 4294967295,
+        'decoded' : {
+            'portnum' : 'POSITION_APP',
+            'position' : {'latitude' : latitude, 'longitude' : longitude, 'altitude' : 42, 'time' : FIXTURE_NOW},
+        },
+        'id' : 1790512346,
+        'rxTime' : FIXTURE_NOW,
+        'rxSnr' : 4.5,
+        'hopLimit' : 3,
+        'fromId' : '!%08x' % (fromNum),
+        'toId' : '^all',
+    }
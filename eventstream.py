@@ -0,0 +1,160 @@
+# Live event stream for the '/stream' REST API (server sent events)
+# Node upserts, node removals and received text messages are published to every
+# subscriber through its own bounded buffer, a subscriber which can not keep up
+# is disconnected instead of slowing down the publishers
+import collections
+import json
+import threading
+
+# Event types
+EVENT_NODE = 'node'
+EVENT_REMOVE = 'remove'
+EVENT_MESSAGE = 'message'
+EVENT_SNAPSHOT = 'snapshot'
+EVENT_TYPES = (EVENT_NODE, EVENT_REMOVE, EVENT_MESSAGE)
+
+# Format one server sent event
+def formatEvent(eventType, data, eventId=None):
+    text = ''
+    if eventId != None:
+        text += 'id: %s\n' % (eventId)
+    return text + 'event: %s\ndata: %s\n\n' % (eventType, json.dumps(data, separators=(',', ':')))
+
+# One stream subscriber with its filters and bounded buffer
+class StreamSubscriber(object):
+    def __init__(self, nodeIds=None, eventTypes=None, maxBuffer=256):
+        self.nodeIds = set(nodeIds) if nodeIds else None
+        self.eventTypes = set(eventTypes) if eventTypes else None
+        self.maxBuffer = maxBuffer
+
+        self._events = collections.deque()
+        self._cond = threading.Condition()
+        self.closed = False
+        self.overflowed = False
+
+        # Subscriber counters
+        self.sent = 0
+
+    # Check the subscriber filters
+    def wants(self, eventType, nodeId):
+        if self.eventTypes != None and eventType not in self.eventTypes:
+            return False
+        if self.nodeIds != None and nodeId != None and nodeId not in self.nodeIds:
+            return False
+        return True
+
+    # Buffer one formatted event, close the subscriber if the buffer are full
+    def push(self, text):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._events) >= self.maxBuffer:
+                self.overflowed = True
+                self.closed = True
+            else:
+                self._events.append(text)
+            self._cond.notify_all()
+
+    # Take the buffered events, wait up to the timeout
+    # Return list of formatted events, empty on timeout
+    def take(self, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._events) > 0 or self.closed, timeout)
+            events = list(self._events)
+            self._events.clear()
+            self.sent += len(events)
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+# Event broker, fan out every published event to the matching subscribers
+class EventBroker(object):
+    def __init__(self, maxBuffer=256, maxSubscribers=64):
+        self.maxBuffer = maxBuffer
+        self.maxSubscribers = maxSubscribers
+
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._eventId = 0
+
+        # Broker counters
+        self.published = 0
+        self.slowDisconnects = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    # Register a new subscriber, return None if the subscriber limit reached
+    def subscribe(self, nodeIds=None, eventTypes=None):
+        with self._lock:
+            if len(self._subscribers) >= self.maxSubscribers:
+                return None
+            subscriber = StreamSubscriber(nodeIds, eventTypes, self.maxBuffer)
+            self._subscribers.append(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+                if subscriber.overflowed:
+                    self.slowDisconnects += 1
+
+    # Publish one event, the event are formatted once for every subscriber
+    def publish(self, eventType, data, nodeId=None):
+        subscribers = self._subscribers
+        if len(subscribers) == 0:
+            return
+
+        with self._lock:
+            self._eventId += 1
+            eventId = self._eventId
+        text = None
+        for subscriber in list(subscribers):
+            if subscriber.wants(eventType, nodeId):
+                if text == None:
+                    text = formatEvent(eventType, data, eventId)
+                subscriber.push(text)
+        self.published += 1
+
+    def stats(self):
+        return {
+            'subscribers' : len(self._subscribers),
+            'maxSubscribers' : self.maxSubscribers,
+            'maxBuffer' : self.maxBuffer,
+            'published' : self.published,
+            'slowDisconnects' : self.slowDisconnects,
+        }
+
+# Publish the mesh nodes registry changes as node and remove events
+# Called on every nodes change notification, keep the published registry version
+# and node ID, removed nodes are found by difference so the node red delta
+# delivery can forget the registry removals independently
+class NodeEventPump(object):
+    def __init__(self, registry, broker):
+        self.registry = registry
+        self.broker = broker
+        self._version = 0
+        self._knownIds = set()
+
+    def pump(self):
+        with self.registry._lock:
+            currentIds = set([record.nodeId for record in self.registry.records()])
+            # No subscriber, only keep track of the registry
+            if len(self.broker) == 0:
+                self._version = self.registry.version
+                self._knownIds = currentIds
+                return
+            upserts, removedIds, version = self.registry.changesSince(self._version)
+
+        for node in upserts:
+            self.broker.publish(EVENT_NODE, node, node['ID'])
+        for nodeId in self._knownIds - currentIds:
+            self.broker.publish(EVENT_REMOVE, {'ID' : nodeId}, nodeId)
+
+        self._version = version
+        self._knownIds = currentIds
@@ -0,0 +1,52 @@
+# Gateway logging pipeline
+# Every logging call only put the record on a bounded queue, one listener
+# thread format the records and write them to the log file or stdout, so the
+# meshtastic reader and parser threads never block on the console or the disk
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Log record format
+LOG_FORMAT = '%(asctime)s %(levelname)-8s %(message)s'
+
+# Queue handler which never block the caller
+# Records are handed over unformatted, the listener thread do the formatting,
+# records are dropped (and counted) if the listener can not keep up
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, logQueue):
+        logging.handlers.QueueHandler.__init__(self, logQueue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Exception traceback can not be formatted later, format it now
+        if record.exc_info:
+            return logging.handlers.QueueHandler.prepare(self, record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# Setup the logging pipeline once at start up
+# logFile - rotated every midnight, None - write to stdout
+# Return the queue listener, already started
+def setupLogging(logFile=None, level=logging.INFO, maxQueue=10000):
+    if logFile != None:
+        handler = logging.handlers.TimedRotatingFileHandler(logFile, when="midnight", backupCount=3)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logQueue = queue.Queue(maxQueue)
+    root = logging.getLogger()
+    for oldHandler in list(root.handlers):
+        root.removeHandler(oldHandler)
+    root.addHandler(NonBlockingQueueHandler(logQueue))
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(logQueue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
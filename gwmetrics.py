@@ -0,0 +1,139 @@
+# Gateway metrics in the Prometheus text exposition format
+# Counters and histograms are updated on the hot paths with one short locked
+# update, gauges and the existing component stats are read only when scraped
+import bisect
+import threading
+
+# Default latency buckets [s]
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Escape a label value
+def escapeLabel(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+# Format the label set, e.g. '{portnum="TEXT_MESSAGE_APP"}'
+def formatLabels(labelNames, labelValues, extra=()):
+    pairs = list(zip(labelNames, labelValues)) + list(extra)
+    if len(pairs) == 0:
+        return ''
+    return '{' + ','.join(['%s="%s"' % (name, escapeLabel(value)) for (name, value) in pairs]) + '}'
+
+# Format a sample value
+def formatValue(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+# Monotonic counter, optionally labelled
+class Counter(object):
+    def __init__(self, name, helpText, labelNames=()):
+        self.name = name
+        self.helpText = helpText
+        self.labelNames = labelNames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.helpText), '# TYPE %s counter' % (self.name)]
+        with self._lock:
+            values = list(self._values.items())
+        for (labels, value) in sorted(values):
+            lines.append('%s%s %s' % (self.name, formatLabels(self.labelNames, labels), formatValue(value)))
+        return lines
+
+# Histogram with fixed buckets
+class Histogram(object):
+    def __init__(self, name, helpText, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.helpText = helpText
+        self.buckets = tuple(buckets)
+        # Last count are the +Inf bucket
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.helpText), '# TYPE %s histogram' % (self.name)]
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+            count = self._count
+
+        cumulative = 0
+        for (bound, bucketCount) in zip(self.buckets + (float('inf'), ), counts):
+            cumulative += bucketCount
+            lines.append('%s_bucket{le="%s"} %d' % (self.name, formatValue(bound), cumulative))
+        lines.append('%s_sum %s' % (self.name, formatValue(total)))
+        lines.append('%s_count %d' % (self.name, count))
+        return lines
+
+# Metric read from a function when scraped
+# collect() return a number, or a list of (label values, number)
+class CollectedMetric(object):
+    def __init__(self, name, helpText, metricType, collect, labelNames=()):
+        self.name = name
+        self.helpText = helpText
+        self.metricType = metricType
+        self.collect = collect
+        self.labelNames = labelNames
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.helpText), '# TYPE %s %s' % (self.name, self.metricType)]
+        try:
+            samples = self.collect()
+        except Exception:
+            # Component not ready yet
+            return lines
+
+        if samples == None:
+            return lines
+        if not isinstance(samples, list):
+            samples = [((), samples)]
+        for (labels, value) in samples:
+            if value != None:
+                lines.append('%s%s %s' % (self.name, formatLabels(self.labelNames, labels), formatValue(value)))
+        return lines
+
+# Metrics registry
+class MetricsRegistry(object):
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, helpText, labelNames=()):
+        return self.register(Counter(name, helpText, labelNames))
+
+    def histogram(self, name, helpText, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, helpText, buckets))
+
+    def gauge(self, name, helpText, collect, labelNames=()):
+        return self.register(CollectedMetric(name, helpText, 'gauge', collect, labelNames))
+
+    def counterFunc(self, name, helpText, collect, labelNames=()):
+        return self.register(CollectedMetric(name, helpText, 'counter', collect, labelNames))
+
+    # Text exposition format
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
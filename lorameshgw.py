@@ -1,28 +1,87 @@
 import logging
-import logging.handlers
-import os
-import signal
 import time
-import subprocess
-import threading   
+import math
+import threading
 import sys
-import json
-import socket
 from datetime import datetime
 
-# For reading tabular data
-import pandas as pd
+# For capturing the showNodes() table, pandas are imported on demand by the legacy table scraper
 from io import StringIO
 from contextlib import redirect_stdout
 
-# Meshtastic device API
-import meshtastic
+# Meshtastic device API publish/subscribe, the interface itself are opened by the factory
 from pubsub import pub
 
+# Logging pipeline
+from gwlog import setupLogging
+
+# Prometheus metrics
+from gwmetrics import MetricsRegistry
+
+# Meshtastic packet decoder
+from meshpacket import decodeTextPacket
+from meshpacket import getPortNum
+from meshpacket import normalizeNodeId
+
+# Node red TCP server connection manager
+from nodered import NodeRedSink
+from nodered import OutboundQueue
+from nodered import runOutboundWorker
+from nodered import formatNodeSnapshot
+from nodered import formatNodeDelta
+from nodered import ChangeNotifier
+
+# Durable store and forward spool for undelivered node red messages
+from spool import Spool
+
+# Received text message history
+from msghistory import MessageHistory
+
+# Live event stream for the REST API
+from eventstream import EventBroker
+from eventstream import NodeEventPump
+from eventstream import formatEvent
+from eventstream import EVENT_MESSAGE
+from eventstream import EVENT_SNAPSHOT
+from eventstream import EVENT_TYPES
+
+# Inbound TCP server for node red text message
+from msgserver import MeshMsgServer
+
+# Airtime aware transmit scheduler
+from txscheduler import TxScheduler
+from txscheduler import PRIO_HIGH
+from txscheduler import PRIO_NORMAL
+from txscheduler import PRIO_LOW
+from txscheduler import TxCoalescer
+from txscheduler import splitCoalesced
+
+# Mesh nodes registry
+from meshnodes import MeshNodeRegistry
+from meshnodes import ingestInterfaceNodes
+from meshnodes import applyNodePacket
+from meshnodes import NODE_PORTNUMS
+from meshnodes import NodesInfoCache
+from meshnodes import NodeQueryIndex
+
+# Legacy showNodes() table scraper
+from nodetable import parseNodesTable
+
+# Mesh radio interface factory, serial, TCP, simulator or capture replay
+from meshiface import createInterface
+
+# Received packet capture
+from meshcapture import CaptureWriter
+
+# Mesh radios, reconnect supervision and outbound routing
+from meshradios import RadioManager
+from meshradios import radiosFromSettings
+
 # REST API library
 from flask import Flask
 from flask import jsonify
 from flask import request
+from flask import Response
 
 # Settings
 # Retrieve command comm configuration
@@ -31,43 +90,58 @@ from settings import portrxmesh
 from settings import portrxmsg
 from settings import portserver
 
+# Optional settings, use the default value if not defined in settings.py
+import settings
+
 app = Flask(__name__)
 
 # Global variable declaration
+tcpServer          = None     # Inbound TCP server for node red text message
+txScheduler        = None     # Airtime aware transmit scheduler for outbound text message
+txCoalescer        = None     # Coalescing stage for outbound text message, None - disabled
+msgSpool           = None     # Store and forward spool for undelivered node red messages, None - disabled
+messageHistory     = None     # Received text message history for the '/messages' REST API
+packetCapture      = None     # Received packet capture writer, None - disabled
+packetCaptureMode  = False    # Macro for received packet capture
 backLogger         = False    # Macro for logger
+logLevel           = logging.INFO # Log level, DEBUG macro enable the debug dumps
 secureInSecure     = False    # REST API Server
-firstNodesData     = False    # First poll for nodes data
-ttyMeshNAvail      = False    # Checking TTY creation flag
-meshSerInterface   = None     # Meshtastic serial interface 
+restWsgiServer     = False    # Serve the REST API with the production WSGI server instead of the flask development server
+nodeTableParse     = False    # Legacy showNodes() table scraping for nodes data
+nodeEventMode      = False    # Update nodes data from received POSITION/NODEINFO/TELEMETRY packets
+nodePollSec        = 5        # Full nodes data poll interval [s], 0 - disable
+nodeDeltaMode      = False    # Send only changed mesh nodes data to node red
+nodeResyncReq      = False    # Delta mode, full resync requested
+meshRadios         = None     # Mesh radios manager, each radio with its own interface and supervisor thread
+meshInterfaceType  = 'serial' # Mesh radio interface type: 'serial', 'tcp', 'sim' or 'replay'
 meshNodes          = None     # Meshtastic nodes
-pollNodesCnt       = 0        # Polling counter for nodes info
 textMsgTotRec      = 0        # Received text message total record
-sendTcpDataType    = 0        # Type of the TCP data that needs to be send to node red
 tcpIpAddr          = ''       # IP address for node red TCP server
 tcpPortNoMesh      = 0        # Port number for node red TCP server - RX mesh nodes data
 tcpPortNoRxMsg     = 0        # Port number for node red TCP server - RX text message
 tcpServPortNo      = 0        # TCP server port no.
-connSerialMeshCnt  = 0        # Attempt to initialize MESH serial hardware counter
-
-# Mesh node list data
-meshNodeListData=[
-    {
-        'No' : 'NA',
-        'User' : 'NA',
-        'AKA' : 'NA',
-        'ID' : 'NA',
-        'Latitude' : 'NA',
-        'Longitude' : 'NA',
-        'Altitude' : 'NA',
-        'Battery' : 'NA',
-        'SNR' : 'NA',
-        'LastHeard' : 'NA',
-        'Since' : 'NA',
-    }
-]
-
-# Initialize back mesh node list data
-meshNodeListData = []
+lastNodesUpdate    = 0.0      # Epoch time of the last mesh nodes data update
+
+# Mesh nodes registry, indexed by node ID
+# Legacy list view (see MeshNodeRecord.toLegacy):
+# [{'No', 'User', 'AKA', 'ID', 'Latitude', 'Longitude', 'Altitude', 'Battery', 'SNR', 'LastHeard', 'Since'}]
+meshNodeRegistry = MeshNodeRegistry()
+
+# Pre serialized '/meshnodesinfo' response, rebuilt only when the registry changed
+meshNodesInfoCache = NodesInfoCache(meshNodeRegistry)
+# Sorted indexes for the '/meshnodesinfo' query parameters, rebuilt only when the registry changed
+meshNodesQueryIndex = NodeQueryIndex(meshNodeRegistry)
+
+# Live event stream subscribers, each with a bounded buffer of streambuffer events
+# Subscriber which let its buffer overflow are disconnected
+# WSGI macro, capped to wsgithreads - wsgireservethreads (see below)
+eventBroker = EventBroker(int(getattr(settings, 'streambuffer', 256)), int(getattr(settings, 'streammaxclients', 64)))
+nodeEventPump = NodeEventPump(meshNodeRegistry, eventBroker)
+# Stream keep alive comment interval [s]
+streamKeepAliveSec = float(getattr(settings, 'streamkeepalivesec', 15))
+
+# Compress the REST API response if the client accept gzip and the body are large enough [bytes], 0 - disable
+restGzipMinSize = int(getattr(settings, 'restgzipminsize', 1024))
 
 # Get the TCP server IP address and port number
 tcpIpAddr = localip
@@ -75,29 +149,127 @@ tcpPortNoMesh = int(portrxmesh)
 tcpPortNoRxMsg = int(portrxmsg)
 tcpServPortNo = int(portserver)
 
+# Get the nodes data polling interval
+# In nodes event mode the full poll only act as a rare reconciliation pass
+nodePollSec = int(getattr(settings, 'nodepollsec', 5))
+nodeReconcileSec = int(getattr(settings, 'nodereconcilesec', 300))
+
+# Delta mode full resync interval [s], 0 - only on request
+nodeResyncSec = int(getattr(settings, 'noderesyncsec', 300))
+# Remove nodes not heard for this duration [s], 0 - keep forever
+nodeExpireSec = int(getattr(settings, 'nodeexpiresec', 0))
+
+# Mesh radio interface, 'serial' (meshdevice = serial port, None - auto detect),
+# 'tcp' (meshdevice = radio host name), 'sim' (simulated mesh, no radio needed)
+# or 'replay' (meshdevice = capture file, see the CAPTURE macro)
+meshInterfaceType = getattr(settings, 'meshinterface', 'serial')
+meshDevice = getattr(settings, 'meshdevice', None)
+
+# Simulated mesh, simspeed multiply the whole traffic, e.g. 10 - ten times the real traffic
+simOptions = {'nodeCount' : int(getattr(settings, 'simnodes', 20)),
+              'textRate' : float(getattr(settings, 'simtextrate', 0.05)),
+              'positionSec' : float(getattr(settings, 'simpositionsec', 900)),
+              'telemetrySec' : float(getattr(settings, 'simtelemetrysec', 900)),
+              'speed' : float(getattr(settings, 'simspeed', 1.0)),
+              'seed' : getattr(settings, 'simseed', None)}
+
+# Capture replay pace multiplier, 0 - maximum speed
+replayOptions = {'speed' : float(getattr(settings, 'replayspeed', 1.0))}
+
+# Interface options by mesh radio interface type
+meshInterfaceOptions = {'sim' : simOptions, 'replay' : replayOptions}
+
+# Several mesh radios in one gateway, feeding one mesh nodes registry, '' - one radio from meshinterface and meshdevice
+# Outbound text messages go to the radio which last heard the destination node, or the first radio serving the channel
+# e.g. [{'name' : 'north', 'interface' : 'serial', 'device' : '/dev/ttyUSB0', 'channels' : [0, 1]},
+#       {'name' : 'south', 'interface' : 'tcp', 'device' : '192.168.1.20', 'channels' : [2]}]
+meshRadioSettings = getattr(settings, 'meshradios', '')
+# Reconnect attempt interval of the mesh radios [s]
+meshRetrySec = float(getattr(settings, 'meshretrysec', 10))
+
+# Persistent connections to the node red TCP server
+# Each message are terminated by the delimiter, node red TCP in node split the stream by it
+nodeRedMsgDelim = getattr(settings, 'noderedmsgdelim', '\n').encode()
+rxMsgSink = NodeRedSink('rxmsg', tcpIpAddr, tcpPortNoRxMsg, nodeRedMsgDelim)
+meshNodeSink = NodeRedSink('meshnodes', tcpIpAddr, tcpPortNoMesh, nodeRedMsgDelim)
+
+# Mesh nodes data changes notification, wake up the node red TCP client thread
+nodesNotifier = ChangeNotifier()
+# Any mesh nodes data change (battery, SNR, name, last heard...), wake up the live event stream thread
+streamNotifier = ChangeNotifier()
+
+# Transmit scheduler priority classes
+TX_PRIORITIES = {'high' : PRIO_HIGH, 'normal' : PRIO_NORMAL, 'low' : PRIO_LOW}
+
+# Bounded outbound queue between the meshtastic reader thread and node red delivery
+# Overflow policy: 'drop-oldest', 'drop-newest' or 'block' (wait up to outqueuetimeout [s])
+outQueue = OutboundQueue(int(getattr(settings, 'outqueuesize', 1000)),
+                         getattr(settings, 'outqueuepolicy', 'drop-oldest'),
+                         float(getattr(settings, 'outqueuetimeout', 0.5)))
+
+# Gateway metrics for '/metrics', hot path counters and histograms
+# Queue depths, connection stats and node count are read from the components when scraped
+gwMetrics = MetricsRegistry()
+metricPackets = gwMetrics.counter('lorameshgw_packets_total', 'Received mesh packets by application port number', ('portnum', ))
+metricReceiveSec = gwMetrics.histogram('lorameshgw_receive_seconds', 'Received packet decode and dispatch time in onReceive')
+metricDeliverySec = gwMetrics.histogram('lorameshgw_delivery_seconds', 'Received text message delay from queuing to node red delivery')
+metricPollSec = gwMetrics.histogram('lorameshgw_poll_seconds', 'Mesh nodes data poll and parse cycle duration',
+                                    (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+metricSerialInit = gwMetrics.counter('lorameshgw_serial_init_total', 'MESH radio interface initialization attempts by radio and result', ('radio', 'result'))
+metricRadioPackets = gwMetrics.counter('lorameshgw_radio_packets_total', 'Received mesh packets by radio', ('radio', ))
+
 # Check for macro arguments
 if (len(sys.argv) > 1):
     for x in sys.argv:
         # Optional macro if we want to enable text file log
         if x == "LOGGER":
             backLogger = True
+        # Optional macro if we want to enable the packet and nodes data debug dumps
+        elif x == "DEBUG":
+            logLevel = logging.DEBUG
         # Optional macro if we want to enable https
         elif x == "SECURE":
             secureInSecure = True
-
-# Setup log file 
-if backLogger == True:
-    path = os.path.dirname(os.path.abspath(__file__))
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    logfile = logging.handlers.TimedRotatingFileHandler('/tmp/loraMesgGW.log', when="midnight", backupCount=3)
-    formatter = logging.Formatter('%(asctime)s %(levelname)-8s %(message)s')
-    logfile.setFormatter(formatter)
-    logger.addHandler(logfile)
-
-# Doing string manipulations
-def mid(s, offset, amount):
-    return s[offset-1:offset+amount-1]
+        # Optional macro if we want to serve the REST API with the production WSGI server (cheroot)
+        elif x == "WSGI":
+            restWsgiServer = True
+        # Optional macro if we want to scrape the showNodes() table instead of reading interface.nodes
+        elif x == "NODETABLE":
+            nodeTableParse = True
+        # Optional macro if we want to update nodes data as soon as node packets are received
+        elif x == "NODEEVENTS":
+            nodeEventMode = True
+        # Optional macro if we want to send only changed mesh nodes data to node red
+        elif x == "NODEDELTA":
+            nodeDeltaMode = True
+        # Optional macro if we want to run on the simulated mesh instead of the radio
+        elif x == "SIMULATOR":
+            meshInterfaceType = 'sim'
+        # Optional macro if we want to capture every received packet to capturepath
+        elif x == "CAPTURE":
+            packetCaptureMode = True
+
+# Nodes event mode, full poll become the reconciliation pass
+if nodeEventMode == True:
+    nodePollSec = nodeReconcileSec
+
+# Log level from the settings, e.g. 'WARNING', the DEBUG macro take precedence
+if logLevel != logging.DEBUG:
+    logLevel = getattr(logging, str(getattr(settings, 'loglevel', 'INFO')).upper(), logging.INFO)
+
+# Setup the logging pipeline, log file or stdout decided once here
+# Log level: INFO, DEBUG macro (or loglevel setting) enable the packet and nodes data dumps
+logListener = setupLogging('/tmp/loraMesgGW.log' if backLogger == True else None, logLevel)
+logger = logging.getLogger('lorameshgw')
+
+# WSGI server worker threads, every '/stream' subscriber hold one of them for its whole life
+# Keep wsgireservethreads workers for the other routes, the stream subscribers are capped below them
+wsgiThreads = int(getattr(settings, 'wsgithreads', 8))
+if restWsgiServer == True:
+    wsgiStreamLimit = max(wsgiThreads - int(getattr(settings, 'wsgireservethreads', 2)), 0)
+    if eventBroker.maxSubscribers > wsgiStreamLimit:
+        logger.info("DEBUG_MAIN: Stream subscribers capped to %d, WSGI threads: %d", wsgiStreamLimit, wsgiThreads)
+        eventBroker.maxSubscribers = wsgiStreamLimit
 
 # Handle Cross-Origin (CORS) problem upon client request
 @app.after_request
@@ -108,522 +280,631 @@ def add_headers(response):
 
     return response
 
+# Query parameters of '/meshnodesinfo'
+MESH_NODES_QUERY_ARGS = ('fields', 'heardSince', 'sort', 'limit', 'cursor')
+
 # Get current mesh nodes information
+# Optional query parameters, without them the whole mesh nodes data are returned:
+#   fields     - comma separated field projection, e.g. ID,Latitude,Longitude
+#   heardSince - epoch time [s], only the nodes last heard at or after this time
+#   sort       - sort field, prefix '-' for descending order, default No
+#   limit      - maximum number of nodes per page, the response then carry 'nextCursor'
+#   cursor     - 'nextCursor' of the previous page
 # Example command to send:
 # https://voip.scs.my:9000/meshnodesinfo
+# https://voip.scs.my:9000/meshnodesinfo?fields=ID,Latitude,Longitude&heardSince=1700000000&sort=-LastHeard&limit=50
 @app.route('/meshnodesinfo', methods=['GET'])
 def getMeshNodesInfoDb():
-    return jsonify({'MeshNodesInfo' : meshNodeListData})
+    # Filtered query
+    for arg in MESH_NODES_QUERY_ARGS:
+        if arg in request.args:
+            return queryMeshNodesInfo()
+
+    entry = meshNodesInfoCache.get()
+
+    # Client already have the current data
+    if request.if_none_match.contains(entry.etag):
+        response = Response(status=304)
+        response.set_etag(entry.etag)
+        return response
+
+    # Compressed response
+    if restGzipMinSize > 0 and len(entry.body) >= restGzipMinSize and 'gzip' in request.accept_encodings:
+        response = Response(entry.gzipBody, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(entry.body, mimetype='application/json')
+
+    response.set_etag(entry.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# Filtered, projected and paginated mesh nodes information
+def queryMeshNodesInfo():
+    try:
+        fields = None
+        if 'fields' in request.args:
+            fields = [field.strip() for field in request.args.get('fields').split(',')]
+            if '' in fields:
+                raise ValueError("Empty field name in fields")
+        heardSince = request.args.get('heardSince', None)
+        if heardSince != None:
+            heardSince = float(heardSince)
+            # float() accept 'nan' and 'inf', which would not filter anything
+            if not math.isfinite(heardSince):
+                raise ValueError("heardSince must be a finite epoch time")
+        limit = request.args.get('limit', None)
+        if limit != None:
+            limit = max(int(limit), 1)
+
+        nodeList, nextCursor = meshNodesQueryIndex.query(fields, heardSince, request.args.get('sort', 'No'), limit, \
+                                                         request.args.get('cursor', None))
+
+    # Invalid query parameter
+    except (ValueError, TypeError) as err:
+        return jsonify({'error' : str(err)}), 400
+
+    return jsonify({'MeshNodesInfo' : nodeList, 'nextCursor' : nextCursor})
+
+# Get inbound TCP server and per client stats
+# Example command to send:
+# https://voip.scs.my:9000/tcpserverstats
+@app.route('/tcpserverstats', methods=['GET'])
+def getTcpServerStats():
+    return jsonify({'TcpServerStats' : tcpServer.stats()})
+
+# Get the mesh radios connection, reconnect and sent text message stats, and their node count
+# Example command to send:
+# https://voip.scs.my:9000/radiostats
+@app.route('/radiostats', methods=['GET'])
+def getRadioStats():
+    nodeCounts = {}
+    for record in meshNodeRegistry.records():
+        nodeCounts[record.source] = nodeCounts.get(record.source, 0) + 1
+    return jsonify({'RadioStats' : meshRadios.stats(nodeCounts)})
+
+# Get transmit scheduler queue depth, airtime and wait time stats
+# Example command to send:
+# https://voip.scs.my:9000/txstats
+@app.route('/txstats', methods=['GET'])
+def getTxStats():
+    return jsonify({'TxStats' : txScheduler.stats(), 'TxCoalescer' : txCoalescer.stats() if txCoalescer != None else None})
+
+# Get node red TCP server connection stats
+# Example command to send:
+# https://voip.scs.my:9000/noderedstats
+@app.route('/noderedstats', methods=['GET'])
+def getNodeRedStats():
+    return jsonify({'NodeRedStats' : [rxMsgSink.stats(), meshNodeSink.stats()], 'OutboundQueue' : outQueue.stats(), \
+                    'Spool' : msgSpool.stats() if msgSpool != None else None})
+
+# Get the received text message history, ascending order, paginated by cursor
+# Query parameters (all optional):
+#   since   - epoch time [s], messages received by the gateway at or after this time
+#   from    - sender node ID, with or without the leading '!'
+#   channel - channel index
+#   limit   - maximum number of messages, default 100, maximum 1000
+#   cursor  - 'nextCursor' of the previous response, return the messages after it
+# Example command to send:
+# https://voip.scs.my:9000/messages?since=1700000000&channel=0&limit=50
+@app.route('/messages', methods=['GET'])
+def getMessages():
+    try:
+        since = request.args.get('since', None, type=float)
+        fromId = request.args.get('from', None)
+        channel = request.args.get('channel', None, type=int)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+        cursor = request.args.get('cursor', None)
+        if cursor != None:
+            cursor = int(cursor)
+
+    # Invalid query parameter
+    except ValueError as err:
+        return jsonify({'error' : str(err)}), 400
+
+    if fromId != None:
+        fromId = normalizeNodeId(fromId)
+
+    messages, nextCursor = messageHistory.query(cursor, since, fromId, channel, limit)
+    return jsonify({'Messages' : messages, 'nextCursor' : nextCursor})
+
+# Live stream of node upserts, node removals and received text messages (server sent events)
+# Start with a 'snapshot' event of the current mesh nodes data, followed by
+# 'node', 'remove' and 'message' events as they happen
+# Query parameters (all optional):
+#   nodes - comma separated node ID filter, with or without the leading '!'
+#   types - comma separated event type filter: node, remove, message
+# Example command to send:
+# https://voip.scs.my:9000/stream?nodes=a2ac7cd4&types=node,message
+@app.route('/stream', methods=['GET'])
+def getStream():
+    nodeIds = None
+    if request.args.get('nodes'):
+        nodeIds = [normalizeNodeId(nodeId.strip()) for nodeId in request.args.get('nodes').split(',')]
+
+    eventTypes = None
+    if request.args.get('types'):
+        eventTypes = [eventType.strip() for eventType in request.args.get('types').split(',')]
+        for eventType in eventTypes:
+            if eventType not in EVENT_TYPES:
+                return jsonify({'error' : "Unknown event type: %s" % (eventType)}), 400
+
+    # Subscribe first, changes during the snapshot are delivered as events afterward
+    subscriber = eventBroker.subscribe(nodeIds, eventTypes)
+    if subscriber == None:
+        return jsonify({'error' : "Stream subscriber limit reached"}), 503
+
+    def generateEvents():
+        try:
+            nodeList = meshNodeRegistry.legacyList()
+            if nodeIds != None:
+                nodeList = [node for node in nodeList if node['ID'] in subscriber.nodeIds]
+            yield formatEvent(EVENT_SNAPSHOT, nodeList)
+
+            while subscriber.closed == False:
+                events = subscriber.take(streamKeepAliveSec)
+                if len(events) > 0:
+                    yield ''.join(events)
+                elif subscriber.closed == False:
+                    yield ': keep-alive\n\n'
+
+            # Slow consumer, tell the client to reload the snapshot
+            if subscriber.overflowed:
+                yield formatEvent('overflow', {'maxBuffer' : subscriber.maxBuffer})
+
+        # Client disconnected, or the subscriber was closed
+        finally:
+            eventBroker.unsubscribe(subscriber)
+
+    response = Response(generateEvents(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Get live event stream stats
+# Example command to send:
+# https://voip.scs.my:9000/streamstats
+@app.route('/streamstats', methods=['GET'])
+def getStreamStats():
+    return jsonify({'StreamStats' : eventBroker.stats()})
+
+# Gauges and counters read from the components when scraped
+gwMetrics.gauge('lorameshgw_nodes', 'Mesh nodes in the registry', lambda: len(meshNodeRegistry))
+gwMetrics.gauge('lorameshgw_nodes_update_age_seconds', 'Time since the last mesh nodes data update',
+                lambda: time.time() - lastNodesUpdate if lastNodesUpdate > 0 else None)
+gwMetrics.gauge('lorameshgw_outbound_queue_depth', 'Node red outbound queue depth', lambda: len(outQueue))
+gwMetrics.counterFunc('lorameshgw_outbound_total', 'Node red outbound queue items by result', \
+                      lambda: [((result, ), outQueue.stats()[result]) for result in ('enqueued', 'dropped', 'delivered', 'failed', 'spooled')], ('result', ))
+gwMetrics.counterFunc('lorameshgw_nodered_connects_total', 'Node red TCP server connections by sink and result', \
+                      lambda: [((sink.name, result), count) for sink in (rxMsgSink, meshNodeSink) \
+                               for (result, count) in (('ok', sink.connects), ('failed', sink.connectFails), ('dropped', sink.disconnects))], \
+                      ('sink', 'result'))
+gwMetrics.counterFunc('lorameshgw_nodered_send_failures_total', 'Node red TCP server send failures by sink', \
+                      lambda: [((sink.name, ), sink.sendFails) for sink in (rxMsgSink, meshNodeSink)], ('sink', ))
+gwMetrics.gauge('lorameshgw_tx_queue_depth', 'Transmit scheduler queue depth', lambda: txScheduler.stats()['depth'])
+gwMetrics.counterFunc('lorameshgw_tx_total', 'Transmit scheduler text messages by result', \
+                      lambda: [((result, ), txScheduler.stats()[result]) for result in ('submitted', 'sent', 'rejected', 'failed')], ('result', ))
+gwMetrics.counterFunc('lorameshgw_tx_airtime_seconds_total', 'Transmit airtime', lambda: txScheduler.totalAirtime)
+gwMetrics.gauge('lorameshgw_tcpserver_clients', 'Inbound TCP server connected clients', lambda: tcpServer.stats()['clients'])
+gwMetrics.gauge('lorameshgw_stream_subscribers', 'Live event stream subscribers', lambda: len(eventBroker))
+gwMetrics.gauge('lorameshgw_spool_bytes', 'Store and forward spool disk usage', lambda: msgSpool.stats()['usedBytes'])
+gwMetrics.gauge('lorameshgw_message_history_size', 'Received text messages in the history', lambda: len(messageHistory))
+gwMetrics.gauge('lorameshgw_radio_connected', 'Mesh radio connected', lambda: [((radio.name, ), radio.connected) for radio in meshRadios], ('radio', ))
+gwMetrics.counterFunc('lorameshgw_radio_sent_total', 'Text messages handed to the mesh radio', lambda: [((radio.name, ), radio.sent) for radio in meshRadios], ('radio', ))
+gwMetrics.counterFunc('lorameshgw_captured_packets_total', 'Received packets captured by the CAPTURE macro', lambda: packetCapture.captured)
+
+# Get the gateway metrics in the Prometheus text format
+# Example command to send:
+# https://voip.scs.my:9000/metrics
+@app.route('/metrics', methods=['GET'])
+def getMetrics():
+    return Response(gwMetrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Request a full mesh nodes data resync to node red (delta mode)
+# Example command to send:
+# https://voip.scs.my:9000/noderedresync
+@app.route('/noderedresync', methods=['GET'])
+def getNodeRedResync():
+    global nodeResyncReq
+    global nodesNotifier
+
+    nodeResyncReq = True
+    nodesNotifier.notify()
+    return jsonify({'NodeRedResync' : nodeDeltaMode})
 
 # Call back function to receive messages from mesh nodes
 def onReceive(packet, interface): # called when a packet arrives
-    global backLogger
-    global meshNodeListData
-    global tcpIpAddr 
-    global tcpPortNoRxMsg
-
-    rxData = ''
-    txtMsgPayLoad = ''
+    global meshNodeRegistry
+    global rxMsgSink
+    global outQueue
+    global nodeEventMode
+    global nodesNotifier
+    global streamNotifier
+    global messageHistory
+    global eventBroker
+    global packetCapture
+    global meshRadios
+
+    global lastNodesUpdate
+
+    rxMsg = None
     sendMsgPayload = ''
     msgTimeStamp = ''
-    senderId = ''
     nodeUsrNme = ''
     nodeAka = ''
-    lenRxData = 0
-    curlyOpenCnt = 0
-    colonCnt = 0
-    apostCnt = 0
-    curlyOpenFnd = False
-    retrTextMsg = False
-    semiColonFnd = False
-    colonFnd = False
-    apostFnd = False
-    retrTimeStmp = False
-    retrSenderId = False
+    rxStart = time.perf_counter()
+    portNum = getPortNum(packet)
+    metricPackets.inc(1, (portNum or 'ENCRYPTED', ))
+
+    # Radio the packet was received by, tag the nodes data with it
+    radio = meshRadios.radioOf(interface) if meshRadios != None else None
+    source = radio.name if radio != None else None
+    if source != None:
+        metricRadioPackets.inc(1, (source, ))
     
-    rxData = str(f"{packet}")
-    #rxData = ''
-    
-    # Write to logger - For debugging
-    if backLogger == True:
-        logger.info("DEBUG_CALL_BACK_RX_MSG: RX message: %s" % (rxData))
-        logger.info(" ")
-        logger.info("####################################################################")
-        logger.info(" ")
-    # Print statement
-    else:
-        print ("DEBUG_CALL_BACK_RX_MSG: RX message: %s" % (rxData))
-        print (" ")
-        print ("####################################################################")
-        print (" ")
+    # Raw packet dump, formatted only if debug level enabled
+    logger.debug("DEBUG_CALL_BACK_RX_MSG: RX message: %s", packet)
+
+    # Capture every received packet, written to the capture file by its own thread
+    if packetCapture != None:
+        packetCapture.write(packet)
+
+    # Nodes event mode, apply node data packet straight into the nodes registry
+    if nodeEventMode == True and portNum in NODE_PORTNUMS:
+        newRecord, posChanged, anyChanged = applyNodePacket(meshNodeRegistry, packet, source)
+        lastNodesUpdate = time.time()
+
+        # NEW node or position changes need to be send to node red TCP server
+        if newRecord == True or posChanged == True:
+            nodesNotifier.notify()
+        # Every change are streamed to the live event stream subscribers
+        if anyChanged == True:
+            streamNotifier.notify()
+
+        metricReceiveSec.observe(time.perf_counter() - rxStart)
+        return
 
     # Check the received message contents
+    # Decode the packet fields directly from the packet dictionary
+    rxMsg = decodeTextPacket(packet)
+
     # Text message from mesh nodes exist
-    if 'TEXT_MESSAGE_APP' in rxData:
-        lenRxData = len(rxData)
-
-        # Go through the data
-        for a in range(0, (lenRxData + 1)):
-            oneChar = mid(rxData, a, 1)
-            # Start count '{' character
-            if oneChar == '{' and curlyOpenFnd == False:
-                curlyOpenCnt += 1
-                # Finish counting, indicate the next data are the message payload
-                # Set flag to indicate character '{' searching ends
-                if curlyOpenCnt == 3:
-                    curlyOpenFnd = True
-
-            # Check for '"' to start retrieve text message payload
-            elif curlyOpenFnd == True and retrTextMsg == False:
-                # Found the first '"' character, indicate the next data are the text message
-                if oneChar == chr(34):
-                    # Set flag to start retrieve text message payload
-                    retrTextMsg = True
-
-            # Start retrieve text message payload
-            elif retrTextMsg == True and colonFnd == False:
-                # Append text message payload
-                if oneChar != chr(34):
-                    txtMsgPayLoad += oneChar
-
-                # Found end of text message payload, indicate by character '"'
-                # Set flag to check ':' character
-                else:
-                    colonFnd = True
-
-            # Check for ':' character to start retrieve text message time stamp 
-            elif colonFnd == True and retrTimeStmp == False:
-                # Count ':' character occurance
-                if oneChar == chr(58):
-                    colonCnt += 1
-
-                    # 2 ':' character occurance indicate we can start retrieve text message time stamp
-                    # Set flag to start retrieve text message time stamp
-                    if colonCnt == 2:
-                        retrTimeStmp = True
-
-            # Start retrieve text message time stamp
-            elif retrTimeStmp == True and retrSenderId == False:
-                # Found '\n' character indicate text message payload retrieval was completed
-                # Set flag to retrieve sender ID 
-                if oneChar == '\n':
-                    retrSenderId = True
-                    
-                # Append text message time stamp
-                elif oneChar != ' ':
-                    msgTimeStamp += oneChar
-
-            # Check for ''' to start retrieve sender ID
-            elif retrSenderId == True and apostFnd == False:
-                # Count ''' character occurance
-                if oneChar == chr(39):
-                    apostCnt += 1
-
-                    # 3 ''' character occurance indicate we can start retrieve sender ID
-                    # Set flag to start retrieve sender ID
-                    if apostCnt == 3:
-                        apostFnd = True
-
-            # Start retrieve sender ID
-            elif apostFnd == True:
-                # Only append character without ''' and '!' character
-                if oneChar != chr(39) and oneChar != chr(33):
-                    senderId += oneChar
-
-                # Found last ''' character which indicate end of the sender ID
-                elif oneChar == chr(39):
-                    break
+    if rxMsg != None:
+        txtMsgPayLoad = rxMsg.text
+        msgTimeStamp = rxMsg.rxTime
+        senderId = rxMsg.senderId
+
+        # Record the text messages in the history and publish them to the live stream
+        # The sender may not in the mesh nodes registry yet
+        if messageHistory != None:
+            nodeDB = meshNodeRegistry.get(senderId)
+            for txtMsgPayLoad in splitCoalesced(rxMsg.text):
+                msgRecord = messageHistory.add(senderId, txtMsgPayLoad, rxMsg.rxTime, nodeDB.user if nodeDB != None else '', \
+                                               nodeDB.aka if nodeDB != None else '', rxMsg.toId, rxMsg.channel, rxMsg.packetId, rxMsg.rxSnr)
+                if len(eventBroker) > 0:
+                    eventBroker.publish(EVENT_MESSAGE, msgRecord.toDict(), senderId)
+            txtMsgPayLoad = rxMsg.text
 
         # Get the user name and A.K.A from mesh nodes list of data
         # Update python data dictionary with retrieve nodes info
         try:
             # Check the nodes ID whether its already exist or not
-            # Update the existing data, throw error if record is not exist, consider its a new data
-            nodeDB = [ nodeDBB for nodeDBB in meshNodeListData if (nodeDBB['ID'] == senderId) ]
+            # Throw error if record is not exist
+            nodeDB = meshNodeRegistry.get(senderId)
+            if nodeDB == None:
+                raise KeyError(senderId)
 
             # Convert time stamp seconds to date and time
             msgTimeStamp = datetime.fromtimestamp(int(msgTimeStamp)).strftime("%A, %B %d, %Y %I:%M:%S")
 
             # Get the user name and a.k.a from mesh nodes list of data
-            nodeUsrNme = nodeDB[0]['User']
-            nodeAka = nodeDB[0]['AKA']
-
-            # Write to logger - For debugging
-            if backLogger == True:
-                logger.info("DEBUG_CALL_BACK_RX_MSG: TEXT message payload: [%s], Date and Time: [%s], Sender ID: [%s], User Name: [%s], A.K.A: [%s]" % \
-                            (txtMsgPayLoad, msgTimeStamp, senderId, nodeUsrNme, nodeAka))
-                logger.info(" ")
-                logger.info("####################################################################")
-                logger.info(" ")
-            # Print statement
-            else:
-                print ("DEBUG_CALL_BACK_RX_MSG: TEXT message payload: [%s], Date and Time: [%s], Sender ID: [%s], User Name: [%s], A.K.A: [%s]" % \
-                            (txtMsgPayLoad, msgTimeStamp, senderId, nodeUsrNme, nodeAka))
-                print (" ")
-                print ("####################################################################")
-                print (" ")
-
-            # Construct message receive to send
-            sendMsgPayload = '!' + nodeUsrNme + '!' + nodeAka + '!' + senderId + '!' + txtMsgPayLoad + '!' + msgTimeStamp
-            try:
-                # Socket initialization                
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((tcpIpAddr, tcpPortNoRxMsg))
-
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_THD_TCP_CLIENT: Sending mesh received text message data: [%s}" % (sendMsgPayload))
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_THD_TCP_CLIENT: Sending mesh received text message data: [%s]" % (sendMsgPayload))
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
-
-                # Send the mesh nodes data to node red TCP server
-                sock.send(bytearray(sendMsgPayload.encode()))
+            nodeUsrNme = nodeDB.user
+            nodeAka = nodeDB.aka
+
+            logger.info("DEBUG_CALL_BACK_RX_MSG: TEXT message payload: [%s], Date and Time: [%s], Sender ID: [%s], User Name: [%s], A.K.A: [%s]", \
+                        txtMsgPayLoad, msgTimeStamp, senderId, nodeUsrNme, nodeAka)
+
+            # Coalesced payload carry many text messages, send each of them separately
+            for txtMsgPayLoad in splitCoalesced(rxMsg.text):
+                # Construct message receive to send
+                sendMsgPayload = '!' + nodeUsrNme + '!' + nodeAka + '!' + senderId + '!' + txtMsgPayLoad + '!' + msgTimeStamp
+
+                logger.debug("DEBUG_THD_TCP_CLIENT: Sending mesh received text message data: [%s]", sendMsgPayload)
+
+                # Queue the received text message, outbound worker send it to node red TCP server
+                # Queue full, message dropped according to the overflow policy
+                if outQueue.put((rxMsgSink, sendMsgPayload)) == False:
+                    logger.warning("DEBUG_CALL_BACK_RX_MSG: Outbound queue FULL, message payload DROPPED!")
+
                 sendMsgPayload = ''
-                # Close socket
-                sock.close()
-                
-            # Error during sending the data
-            except:
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_CALL_BACK_RX_MSG: Send message payload FAILED!")
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_CALL_BACK_RX_MSG: Send message payload FAILED!")
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
 
         # New cell number
         except:
-            # Write to logger - For debugging
-            if backLogger == True:
-                logger.info("DEBUG_CALL_BACK_RX_MSG: Sender ID NOT FOUND!")
-                logger.info(" ")
-                logger.info("####################################################################")
-                logger.info(" ")
-            # Print statement
-            else:
-                print ("DEBUG_CALL_BACK_RX_MSG: Sender ID NOT FOUND!")
-                print (" ")
-                print ("####################################################################")
-                print (" ") 
+            logger.warning("DEBUG_CALL_BACK_RX_MSG: Sender ID NOT FOUND!")
+
+    metricReceiveSec.observe(time.perf_counter() - rxStart)
         
 # Call back function when connected to the radio
 def onConnection(interface, topic=pub.AUTO_TOPIC): # called when we (re)connect to the radio
-    global meshSerInterface
-
-    # Write to logger - For debugging
-    if backLogger == True:
-        logger.info("DEBUG_CALL_BACK_CONNECTED: Connected to MESH network")
-        logger.info("####################################################################")
-        logger.info(" ")
-    # Print statement
+    global meshRadios
+
+    # The greeting is sent by the radio supervisor once the radio is registered, see greetMeshRadio()
+    radio = meshRadios.radioOf(interface) if meshRadios != None else None
+    logger.info("DEBUG_CALL_BACK_CONNECTED: Connected to MESH network, radio: [%s]", radio.name if radio != None else '')
+
+# Greet the mesh on the radio which just connected
+def greetMeshRadio(radio):
+    try:
+        # defaults to broadcast, specify a destination ID if you wish
+        sendMeshText("hello mesh world", target=radio.name)
+
+    # Transmit queue full, skip the greeting
+    except Exception as err:
+        logger.warning("DEBUG_MAIN: MESH radio [%s] greeting NOT queued! %s", radio.name, err)
+
+# Call back function when the connection to the radio is lost
+def onConnectionLost(interface, topic=pub.AUTO_TOPIC):
+    global meshRadios
+
+    # Radio supervisor thread reconnect after the retry interval
+    radio = meshRadios.markLost(interface) if meshRadios != None else None
+    if radio != None:
+        logger.warning("DEBUG_CALL_BACK_LOST: Connection to MESH radio [%s] LOST!, retry attempt in %ss", radio.name, radio.retrySec)
+
+# Shared outbound mesh transmit path, used by every text message source
+# Queue the text message to the airtime aware transmit scheduler, through the coalescing stage if enabled
+# target - radio name to send on, None - routed by destination and channel, never coalesced
+# Return None (queued), raise an exception if the transmit queue are full or the text do not fit one mesh packet
+def sendMeshText(text, destinationId='^all', channelIndex=0, wantAck=False, source='gateway', priority=PRIO_NORMAL, target=None):
+    global txScheduler
+    global txCoalescer
+
+    if txCoalescer != None and target == None:
+        txCoalescer.submit(text, destinationId, channelIndex, wantAck, source, priority)
+    else:
+        txScheduler.submit(text, destinationId, channelIndex, wantAck, source, priority, target)
+    return None
+
+# Call back function of the transmit scheduler, hand the text message to the radio
+# Return the mesh packet ID, raise an exception if the text message was not handed to the radio
+def transmitMeshText(item):
+    global meshRadios
+    global meshNodeRegistry
+
+    # Radio given by the item, or the radio which last heard the destination node, or the first radio serving the channel
+    if meshRadios == None:
+        radio = None
+    elif item.target != None:
+        radio = meshRadios.get(item.target)
     else:
-        print ("DEBUG_CALL_BACK_RX_MSG: Connected to MESH network")
-        print ("####################################################################")
-        print (" ")
+        radio = meshRadios.route(item.destinationId, item.channelIndex, meshNodeRegistry)
+
+    # MESH radio not ready yet
+    if radio == None:
+        raise RuntimeError("No MESH radio ready for channel %s" % (item.channelIndex))
+
+    with radio.txLock:
+        interface = radio.interface
+        if interface == None:
+            raise RuntimeError("MESH radio %s not ready" % (radio.name))
         
-    # defaults to broadcast, specify a destination ID if you wish
-    meshSerInterface.sendText("hello mesh world")
+        # defaults to broadcast
+        meshPacket = interface.sendText(item.text, destinationId=item.destinationId, wantAck=item.wantAck, channelIndex=item.channelIndex)
+        radio.sent += 1
+        return getattr(meshPacket, 'id', None)
 
-# Thread to receive text message input from Node Red
-def thread_tcpServer_NodeRed (name):
-    global backLogger
-    global tcpIpAddr
-    global tcpServPortNo
-    global meshSerInterface
+# Call back function of the transmit scheduler when the radio refuse the text message
+def onTransmitError(item, err):
+    logger.warning("DEBUG_THD_TX_SCHEDULER: Send text message to MESH FAILED! Source: [%s], Error: [%s]", item.source, err)
 
-    clientStatus = False
-    rxTextMsgData = ''
+# Thread for the airtime aware transmit scheduler
+def thread_txScheduler (name):
+    global txScheduler
 
-    # Create a TCP/IP socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    
-    # Get the old state of the SO_REUSEADDR option
-    old_state = sock.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR )
-
-    # Write to logger
-    if backLogger == True:
-        logger.info("DEBUG_THD_TCP_SERVER: OLD sock state: %s" % (old_state))
-        logger.info("####################################################################")
-        logger.info(" ")
-    # Print statement
-    else:
-        print ("DEBUG_THD_TCP_SERVER: OLD sock state: %s" % (old_state))
-        print ("####################################################################")
-        print (" ")
-
-    # Enable the SO_REUSEADDR option
-    sock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
-    new_state = sock.getsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR )
-
-    # Write to logger
-    if backLogger == True:
-        logger.info("DEBUG_THD_TCP_SERVER: NEW sock state: %s" % (new_state))
-        logger.info("####################################################################")
-        logger.info(" ")
-    # Print statement
-    else:
-        print ("DEBUG_THD_TCP_SERVER: NEW sock state: %s" % (old_state))
-        print ("####################################################################")
-        print (" ")
-
-    # Bind the socket to the port
-    server_address = (tcpIpAddr, tcpServPortNo)
-
-    # Write to logger
-    if backLogger == True:
-        # log events, when daemon run in background
-        logger.info("DEBUG_THD_TCP_SERVER: Messaging TCP Server starting up on %s port %s" % (server_address))
-        logger.info("####################################################################")
-        logger.info(" ")
-    # Print statement
-    else:
-        print ("DEBUG_THD_TCP_SERVER: Radar track TCP Server starting up on %s port %s" % (server_address))
-        print ("####################################################################")
-        print (" ")
+    # Forever loop, drain the transmit queue
+    txScheduler.run()
 
-    # Create a NEW server socket
-    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+# Thread for the outbound text message coalescing stage
+def thread_txCoalescer (name):
+    global txCoalescer
 
-    # Server bind to IP and port no.
-    srv.bind(server_address)
-    # Listen for incoming connections
-    srv.listen(1)
+    # Forever loop, flush the coalesced payloads when the window closed
+    txCoalescer.run()
 
-    # TCP server loop
-    while True:
-        # Write to logger
-        if backLogger == True:
-            logger.info("DEBUG_THD_TCP_SERVER: Radar track TCP Server waiting for client connection...")
-            logger.info("####################################################################")
-            logger.info(" ")
-        # Print statement
-        else:
-            print ("DEBUG_THD_TCP_SERVER: Radar track TCP Server waiting for client connection...")
-            print ("####################################################################")
-            print (" ")
+# Call back function for the TCP server connection events
+def onTcpServerEvent(text):
+    logger.info("DEBUG_THD_TCP_SERVER: %s", text)
 
-        # Accept the client connection    
-        connection, client_address = srv.accept()
-        addrClient = str(client_address)
+# Call back function for the text message received from Node Red client
+# Raise an exception if the text message was not queued, the client acknowledgement only mean queued
+def onTcpServerMessage(msg, client):
+    logger.info("DEBUG_THD_TCP_SERVER: Received text message data from %s: [%s], Destination: [%s], Channel: [%s]", \
+                client.name, msg['text'], msg['destination'], msg['channelIndex'])
+
+    # Send text message to the mesh nodes, defaults to broadcast
+    # Fair queuing per Node Red client
+    try:
+        sendMeshText(msg['text'], msg['destination'], msg['channelIndex'], msg['wantAck'], client.name, \
+                     TX_PRIORITIES[msg['priority']])
+
+    # Error during queuing the text message
+    except:
+        onTcpServerEvent("Queue text message to MESH FAILED!")
+        raise
 
-        # After received client connection, start TCP Server loop
+# Thread to receive text message input from Node Red
+# Serve many Node Red clients at the same time
+def thread_tcpServer_NodeRed (name):
+    global tcpServer
+
+    # TCP server loop
+    while True:
         try:
-            # Write to logger
-            if backLogger == True:
-                # log events, when daemon run in background
-                logger.info("DEBUG_THD_TCP_SERVER: Radar track TCP Server get client connection from %s " % (addrClient))
-                logger.info("####################################################################")
-                logger.info(" ")
-            # Print statement
-            else:
-                print ("DEBUG_THD_TCP_SERVER: Radar track TCP Server get client connection from %s" % (addrClient))
-                print ("####################################################################")
-                print (" ")
-
-            # Connection with client established
-            clientStatus = True
-
-            # Check received text message data from Node Red client
-            while clientStatus:
-                # Listen for text message data from Node Red client
-                rxTextMsgData = connection.recv(4096)
-                rxTextMsgData = rxTextMsgData.decode()
-                
-                # Received text message data from Node Red client
-                if rxTextMsgData != '':
-                    # Write to logger
-                    if backLogger == True:
-                        # log events, when daemon run in background
-                        logger.info("DEBUG_THD_TCP_SERVER: Received text message data: [%s]" % (rxTextMsgData))
-                        logger.info("####################################################################")
-                        logger.info(" ")
-                    # Print statement
-                    else:
-                        print ("DEBUG_THD_TCP_SERVER: Received text message data: [%s]" % (rxTextMsgData))
-                        print ("####################################################################")
-                        print (" ")
-
-                    # Broadcast text message to the mesh nodes
-                    meshSerInterface.sendText(rxTextMsgData)
-                    rxTextMsgData = ''
-                    
-                # Connection with server closed
-                if rxTextMsgData == b'':
-                    # Write to logger
-                    if backLogger == True:
-                        logger.info("DEBUG_THD_TCP_SERVER: Client disconnected!")
-                        logger.info("####################################################################")
-                        logger.info(" ")
-                    # Print statement
-                    else:
-                        print ("DEBUG_THD_TCP_SERVER: Client disconnected!")
-                        print ("####################################################################")
-                        print (" ")
-
-                    rxTextMsgData = ''
-                    
-                    # Reset the connection
-                    # Clean up the connection
-                    connection.close()
-                    clientStatus = False
+            tcpServer.serveForever()
 
-        # TCP server error      
+        # TCP server error
         except:
-            # Write to logger
-            if backLogger == True:
-                logger.info("DEBUG_THD_TCP_SERVER: Client loop ERROR!")
-                logger.info("####################################################################")
-                logger.info(" ")
-            else:
-                print ("DEBUG_THD_TCP_SERVER: Client loop ERROR!")
-                print ("####################################################################")
-                print (" ")
-                
-            # Reset the connection
-            # Clean up the connection
-            connection.close()
-            clientStatus = False 
+            onTcpServerEvent("Server loop ERROR!")
+            time.sleep(1)
 
 # Thread to send a mesh related nodes data
 def thread_tcpClient_NodeRed (name, sleepLoop):
-    global sendTcpDataType
-    global meshNodeListData
-    global tcpIpAddr 
-    global tcpPortNoMesh
+    global nodesNotifier
+    global meshNodeRegistry
+    global meshNodeSink
+    global nodeDeltaMode
+    global nodeResyncReq
 
     nodeUserData = ''
+    handledGen = 0
+    pushGen = 0
+    pushVersion = 0
+    lastPushVersion = 0
+    nextResync = time.monotonic() + nodeResyncSec
     
     # Forever loop                                   
     while True:
-        time.sleep(sleepLoop)
+        # Wait for the mesh nodes data changes
+        # Delta mode, wake up for the periodic full resync
+        waitSec = None
+        if nodeDeltaMode == True and nodeResyncSec > 0:
+            waitSec = max(0, nextResync - time.monotonic())
+
+        pushGen = nodesNotifier.wait(handledGen, waitSec)
+
+        # Delta mode, periodic full resync
+        if nodeDeltaMode == True and nodeResyncSec > 0 and time.monotonic() >= nextResync:
+            nodeResyncReq = True
 
         # Send available mesh nodes data to the node red TCP server
-        if sendTcpDataType == 1:
-            # Try to send the data
-            try:
-                # Socket initialization                
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((tcpIpAddr, tcpPortNoMesh))
+        if pushGen != handledGen or (nodeDeltaMode == True and nodeResyncReq == True):
+            # Delta mode, first push or resync requested, send all records
+            if nodeDeltaMode == True and (lastPushVersion == 0 or nodeResyncReq == True):
+                upserts, removedIds, pushVersion = meshNodeRegistry.changesSince(0)
+                nodeUserData = formatNodeDelta(upserts, [], True)
+                nodeResyncReq = False
+                nextResync = time.monotonic() + nodeResyncSec
+
+            # Delta mode, send only the records changed since the last successful push
+            elif nodeDeltaMode == True:
+                upserts, removedIds, pushVersion = meshNodeRegistry.changesSince(lastPushVersion)
+                nodeUserData = formatNodeDelta(upserts, removedIds)
+
+                # Nothing changed
+                if nodeUserData == '':
+                    handledGen = pushGen
+                    continue
+
+            # Legacy mode, send the whole mesh nodes data
+            else:
+                nodeUserData = formatNodeSnapshot(meshNodeRegistry.legacyList())
+            
+            logger.debug("DEBUG_THD_TCP_CLIENT: Sending mesh nodes data: [%s]", nodeUserData)
 
-                # Get the total record in dictionary
-                totRecord = len(meshNodeListData)
-                
-                # Loop through mesh nodes data dictionary
-                for a in range(0, (totRecord)):
-                    tempData = '!' + meshNodeListData[a]['No'] + '!' + meshNodeListData[a]['User'] + '!' + meshNodeListData[a]['AKA'] + \
-                               '!' + meshNodeListData[a]['ID'] + '!' + meshNodeListData[a]['Latitude'] + '!' + meshNodeListData[a]['Longitude'] + \
-                               '!' + meshNodeListData[a]['Altitude'] + '!' + meshNodeListData[a]['Battery'] + '!' + meshNodeListData[a]['SNR'] + \
-                               '!' + meshNodeListData[a]['LastHeard'] + '!' + meshNodeListData[a]['Since']
-
-                    # Append the data
-                    nodeUserData += tempData
-                    tempData = ''
-                
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_THD_TCP_CLIENT: Sending mesh nodes data: [%s}" % (nodeUserData))
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_THD_TCP_CLIENT: Sending mesh nodes data: [%s]" % (nodeUserData))
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
-
-                # Send the mesh nodes data to node red TCP server
-                sock.send(bytearray(nodeUserData.encode()))
-                nodeUserData = ''
-                # Close socket
-                sock.close()
-                sendTcpDataType = 0
+            # Send the mesh nodes data to node red TCP server over the persistent connection
+            # Changes published during the send have a newer generation, pushed on the next loop
+            if meshNodeSink.send(nodeUserData) == True:
+                handledGen = pushGen
+
+                # Delta mode, remember the pushed registry version
+                if nodeDeltaMode == True:
+                    lastPushVersion = pushVersion
+                    meshNodeRegistry.forgetRemoved(pushVersion)
                 
-            # Error during sending the data
-            except:
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_THD_TCP_CLIENT: Error during sending the data!")
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_THD_TCP_CLIENT: Error during sending the data!")
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
-
-                # Closed the socket
-                sock.close()
-    
-# Thread for meshtastic serial interface, process mesh nodes data
-def thread_serial_mesh(name, sleepLoop):
-    global meshSerInterface 
-    global backLogger
-    global pollNodesCnt
-    global meshNodeListData
-    global firstNodesData
-    global sendTcpDataType
-    global ttyMeshNAvail
-    global connSerialMeshCnt
-
-    # Nodes data process variable
-    nodesData = ''
-    nodesColData = ''
-    pdNodesData = ''
-    oneChar = ''
-    forCastOneChar = ''
-    nodesIndx = 0
-    lengthColData = 0
-    rowCnt = 3
-    
-    # Nodes data for each devices
-    nodeNumber = ''
-    nodeUser = ''
-    nodeAka = ''
-    nodeId = ''
-    nodeLat = ''
-    nodeLon = ''
-    nodeAlt = ''
-    nodeBatt = ''
-    nodeSnr = ''
-    nodeLastHeard = ''
-    nodeSince = ''
-    
-    unicodeChar = False
-    unicodeCharFnd = False
-    unicodeBuff = ''
+            # Error during sending the data, retry after a while
+            else:
+                logger.warning("DEBUG_THD_TCP_CLIENT: Error during sending the data! %s", meshNodeSink.lastError)
+
+                time.sleep(sleepLoop)
+
+            nodeUserData = ''
     
-    nodeNumbFnd = False
-    usrNameFnd = False
-    akaFnd = False
-    nodeIdFnd = False
-    nodeLatFnd = False
-    nodeLonFnd = False
-    nodeAltFnd = False
-    nodeBattFnd = False
-    nodeSnrFnd = False
-    nodeLastHeardFnd = False
-    startExtract = False
-    endOfLatLon = False
-    endOfAlt = False
-    endOfBatt = False
-    endOfSnr = False
+# Call back function when the outbound worker failed to deliver a message to node red
+def onOutboundFailed(sink, payload):
+    logger.warning("DEBUG_THD_OUTBOUND: Send message payload FAILED! [%s] %s", sink.name, sink.lastError)
+
+# Thread to deliver queued messages to node red TCP server
+def thread_outbound_NodeRed (name):
+    global outQueue
+    global msgSpool
+
+    # Forever loop, drain the outbound queue
+    # Undelivered messages are spooled and replayed once node red TCP server is back
+    runOutboundWorker(outQueue, onOutboundFailed, msgSpool, (rxMsgSink, ), 1.0, \
+                      lambda sink, latency: metricDeliverySec.observe(latency))
+
+# Thread to publish the mesh nodes data changes to the live stream subscribers
+def thread_eventStream (name):
+    global streamNotifier
+    global nodeEventPump
+
+    handledGen = 0
+
+    # Forever loop, wait for any mesh nodes data change
+    while True:
+        handledGen = streamNotifier.wait(handledGen)
+        nodeEventPump.pump()
+
+# Thread to write the received text message history to the on disk store
+def thread_msgHistory (name, sleepLoop):
+    global messageHistory
+
+    # Forever loop, flush the pending messages in batches
+    while True:
+        time.sleep(sleepLoop)
+
+        try:
+            messageHistory.flush()
+
+        # Error during writing the on disk store, retry on the next loop
+        except Exception as err:
+            logger.error("DEBUG_THD_MSG_HISTORY: Write message history FAILED! %s", err)
+
+# Thread for received packet capture writer
+def thread_capture (name, sleepLoop):
+    global packetCapture
+
+    # Forever loop, append the captured packets in batches
+    while True:
+        time.sleep(sleepLoop)
+
+        try:
+            packetCapture.flush()
+
+        # Error during writing the capture file, retry on the next loop
+        except Exception as err:
+            logger.error("DEBUG_THD_CAPTURE: Write packet capture FAILED! %s", err)
+
+# Open the mesh radio interface
+# Raise an exception if the radio is not available
+def openMeshInterface(radio):
+    return createInterface(radio.kind, radio.device, radio.options)
+
+# Poll the mesh nodes data by scraping the showNodes() table
+# Legacy ingestion path, enabled by the NODETABLE macro
+# Return True if there is a NEW node or a node position changed
+def pollNodesTable(interface):
+    global meshNodeRegistry
+
+    # Redirect the results to stdout
+    # No need to display tabular data
+    f = StringIO()
+    with redirect_stdout(f):
+        # Get the current mesh nodes data
+        nodesData = interface.showNodes()
+
+    return parseNodesTable(nodesData, meshNodeRegistry)
+
+# Thread for one meshtastic radio interface, reconnect supervision and mesh nodes data poll
+def thread_serial_mesh(name, sleepLoop, radio):
+    global meshRadios
+    global meshNodeRegistry
+    global nodesNotifier
+    global streamNotifier
+    global nodeTableParse
+    global nodePollSec
+    global lastNodesUpdate
+
     updateRecord = False
     
     # Forever loop
@@ -631,658 +912,216 @@ def thread_serial_mesh(name, sleepLoop):
         # Loop every 1s
         time.sleep(sleepLoop)
 
-        # Previously MESH TTY already been created
-        if ttyMeshNAvail == True:
-            pollNodesCnt += 1
-            # Reach 1 minutes, start poll the mesh nodes
-            if pollNodesCnt == 5 or firstNodesData == False:
-                # Redirect the results to stdout
-                # No need to display tabular data
-                f = StringIO()
-                with redirect_stdout(f):
-                    # Get the current mesh nodes data
-                    nodesData = meshSerInterface.showNodes()
-
-                # Start gets the nodes record count
-                # First, get the total mesh nodes raw data 
-                # Second, get the record count summary
-                # Lastly, get the total mesh nodes actual records
-                pdNodesData = pd.read_table(StringIO(nodesData), header=0)
-                nodesIndx = pdNodesData.index
-                nodesIndx = len(nodesIndx)
-
-                # Go through each index
-                for a in range(0, (nodesIndx)):
-                    # Read mesh nodes data according to the current row index
-                    if a == rowCnt:
-                        # Read the row nodes data table using pandas 
-                        pdNodesData = pd.read_table(StringIO(nodesData), header=a)
-                        # Get the selected columns data
-                        nodesColData = pdNodesData.columns 
-                                    
-                        # Write to logger - For debugging
-                        if backLogger == True:
-                            logger.info("DEBUG_THD_SERIAL_MESH: Unprocess ROW mesh node data: %s" % (nodesColData))
-                            print (" ")
-                            logger.info("####################################################################")
-                            logger.info(" ")
-                        # Print statement
-                        else:
-                            print ("DEBUG_THD_SERIAL_MESH: Unprocess ROW mesh node data: %s" % (nodesColData))
-                            print (" ")
-                            print ("####################################################################")
-                            print (" ")
-
-                        # Convert pandas object to string
-                        nodesColData = str(nodesColData)
-                        # Convert string to ascii
-                        nodesColData = ascii(nodesColData)
-                        # Get the column data length
-                        lengthColData = len(nodesColData)
-
-                        # Write to logger - For debugging
-                        if backLogger == True:
-                            logger.info("DEBUG_THD_SERIAL_MESH: ASCII ROW mesh node data: %s" % (nodesColData))
-                            logger.info(" ")
-                            logger.info("####################################################################")
-                            logger.info(" ")
-                        # Print statement
-                        else:
-                            print ("DEBUG_THD_SERIAL_MESH: ASCII ROW mesh node data: %s" % (nodesColData))
-                            print (" ")
-                            print ("####################################################################")
-                            print (" ")
-                            
-                        # Go through the data
-                        for b in range(0, (lengthColData + 1)):
-                            oneChar = mid(nodesColData, b, 1)
-                            # Check for unicode data separator
-                            if unicodeCharFnd == False:
-                                # Start checking for unicode char - '\' character
-                                if oneChar == chr(92) and unicodeChar == False:
-                                    unicodeChar = True
-                                # Found '\' character
-                                elif unicodeChar == True:
-                                    # Check for digit
-                                    if oneChar.isdigit(): 
-                                        unicodeBuff += oneChar
-                                        # Complete unicode data
-                                        if unicodeBuff == '2502':
-                                            unicodeCharFnd = True
-
-                            # Check for mesh nodes data
-                            else:
-                                # Forecast next character to find '\' character
-                                forCastOneChar = mid(nodesColData, b + 1, 1)
-                                # Search for node number
-                                if nodeNumbFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        nodeNumbFnd = True
-                                        
-                                        # Reset necessary variable
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the record number index
-                                    else:
-                                        # Check for digit
-                                        if oneChar.isdigit():
-                                            nodeNumber += oneChar
-                                            
-                                # Search for node user name
-                                elif usrNameFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        usrNameFnd = True
-                                        
-                                        # Reset necessary variable
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node user name
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character either alphabet or number
-                                            if oneChar.isalpha() or oneChar.isdigit():
-                                                nodeUser += oneChar
-                                                startExtract = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            nodeUser += oneChar
-
-                                # Search for node a.k.a
-                                elif akaFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        akaFnd = True
-                                        
-                                        # Reset necessary variable
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node a.k.a
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character either alphabet or number
-                                            if oneChar.isalpha() or oneChar.isdigit():
-                                                nodeAka += oneChar
-                                                startExtract = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            if oneChar != ' ':
-                                                nodeAka += oneChar
-                                            
-                                # Search for node ID
-                                elif nodeIdFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        nodeIdFnd = True
-                                        
-                                        # Reset necessary variable
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node ID
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character either alphabet or number
-                                            if oneChar.isalpha() or oneChar.isdigit():
-                                                nodeId += oneChar
-                                                startExtract = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            if oneChar != ' ':
-                                                nodeId += oneChar
-                                                
-                                # Search for node latitude
-                                elif nodeLatFnd == False:
-                                    # Confirm next character are '0'
-                                    if oneChar == '0' and endOfLatLon == True:
-                                        nodeLat += " [degree]"
-                                                
-                                        nodeLatFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfLatLon = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-
-                                    # Previously there is NO latitude data
-                                    elif nodeLat == 'N/A' and endOfLatLon == True:
-                                        nodeLatFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfLatLon = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node latitude
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character number
-                                            if oneChar.isdigit():
-                                                nodeLat += oneChar
-                                                startExtract = True
-
-                                            # Latitude data are not available
-                                            elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeLat += oneChar
-
-                                                if nodeLat == 'N/A':
-                                                    endOfLatLon = True
-                                                
-                                        # Start append data
-                                        elif startExtract == True:
-                                            # Get the latitude data as long as not found unicode '\' character
-                                            if endOfLatLon == False:
-                                                if oneChar.isdigit() or oneChar == '.':
-                                                    nodeLat += oneChar
-
-                                                # End of latitude data - Found unicode '\' character
-                                                elif oneChar == chr(92):
-                                                    endOfLatLon = True
-
-                                # Search for node longitude
-                                elif nodeLonFnd == False:
-                                    # Confirm next character are '0'
-                                    if oneChar == '0' and endOfLatLon == True:
-                                        nodeLon += " [degree]"
-
-                                        nodeLonFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfLatLon = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-
-                                    # Previously there is NO longitude data
-                                    elif nodeLon == 'N/A' and endOfLatLon == True:
-                                        nodeLonFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfLatLon = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = '' 
-                                    
-                                    # Start get the node longitude
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character number
-                                            if oneChar.isdigit():
-                                                nodeLon += oneChar
-                                                startExtract = True
-
-                                            # Longitude data are not available
-                                            elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeLon += oneChar
-
-                                                if nodeLon == 'N/A':
-                                                    endOfLatLon = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            # Get the longitude data as long as not found unicode '\' character
-                                            if endOfLatLon == False:
-                                                if oneChar.isdigit() or oneChar == '.':
-                                                    nodeLon += oneChar
-
-                                                # End of latitude data - Found unicode '\' character
-                                                elif oneChar == chr(92):
-                                                    endOfLatLon = True
-
-                                # Search for node altitude
-                                elif nodeAltFnd == False:
-                                    # Confirm altitude data was completed
-                                    if endOfAlt == True:
-                                        nodeAltFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfAlt = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node altitude
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character number
-                                            if oneChar.isdigit():
-                                                nodeAlt += oneChar
-                                                startExtract = True
-
-                                            # Altitude data are not available
-                                            elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeAlt += oneChar
-
-                                                if nodeAlt == 'N/A':
-                                                    endOfAlt = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            if oneChar.isdigit() or oneChar == '.' or oneChar == 'm':
-                                                nodeAlt += oneChar
-                                                # End of altitude data
-                                                if 'm' in nodeAlt:
-                                                    endOfAlt = True
-
-                                # Search for node battery status
-                                elif nodeBattFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        nodeBatt += "[VDC]"
-                                            
-                                        nodeBattFnd = True
-                                        
-                                        # Reset necessary variable
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-
-                                    # Previously there is no battery voltage data
-                                    elif endOfBatt == True:
-                                        nodeBattFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfBatt = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node battery status
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character number
-                                            if oneChar.isdigit():
-                                                nodeBatt += oneChar
-                                                startExtract = True
-
-                                            # Battery data are not available
-                                            elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeBatt += oneChar
-
-                                                if nodeBatt == 'N/A':
-                                                    endOfBatt = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            if oneChar.isdigit() or oneChar == '.' or oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeBatt += oneChar
-                                        
-                                # Search for node SNR status
-                                elif nodeSnrFnd == False:
-                                    # Confirm SNR data was completed
-                                    if endOfSnr == True:
-                                        nodeSnrFnd = True
-                                        
-                                        # Reset necessary variable
-                                        endOfSnr = False
-                                        startExtract = False
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node SNR status
-                                    else:
-                                        # Check for first character
-                                        if startExtract == False:
-                                            # Check for the first character number
-                                            if oneChar.isdigit():
-                                                nodeSnr += oneChar
-                                                startExtract = True
-
-                                            # SNR data are not available
-                                            elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
-                                                nodeSnr += oneChar
-
-                                                if nodeSnr == 'N/A':
-                                                    endOfSnr = True
-
-                                        # Start append data
-                                        elif startExtract == True:
-                                            if oneChar.isdigit() or oneChar == '.' or oneChar == 'd' or oneChar == 'B':
-                                                nodeSnr += oneChar
-                                                # End of SNR data
-                                                if 'B' in nodeSnr:
-                                                    endOfSnr = True
-                                
-                                # Search for node last heard
-                                elif nodeLastHeardFnd == False:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        nodeLastHeardFnd = True
-                                        
-                                        # Reset necessary variable
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                    
-                                    # Start get the node last heard
-                                    else:
-                                        nodeLastHeard += oneChar
-
-                                # Search for node since - End of data for selected row
-                                elif nodeNumbFnd == True and usrNameFnd == True and akaFnd == True and nodeIdFnd == True and nodeLatFnd == True and nodeLonFnd == True \
-                                     and nodeAltFnd == True and nodeBattFnd == True and nodeSnrFnd == True and nodeLastHeardFnd == True:
-                                    # Confirm next character are '\'
-                                    if forCastOneChar == chr(92):
-                                        # Write to logger - For debugging
-                                        if backLogger == True:
-                                            logger.info("DEBUG_THD_SERIAL_MESH: No: [%s], User Name: [%s], A.K.A: [%s], Node ID: [%s], Lat: [%s], Lon: [%s], Alt: [%s], \
-                                            Batt: [%s], SNR: [%s], LastHeard: [%s], Since: [%s]" % (nodeNumber, nodeUser, nodeAka, nodeId, nodeLat, nodeLon, nodeAlt, \
-                                            nodeBatt, nodeSnr, nodeLastHeard, nodeSince))
-                                            logger.info(" ")
-                                            logger.info("####################################################################")
-                                            logger.info(" ")
-
-                                        else:
-                                            print ("DEBUG_THD_SERIAL_MESH: No: [%s], User Name: [%s], A.K.A: [%s], Node ID: [%s], Lat: [%s], Lon: [%s], Alt: [%s], \
-                                            Batt: [%s], SNR: [%s], LastHeard: [%s], Since: [%s]" % (nodeNumber, nodeUser, nodeAka, nodeId, nodeLat, nodeLon, nodeAlt, \
-                                            nodeBatt, nodeSnr, nodeLastHeard, nodeSince))
-                                            print (" ")
-                                            print ("####################################################################")
-                                            print (" ")
-
-                                        # Update python data dictionary with retrieve nodes info
-                                        try:
-                                            # Check the nodes ID whether its already exist or not
-                                            # Update the existing data, throw error if record is not exist, consider its a new data
-                                            nodeDB = [ nodeDBB for nodeDBB in meshNodeListData if (nodeDBB['ID'] == nodeId) ]
-
-                                            # There is a changes on the mesh data that need to be send to the node red TCP server
-                                            if nodeLat != nodeDB[0]['Latitude'] or nodeLon != nodeDB[0]['Longitude']:
-                                                # Set the updating flag
-                                                updateRecord = True
-                                                
-                                            nodeDB[0]['No'] = nodeNumber
-                                            nodeDB[0]['User'] = nodeUser
-                                            nodeDB[0]['AKA'] = nodeAka
-                                            nodeDB[0]['ID'] = nodeId
-                                            nodeDB[0]['Latitude'] = nodeLat
-                                            nodeDB[0]['Longitude'] = nodeLon
-                                            nodeDB[0]['Altitude'] = nodeAlt
-                                            nodeDB[0]['Battery'] = nodeBatt
-                                            nodeDB[0]['SNR'] = nodeSnr
-                                            nodeDB[0]['LastHeard'] = nodeLastHeard
-                                            nodeDB[0]['Since'] = nodeSince
-
-                                                                                       
-                                        # New mesh nodes data
-                                        except:
-                                            # Construct the new data
-                                            newData = {
-                                                        'No' : nodeNumber,
-                                                        'User' : nodeUser,
-                                                        'AKA' : nodeAka,
-                                                        'ID' : nodeId,
-                                                        'Latitude' : nodeLat,
-                                                        'Longitude' : nodeLon,
-                                                        'Altitude' : nodeAlt,
-                                                        'Battery' : nodeBatt,
-                                                        'SNR' : nodeSnr,
-                                                        'LastHeard' : nodeLastHeard,
-                                                        'Since' : nodeSince,
-                                                        }
-                                            # Append a NEW extension to the existing record
-                                            meshNodeListData.append(newData)
-                                            # NEW mesh data, need to send to node red TCP server, set the flag
-                                            updateRecord = True
-                                        
-                                        # Reset necessary variable
-                                        nodeNumbFnd = False
-                                        usrNameFnd = False
-                                        akaFnd = False
-                                        nodeIdFnd = False
-                                        nodeLatFnd = False
-                                        nodeLonFnd = False
-                                        nodeAltFnd = False
-                                        nodeBattFnd = False
-                                        nodeSnrFnd = False
-                                        nodeLastHeardFnd = False
-                                                   
-                                        nodeNumber = ''
-                                        nodeUser = ''
-                                        nodeAka = ''
-                                        nodeId = ''
-                                        nodeLat = ''
-                                        nodeLon = ''
-                                        nodeAlt = ''
-                                        nodeBatt = ''
-                                        nodeSnr = ''
-                                        nodeLastHeard = ''
-                                        nodeSince = ''
-                                                   
-                                        unicodeCharFnd = False
-                                        unicodeChar = False
-                                        unicodeBuff = ''
-                                        
-                                        # Initialize back row counter by factor of 2
-                                        rowCnt += 2
-                                                   
-                                        # Exit current loop
-                                        break
-
-                                # Start get the node since
-                                    else:
-                                        nodeSince += oneChar
-                                
-                pollNodesCnt = 0
-                rowCnt = 3
+        # Radio interface already been created
+        interface = radio.interface
+        if interface != None:
+            radio.pollCnt += 1
+            # Reach the polling interval, start poll the mesh nodes
+            # Polling interval 0 disable the full poll, except the first poll
+            if (nodePollSec > 0 and radio.pollCnt >= nodePollSec) or radio.firstPoll == False:
+                pollStart = time.perf_counter()
+                pollVersion = meshNodeRegistry.version
+
+                # Structured mesh nodes data ingestion, tagged with the radio name
+                # Only NEW nodes or nodes with changed last heard are converted
+                if nodeTableParse == False:
+                    newRecord, posChanged, changedIds = ingestInterfaceNodes(meshNodeRegistry, interface.nodes, radio.name)
+                    if newRecord == True or posChanged == True:
+                        updateRecord = True
+
+                # Legacy showNodes() table scraping
+                elif pollNodesTable(interface) == True:
+                    updateRecord = True
+
+                # Remove the nodes which are not heard for too long
+                if nodeExpireSec > 0 and meshNodeRegistry.removeStale(time.time() - nodeExpireSec):
+                    updateRecord = True
+
+                radio.pollCnt = 0
+                lastNodesUpdate = time.time()
+                metricPollSec.observe(time.perf_counter() - pollStart)
+
+                # Every change are streamed to the live event stream subscribers
+                if meshNodeRegistry.version != pollVersion:
+                    streamNotifier.notify()
 
                 # First poll initialization, at least mesh gateway node
-                if firstNodesData == False:
-                    firstNodesData = True
+                if radio.firstPoll == False:
+                    radio.firstPoll = True
                     # Send the first mesh data to the node red TCP server
-                    sendTcpDataType = 1
+                    nodesNotifier.notify()
 
                 # There is need to update a mesh nodes data to node red TCP server
                 elif updateRecord == True:
                     # Send the first mesh data to the node red TCP server
-                    sendTcpDataType = 1
+                    nodesNotifier.notify()
                     updateRecord = False
                     
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_THD_SERIAL_MESH: Device Nodes JSON Data:")
-                    logger.info(meshNodeListData)
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_THD_SERIAL_MESH: Device Nodes JSON Data:")
-                    print (meshNodeListData)
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
-
-        # Previously TTY MESH are not created, retry to connect
+                # Nodes data dump, only built if debug level enabled
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("DEBUG_THD_SERIAL_MESH: Device Nodes JSON Data: %s", meshNodeRegistry.legacyList())
+
+        # Radio interface not created or connection lost, retry to connect
         else:
-            # MESH API initialization attempt
+            # MESH API initialization attempt, every retry interval
             try:
-                # Increment initialization counter
-                connSerialMeshCnt += 1
-                # Every 10s try to initialize the MESH serial API
-                if connSerialMeshCnt == 10:
-                    meshSerInterface = meshtastic.SerialInterface()
-
-                    connSerialMeshCnt = 0
-                    ttyMeshNAvail = True
-
-                    # Write to logger - For debugging
-                    if backLogger == True:
-                        logger.info("DEBUG_THD_SERIAL_MESH: MESH API initialization SUCCESSFUL")
-                        logger.info(" ")
-                        logger.info("####################################################################")
-                        logger.info(" ")
-                    # Print statement
-                    else:
-                        print ("DEBUG_THD_SERIAL_MESH: MESH API initialization SUCCESSFUL")
-                        print (" ")
-                        print ("####################################################################")
-                        print (" ")
+                if meshRadios.connect(radio) == True:
+                    metricSerialInit.inc(1, (radio.name, 'ok'))
+                    logger.info("DEBUG_THD_SERIAL_MESH: MESH API initialization SUCCESSFUL, radio: [%s]", radio.name)
+                    greetMeshRadio(radio)
 
             # Error during MESH API initialization
-            except:
-                # Write to logger - For debugging
-                if backLogger == True:
-                    logger.info("DEBUG_THD_SERIAL_MESH: MESH API initialization FAILED!, retry attempt in 10s")
-                    logger.info(" ")
-                    logger.info("####################################################################")
-                    logger.info(" ")
-                # Print statement
-                else:
-                    print ("DEBUG_THD_SERIAL_MESH: MESH API initialization FAILED!, retry attempt in 10s")
-                    print (" ")
-                    print ("####################################################################")
-                    print (" ")
-
-                connSerialMeshCnt = 0
-                ttyMeshNAvail = False
+            except Exception as err:
+                logger.warning("DEBUG_THD_SERIAL_MESH: MESH API initialization FAILED!, radio: [%s], retry attempt in %ss %s", radio.name, radio.retrySec, err)
+                metricSerialInit.inc(1, (radio.name, 'failed'))
             
+# Run the REST API with the production WSGI server (cheroot, pure python)
+# Thread pool, keep alive and socket timeout are configurable, never return
+def runWsgiServer(host, port, certFile=None, keyFile=None):
+    # Production WSGI server, only needed in this serving mode
+    from cheroot import wsgi
+
+    server = wsgi.Server((host, port), app,
+                         numthreads=wsgiThreads,
+                         request_queue_size=int(getattr(settings, 'wsgiqueuesize', 64)),
+                         timeout=int(getattr(settings, 'wsgitimeout', 10)),
+                         shutdown_timeout=int(getattr(settings, 'wsgishutdowntimeout', 5)))
+
+    # Maximum number of idle keep alive connections, 0 - disable keep alive
+    server.keep_alive_conn_limit = int(getattr(settings, 'wsgikeepalive', 10))
+    if server.keep_alive_conn_limit <= 0:
+        server.protocol = 'HTTP/1.0'
+
+    # HTTPS, same certificate and key as the flask development server
+    if certFile != None:
+        from cheroot.ssl.builtin import BuiltinSSLAdapter
+        server.ssl_adapter = BuiltinSSLAdapter(certFile, keyFile)
+
+    logger.info("DEBUG_MAIN: REST API WSGI server starting up on %s port %s, threads: %s", host, port, server.numthreads)
+
+    try:
+        server.start()
+    finally:
+        server.stop()
+
 # Main daemon entry point    
 def main():
     global secureInSecure
-    global meshSerInterface
-    global ttyMeshNAvail
+    global tcpServer
+    global meshRadios
+    global txScheduler
+    global txCoalescer
+    global msgSpool
+    global messageHistory
+    global packetCapture
+
+    # Initialize airtime aware transmit scheduler for every outbound text message
+    # Duty cycle [%] are applied over the window [s], e.g. 10% per hour for EU868, 100% - no limit
+    txScheduler = TxScheduler(transmitMeshText,
+                              getattr(settings, 'modempreset', 'LONG_FAST'),
+                              float(getattr(settings, 'txdutycycle', 100.0)),
+                              float(getattr(settings, 'txdutywindowsec', 3600.0)),
+                              int(getattr(settings, 'txqueuesize', 500)),
+                              onTransmitError)
+
+    # Initialize thread for transmit scheduler
+    threadTxScheduler = threading.Thread(target=thread_txScheduler, args=(1, ), daemon=True)
+    # Start the thread
+    threadTxScheduler.start()
+
+    # Initialize optional coalescing stage, pack short text messages within the window [ms] into one payload
+    txCoalesceMs = int(getattr(settings, 'txcoalescems', 0))
+    if txCoalesceMs > 0:
+        txCoalescer = TxCoalescer(txScheduler, txCoalesceMs / 1000.0)
+
+        # Initialize thread for coalescing stage
+        threadTxCoalescer = threading.Thread(target=thread_txCoalescer, args=(1, ), daemon=True)
+        # Start the thread
+        threadTxCoalescer.start()
+
+    # Initialize received text message history, last msghistorysize messages kept in memory
+    # Optionally persisted to msghistorypath, up to msghistorymaxrows messages, '' - memory only
+    msgHistoryPath = getattr(settings, 'msghistorypath', '')
+    messageHistory = MessageHistory(int(getattr(settings, 'msghistorysize', 10000)),
+                                    msgHistoryPath if msgHistoryPath != '' else None,
+                                    int(getattr(settings, 'msghistorymaxrows', 1000000)))
+    if msgHistoryPath != '':
+        # Initialize thread for message history writer
+        threadMsgHistory = threading.Thread(target=thread_msgHistory, args=(1,1), daemon=True)
+        # Start the thread
+        threadMsgHistory.start()
+
+    # Initialize optional received packet capture, gzip compressed if capturepath end with '.gz'
+    if packetCaptureMode == True:
+        packetCapture = CaptureWriter(getattr(settings, 'capturepath', '/tmp/loraMesgGW.capture.gz'))
+
+        # Initialize thread for packet capture writer
+        threadCapture = threading.Thread(target=thread_capture, args=(1,1), daemon=True)
+        # Start the thread
+        threadCapture.start()
+
+    # Initialize mesh radios, meshradios setting or one radio from meshinterface and meshdevice
+    meshRadios = RadioManager(radiosFromSettings(meshRadioSettings or [{'name' : 'mesh', 'interface' : meshInterfaceType, 'device' : meshDevice}], \
+                                                 meshInterfaceOptions, meshRetrySec), openMeshInterface)
 
     pub.subscribe(onReceive, "meshtastic.receive")
     pub.subscribe(onConnection, "meshtastic.connection.established")
+    pub.subscribe(onConnectionLost, "meshtastic.connection.lost")
 
-    # Initialize device API - Try first
-    try:
-        meshSerInterface = meshtastic.SerialInterface()
-        ttyMeshNAvail = True
-
-        # Write to logger - For debugging
-        if backLogger == True:
-            logger.info("DEBUG_MAIN: MESH API initialization SUCCESSFUL")
-            logger.info(" ")
-            logger.info("####################################################################")
-            logger.info(" ")
-        # Print statement
-        else:
-            print ("DEBUG_MAIN: MESH API initialization SUCCESSFUL")
-            print (" ")
-            print ("####################################################################")
-            print (" ")
+    for radio in meshRadios:
+        # Initialize device API - Try first
+        try:
+            meshRadios.connect(radio)
+
+            logger.info("DEBUG_MAIN: MESH API initialization SUCCESSFUL, radio: [%s], interface: [%s]", radio.name, radio.kind)
+            greetMeshRadio(radio)
                         
-    # Error, TTY not created yet 
-    except:
-        ttyMeshNAvail = False
-        # Write to logger - For debugging
-        if backLogger == True:
-            logger.info("DEBUG_MAIN: MESH serial interface NOT ready!")
-            logger.info(" ")
-            logger.info("####################################################################")
-            logger.info(" ")
-        # Print statement
-        else:
-            print ("DEBUG_MAIN: MESH serial interface NOT ready!")
-            print (meshNodeListData)
-            print (" ")
-            print ("####################################################################")
-            print (" ")
+        # Error, TTY not created yet 
+        except Exception:
+            logger.warning("DEBUG_MAIN: MESH radio [%s] NOT ready!", radio.name)
         
-    
-    # Initialize thread for meshtastic serial interface
-    threadSerMesh = threading.Thread(target=thread_serial_mesh, args=(1,1), daemon=True)
-    # Start the thread
-    threadSerMesh.start()
+        # Initialize thread for the radio interface, one per radio
+        threadSerMesh = threading.Thread(target=thread_serial_mesh, args=(1,1,radio), daemon=True)
+        # Start the thread
+        threadSerMesh.start()
 
     # Initialize thread for node red tcp client 
     threadNodeRedTcp = threading.Thread(target=thread_tcpClient_NodeRed, args=(1,1), daemon=True)
     # Start the thread
     threadNodeRedTcp.start()
 
+    # Initialize optional store and forward spool for undelivered received text messages, '' - disabled
+    # Disk usage bounded by spoolmaxmb [MB], spooled messages older than spoolretentionsec [s] are discarded
+    spoolPath = getattr(settings, 'spoolpath', '/tmp/loraMesgGW.spool')
+    if spoolPath != '':
+        try:
+            msgSpool = Spool(spoolPath,
+                             int(float(getattr(settings, 'spoolmaxmb', 50)) * 1024 * 1024),
+                             int(getattr(settings, 'spoolretentionsec', 7 * 86400)))
+
+        # Error during opening the spool, continue without it
+        except Exception as err:
+            msgSpool = None
+            logger.error("DEBUG_MAIN: Spool initialization FAILED! %s", err)
+
+    # Initialize thread for live event stream
+    threadEventStream = threading.Thread(target=thread_eventStream, args=(1, ), daemon=True)
+    # Start the thread
+    threadEventStream.start()
+
+    # Initialize thread for node red outbound worker
+    threadOutbound = threading.Thread(target=thread_outbound_NodeRed, args=(1, ), daemon=True)
+    # Start the thread
+    threadOutbound.start()
+
+    # Initialize inbound TCP server
+    tcpServer = MeshMsgServer(tcpIpAddr, tcpServPortNo, onTcpServerMessage,
+                              int(getattr(settings, 'tcpservermaxclients', 16)),
+                              float(getattr(settings, 'tcpserveridlesec', 300)),
+                              onTcpServerEvent,
+                              getattr(settings, 'tcpserverframing', 'raw'))
+    tcpServer.start()
+
     # Initialize thread for TCP server
     threadTcpServer = threading.Thread(target=thread_tcpServer_NodeRed, args=(1, ), daemon=True)
     # Start the thread
@@ -1295,8 +1134,13 @@ def main():
         # openssl req -x509 -newkey rsa:4096 -nodes -out cert.pem -keyout key.pem -days 365
         #app.run(host='0.0.0.0', port=8000, ssl_context=('cert.pem', 'key.pem'))
         #app.run(host='0.0.0.0', port=8000, ssl_context=('asterisk.pem', 'ca.key'))
-        app.run(host='0.0.0.0', port=9000, ssl_context=('asterisk.pem', 'ca.key'))
+        if restWsgiServer == True:
+            runWsgiServer('0.0.0.0', 9000, 'asterisk.pem', 'ca.key')
+        else:
+            app.run(host='0.0.0.0', port=9000, ssl_context=('asterisk.pem', 'ca.key'))
     # Insecure web server (HTTP) - Default port 5000
+    elif restWsgiServer == True:
+        runWsgiServer('0.0.0.0', 9000)
     else:
         app.run(host='0.0.0.0', port=9000)        
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+# Packet capture and replay
+# Record every packet delivered by the "meshtastic.receive" subscription to a
+# compact JSON lines log, one '[receive time, packet]' line per packet, gzip
+# compressed if the file name end with '.gz', and feed a capture back at the
+# recorded pace, N times faster or at maximum speed
+import base64
+import gzip
+import json
+import logging
+import threading
+import time
+
+from meshsim import SimSentPacket
+from meshsim import BROADCAST_NUM
+from nodetable import formatNodesTable
+
+logger = logging.getLogger('lorameshgw')
+
+# Bytes values marker, e.g. the text message payload
+BYTES_KEY = '$b'
+
+# Packet keys which are not captured, the protobuf objects are rebuilt from the dictionary
+SKIP_KEYS = ('raw', )
+
+# Convert a packet value to JSON serializable value
+def encodeValue(value):
+    if isinstance(value, dict):
+        return dict([(str(key), encodeValue(item)) for key, item in value.items() if key not in SKIP_KEYS])
+    if isinstance(value, (list, tuple)):
+        return [encodeValue(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return {BYTES_KEY : base64.b64encode(bytes(value)).decode('ascii')}
+    if value == None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+# Convert a captured value back to the packet value
+def decodeValue(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and BYTES_KEY in value:
+            return base64.b64decode(value[BYTES_KEY])
+        return dict([(key, decodeValue(item)) for key, item in value.items()])
+    if isinstance(value, list):
+        return [decodeValue(item) for item in value]
+    return value
+
+# Open the capture file, gzip compressed if the file name end with '.gz'
+def openCaptureFile(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+# Read a capture, yield tuple of (receive epoch time, packet)
+def readCapture(path):
+    with openCaptureFile(path, 'r') as captureFile:
+        for line in captureFile:
+            if line.strip() == '':
+                continue
+            rxTime, packet = json.loads(line)
+            yield (rxTime, decodeValue(packet))
+
+# Packet capture writer
+# write() only keep the packet reference, the packets are serialized and appended
+# to the file in batches by flush(), called from a dedicated thread
+# Packets beyond maxPending waiting for the flush are dropped and counted
+class CaptureWriter(object):
+    def __init__(self, path, maxPending=100000):
+        self.path = path
+        self.maxPending = maxPending
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._fileLock = threading.Lock()
+
+    # Capture one received packet
+    def write(self, packet, rxTime=None):
+        if rxTime == None:
+            rxTime = time.time()
+        with self._lock:
+            if len(self._pending) >= self.maxPending:
+                self.dropped += 1
+                return
+            self._pending.append((rxTime, packet))
+            self.captured += 1
+
+    # Append the pending packets to the capture file, return the number of packets written
+    def flush(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        if len(pending) == 0:
+            return 0
+
+        lines = [json.dumps([round(rxTime, 6), encodeValue(packet)], separators=(',', ':')) + '\n' for (rxTime, packet) in pending]
+        with self._fileLock:
+            # Each flush append one gzip member, readers handle the concatenated members
+            with openCaptureFile(self.path, 'a') as captureFile:
+                captureFile.write(''.join(lines))
+            self.written += len(lines)
+        return len(lines)
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'path' : self.path,
+            'captured' : self.captured,
+            'written' : self.written,
+            'pending' : pending,
+            'dropped' : self.dropped,
+        }
+
+# Value at the percentile of the sorted values
+def percentile(sortedValues, pct):
+    if len(sortedValues) == 0:
+        return None
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct / 100.0))]
+
+# Capture replay driver
+# Feed each captured packet to handler(packet) at the recorded pace divided by speed,
+# speed 0 - maximum speed, and measure the handler latency and the scheduling lag
+# retime - stamp the packets with the current time, so the nodes look heard now
+class ReplayDriver(object):
+    def __init__(self, path, handler, speed=1.0, retime=True):
+        self.path = path
+        self.handler = handler
+        self.speed = float(speed)
+        self.retime = retime
+        self.report = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    # Replay the whole capture, return the report dictionary
+    def run(self):
+        latencies = []
+        lags = []
+        firstTime = None
+        lastTime = None
+        start = time.perf_counter()
+
+        for (rxTime, packet) in readCapture(self.path):
+            if self._stop.is_set():
+                break
+            if firstTime == None:
+                firstTime = rxTime
+            lastTime = rxTime
+
+            # Recorded pace
+            if self.speed > 0:
+                due = start + (rxTime - firstTime) / self.speed
+                waitSec = due - time.perf_counter()
+                if waitSec > 0 and self._stop.wait(waitSec):
+                    break
+                lags.append(max(0.0, time.perf_counter() - due))
+
+            if self.retime and packet.get('rxTime'):
+                packet['rxTime'] = int(time.time())
+
+            handlerStart = time.perf_counter()
+            self.handler(packet)
+            latencies.append(time.perf_counter() - handlerStart)
+
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        lags.sort()
+        self.report = {
+            'packets' : len(latencies),
+            'captureSec' : round(lastTime - firstTime, 3) if firstTime != None else 0.0,
+            'elapsedSec' : round(elapsed, 3),
+            'packetsPerSec' : round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+            'latencyP50Ms' : round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'latencyP99Ms' : round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+            'latencyMaxMs' : round(latencies[-1] * 1000, 3) if latencies else None,
+            'lagP99Ms' : round(percentile(lags, 99) * 1000, 3) if lags else None,
+        }
+        return self.report
+
+# Update an interface.nodes style dictionary from a received packet, like the meshtastic interface
+def updateInterfaceNodes(nodes, packet):
+    fromNum = packet.get('from')
+    fromId = packet.get('fromId') or ('!%08x' % (fromNum) if isinstance(fromNum, int) else None)
+    if not fromId:
+        return
+
+    node = nodes.get(fromId)
+    if node == None:
+        node = {'num' : fromNum, 'user' : {'id' : fromId, 'longName' : 'Meshtastic %s' % (fromId[-4:]), 'shortName' : fromId[-4:]}}
+        nodes[fromId] = node
+
+    if packet.get('rxTime'):
+        node['lastHeard'] = packet['rxTime']
+    if packet.get('rxSnr') != None:
+        node['snr'] = packet['rxSnr']
+
+    decoded = packet.get('decoded') or {}
+    portNum = decoded.get('portnum')
+    if portNum == 'POSITION_APP' and 'position' in decoded:
+        node['position'] = dict(decoded['position'])
+    elif portNum == 'NODEINFO_APP' and 'user' in decoded:
+        node['user'] = dict(decoded['user'], id=fromId)
+    elif portNum == 'TELEMETRY_APP' and 'deviceMetrics' in (decoded.get('telemetry') or {}):
+        node['deviceMetrics'] = dict(decoded['telemetry']['deviceMetrics'])
+
+# Replayed mesh interface
+# Publish a capture on the "meshtastic.receive" topic like a radio, the nodes are
+# rebuilt from the replayed packets, the report is logged at the end of the capture
+# speed   - replay pace multiplier, 0 - maximum speed
+# publish - pubsub send function, default pub.sendMessage
+class ReplayInterface(object):
+    def __init__(self, path, speed=1.0, publish=None):
+        if publish == None:
+            from pubsub import pub
+            publish = pub.sendMessage
+
+        self.publish = publish
+        self.nodes = {}
+        self.sentTexts = 0
+        self._sentIds = 0
+        self._lock = threading.Lock()
+        self.driver = ReplayDriver(path, self._feed, speed)
+
+        self.publish("meshtastic.connection.established", interface=self)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _feed(self, packet):
+        with self._lock:
+            updateInterfaceNodes(self.nodes, packet)
+        self.publish("meshtastic.receive", packet=packet, interface=self)
+
+    def _run(self):
+        try:
+            report = self.driver.run()
+            logger.info("DEBUG_REPLAY: Capture replay finished: %s", report)
+        except Exception as err:
+            logger.error("DEBUG_REPLAY: Capture replay FAILED! %s", err)
+
+    # Print and return the nodes table, most recently heard first
+    def showNodes(self, includeSelf=True):
+        with self._lock:
+            nodes = [dict(node) for node in self.nodes.values()]
+        nodes.sort(key=lambda node: node.get('lastHeard') or 0, reverse=True)
+        table = formatNodesTable(nodes)
+        print(table)
+        return table
+
+    # Text messages are not transmitted, only counted
+    def sendText(self, text, destinationId='^all', wantAck=False, wantResponse=False, onResponse=None, channelIndex=0):
+        self.sentTexts += 1
+        self._sentIds += 1
+        toNum = BROADCAST_NUM if destinationId == '^all' else destinationId
+        return SimSentPacket(self._sentIds, toNum, text, channelIndex)
+
+    def close(self):
+        self.driver.stop()
+        if self._thread != threading.current_thread():
+            self._thread.join(1.0)
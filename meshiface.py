@@ -0,0 +1,49 @@
+# Mesh radio interface factory
+# Open the meshtastic interface selected by the meshinterface setting, every
+# interface deliver its packets on the same pubsub topics and provide nodes,
+# showNodes() and sendText():
+#   'serial' - USB radio, device = serial port, None - auto detect
+#   'tcp'    - network radio through the meshtastic TCP API, device = host name
+#   'sim'    - simulated mesh (see meshsim.py), no radio needed
+#   'replay' - recorded capture (see meshcapture.py), device = capture file
+
+# Supported interface types
+INTERFACE_TYPES = ('serial', 'tcp', 'sim', 'replay')
+
+# Meshtastic interface class, top level in older library versions, in its own module in newer ones
+def meshtasticClass(moduleName, className):
+    import meshtastic
+    if hasattr(meshtastic, className):
+        return getattr(meshtastic, className)
+
+    import importlib
+    return getattr(importlib.import_module('meshtastic.' + moduleName), className)
+
+# Open the mesh interface
+# options - SimInterface or ReplayInterface keyword arguments, e.g. {'nodeCount' : 50, 'speed' : 10}
+# Raise an exception if the radio is not available
+def createInterface(kind='serial', device=None, options=None):
+    if kind == 'serial':
+        serialInterface = meshtasticClass('serial_interface', 'SerialInterface')
+        if device:
+            return serialInterface(device)
+        return serialInterface()
+
+    elif kind == 'tcp':
+        if not device:
+            raise ValueError("TCP mesh interface need the radio host name")
+        return meshtasticClass('tcp_interface', 'TCPInterface')(device)
+
+    elif kind == 'sim':
+        # Simulator, only loaded in this mode
+        from meshsim import SimInterface
+        return SimInterface(**(options or {}))
+
+    elif kind == 'replay':
+        if not device:
+            raise ValueError("Replay mesh interface need the capture file")
+        # Capture replay, only loaded in this mode
+        from meshcapture import ReplayInterface
+        return ReplayInterface(device, **(options or {}))
+
+    raise ValueError("Unknown mesh interface type: %s" % (kind))
@@ -0,0 +1,595 @@
+# Mesh nodes registry
+# Keep the mesh nodes data indexed by node ID, each node stored as a compact
+# record with typed values, and produce the legacy list of dictionary view
+# for the REST API and the node red TCP server
+import base64
+import bisect
+import gzip
+import json
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from meshpacket import getSenderId
+from meshpacket import normalizeNodeId
+
+# Legacy 'not available' marker
+NOT_AVAIL = 'N/A'
+
+# Convert a legacy decorated string (e.g. "3.1234 [degree]", "12m", "6.25dB") to float
+# Return None if the data are not available
+def parseFloatField(data):
+    if data is None:
+        return None
+    if isinstance(data, (int, float)):
+        return float(data)
+
+    numData = ''
+    for oneChar in data.strip():
+        if oneChar.isdigit() or oneChar in '.-+':
+            numData += oneChar
+        elif numData != '':
+            break
+
+    try:
+        return float(numData)
+    except ValueError:
+        return None
+
+# Convert a legacy last heard string (e.g. "2023-10-17 12:00:00") to epoch seconds
+# Return None if the data are not available
+def parseLastHeard(data):
+    if data is None:
+        return None
+    if isinstance(data, (int, float)):
+        return int(data)
+
+    try:
+        return int(datetime.strptime(data.strip(), "%Y-%m-%d %H:%M:%S").timestamp())
+    except ValueError:
+        return None
+
+# Format helper for the legacy view
+def formatField(value, fmt):
+    if value is None:
+        return NOT_AVAIL
+    return fmt % (value)
+
+# Format the elapsed time since the node was last heard, same wording as showNodes()
+def formatTimeAgo(lastHeard, now=None):
+    if not lastHeard:
+        return NOT_AVAIL
+    if now == None:
+        now = time.time()
+
+    delta = int(now - lastHeard)
+    if delta < 0:
+        return NOT_AVAIL
+    if delta < 1:
+        return 'now'
+    for (unitSec, unitName) in ((86400, 'day'), (3600, 'hour'), (60, 'min'), (1, 'sec')):
+        if delta >= unitSec:
+            count = delta // unitSec
+            return '%d %s%s ago' % (count, unitName, 's' if count > 1 else '')
+    return NOT_AVAIL
+
+# Epoch time when the formatTimeAgo() wording of the last heard time change next
+# Return None if the wording never change
+def nextTimeAgoChange(lastHeard, now):
+    if not lastHeard:
+        return None
+
+    delta = int(now - lastHeard)
+    if delta < 0:
+        return lastHeard
+    for unitSec in (86400, 3600, 60):
+        if delta >= unitSec:
+            return lastHeard + (delta // unitSec + 1) * unitSec
+    return lastHeard + delta + 1
+
+# Convert one entry of the meshtastic interface.nodes dictionary to node record fields
+# Return tuple of (node ID, fields dictionary)
+def nodeFieldsFromInterface(node):
+    user = node.get('user') or {}
+    position = node.get('position') or {}
+    metrics = node.get('deviceMetrics') or {}
+
+    nodeId = user.get('id')
+    if not nodeId:
+        nodeId = '%08x' % (node.get('num', 0))
+
+    # Battery level are reported in device metrics, older firmware report it in position
+    battery = metrics.get('batteryLevel')
+    if battery == None:
+        battery = position.get('batteryLevel')
+
+    fields = {
+        'user' : user.get('longName', NOT_AVAIL),
+        'aka' : user.get('shortName', NOT_AVAIL),
+        'lat' : position.get('latitude'),
+        'lon' : position.get('longitude'),
+        'alt' : position.get('altitude'),
+        'battery' : battery,
+        'snr' : node.get('snr'),
+        'lastHeard' : node.get('lastHeard'),
+    }
+
+    # Keep values typed as float, like the legacy table parser
+    for key in ('lat', 'lon', 'alt', 'battery', 'snr'):
+        if fields[key] != None:
+            fields[key] = float(fields[key])
+
+    return (normalizeNodeId(nodeId), fields)
+
+# Ingest the meshtastic interface.nodes dictionary into the registry
+# Only records which are NEW or whose last heard changed are converted and updated
+# source - radio name the nodes are heard by, a node last heard more recently by
+#          another radio is left untouched
+# Return tuple of (any new record, any position changed, list of changed node ID)
+def ingestInterfaceNodes(registry, nodes, source=None):
+    anyNew = False
+    anyPosChanged = False
+    changedIds = []
+
+    if not nodes:
+        return (anyNew, anyPosChanged, changedIds)
+
+    # Interface nodes are updated by the meshtastic reader thread, iterate over a copy
+    for node in list(nodes.values()):
+        lastHeard = node.get('lastHeard')
+        user = node.get('user') or {}
+        nodeId = user.get('id')
+        if nodeId:
+            record = registry.get(normalizeNodeId(nodeId))
+            # Nothing new since the previous ingestion
+            # Records created from POSITION/TELEMETRY packets share the last heard but miss the user
+            # names (or the position), fill them from the interface nodes
+            if record != None and lastHeard != None and record.lastHeard == lastHeard and record.user and record.aka \
+               and (record.lat != None or not node.get('position')):
+                continue
+            # Heard more recently by another radio
+            if source != None and record != None and lastHeard != None and record.lastHeard != None and lastHeard < record.lastHeard:
+                continue
+
+        nodeId, fields = nodeFieldsFromInterface(node)
+        if not nodeId:
+            continue
+        if source != None:
+            fields['source'] = source
+
+        newRecord, posChanged, anyChanged = registry.update(nodeId, **fields)
+        if newRecord == True:
+            anyNew = True
+        if posChanged == True:
+            anyPosChanged = True
+        if anyChanged == True:
+            changedIds.append(nodeId)
+
+    return (anyNew, anyPosChanged, changedIds)
+
+# Application port numbers which carry node data
+NODE_PORTNUMS = ('POSITION_APP', 'NODEINFO_APP', 'TELEMETRY_APP')
+
+# Convert a received POSITION/NODEINFO/TELEMETRY packet to node record fields
+# Return tuple of (node ID, fields dictionary), node ID are empty if the packet carry no node data
+def nodeFieldsFromPacket(packet):
+    decoded = packet.get('decoded') or {}
+    portNum = decoded.get('portnum')
+    fields = {}
+
+    # Position report
+    if portNum == 'POSITION_APP':
+        position = decoded.get('position') or {}
+        if 'latitude' in position and 'longitude' in position:
+            fields['lat'] = float(position['latitude'])
+            fields['lon'] = float(position['longitude'])
+        if 'altitude' in position:
+            fields['alt'] = float(position['altitude'])
+
+    # User information
+    elif portNum == 'NODEINFO_APP':
+        user = decoded.get('user') or {}
+        if 'longName' in user:
+            fields['user'] = user['longName']
+        if 'shortName' in user:
+            fields['aka'] = user['shortName']
+
+    # Device telemetry
+    elif portNum == 'TELEMETRY_APP':
+        telemetry = decoded.get('telemetry') or {}
+        metrics = telemetry.get('deviceMetrics') or {}
+        if 'batteryLevel' in metrics:
+            fields['battery'] = float(metrics['batteryLevel'])
+
+    # Not a node data packet
+    else:
+        return ('', fields)
+
+    # Every node data packet refresh the link quality and last heard
+    if packet.get('rxSnr') != None:
+        fields['snr'] = float(packet['rxSnr'])
+    if packet.get('rxTime'):
+        fields['lastHeard'] = int(packet['rxTime'])
+
+    return (getSenderId(packet), fields)
+
+# Apply a received node data packet to the registry
+# source - radio name the packet was received by
+# Return tuple of (new record, position changed, any field changed)
+def applyNodePacket(registry, packet, source=None):
+    nodeId, fields = nodeFieldsFromPacket(packet)
+    if not nodeId:
+        return (False, False, False)
+    if source != None:
+        fields['source'] = source
+    return registry.update(nodeId, **fields)
+
+# Mesh node record
+class MeshNodeRecord(object):
+    __slots__ = ('no', 'user', 'aka', 'nodeId', 'lat', 'lon', 'alt', 'battery', 'snr', 'lastHeard', 'since', 'source', 'rev')
+
+    def __init__(self, nodeId, no=0, user='', aka='', lat=None, lon=None, alt=None, battery=None, snr=None, lastHeard=None, since='', source=''):
+        self.nodeId = nodeId
+        self.no = no
+        self.user = user
+        self.aka = aka
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.battery = battery
+        self.snr = snr
+        self.lastHeard = lastHeard
+        self.since = since
+        # Name of the radio which last heard the node, '' - single radio or legacy table
+        self.source = source
+        # Registry version of the last change of this record
+        self.rev = 0
+
+    # Legacy dictionary view, same keys and string format as the previous node list data
+    def toLegacy(self, now=None):
+        if self.lastHeard:
+            lastHeard = datetime.fromtimestamp(self.lastHeard).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            lastHeard = NOT_AVAIL
+
+        return {
+            'No' : str(self.no),
+            'User' : self.user,
+            'AKA' : self.aka,
+            'ID' : self.nodeId,
+            'Latitude' : formatField(self.lat, "%.4f [degree]"),
+            'Longitude' : formatField(self.lon, "%.4f [degree]"),
+            'Altitude' : formatField(self.alt, "%.0fm"),
+            'Battery' : formatField(self.battery, "%.0f[VDC]"),
+            'SNR' : formatField(self.snr, "%.2fdB"),
+            'LastHeard' : lastHeard,
+            'Since' : formatTimeAgo(self.lastHeard, now) if self.lastHeard else self.since,
+        }
+
+    def __repr__(self):
+        return "MeshNodeRecord(%r)" % (self.toLegacy())
+
+# Mesh nodes registry, O(1) lookup by node ID
+# Node ID are kept WITHOUT the leading '!' character
+class MeshNodeRegistry(object):
+    def __init__(self):
+        self._nodes = {}
+        # Removed node ID with the registry version of the removal
+        self._removed = {}
+        self._lock = threading.RLock()
+        # Incremented on every change of the registry
+        self.version = 0
+        # Last given record number, never reused after a removal
+        self._lastNo = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, nodeId):
+        return nodeId in self._nodes
+
+    # Get the node record, return None if the node ID are not exist
+    def get(self, nodeId):
+        return self._nodes.get(nodeId)
+
+    # Snapshot of the current node records
+    def records(self):
+        with self._lock:
+            return list(self._nodes.values())
+
+    # Update the node record fields, create a NEW record if the node ID are not exist
+    # Return tuple of (new record, position changed, any field changed)
+    def update(self, nodeId, **fields):
+        with self._lock:
+            record = self._nodes.get(nodeId)
+            isNew = record == None
+            if isNew:
+                # Record number follow the registration order, unless given
+                self._lastNo += 1
+                record = MeshNodeRecord(nodeId, no=self._lastNo)
+                self._nodes[nodeId] = record
+                self._removed.pop(nodeId, None)
+
+            posChanged = isNew
+            changed = isNew
+            for key, value in fields.items():
+                if getattr(record, key) != value:
+                    setattr(record, key, value)
+                    changed = True
+                    if key == 'lat' or key == 'lon':
+                        posChanged = True
+
+            # Given record number, the next registered record follow it
+            if isinstance(record.no, int) and record.no > self._lastNo:
+                self._lastNo = record.no
+
+            if changed:
+                self.version += 1
+                record.rev = self.version
+
+            return (isNew, posChanged, changed)
+
+    # Update the node record from the legacy decorated string fields
+    # Return tuple of (new record, position changed, any field changed)
+    def updateFromLegacy(self, no, user, aka, nodeId, lat, lon, alt, battery, snr, lastHeard, since):
+        try:
+            no = int(no)
+        except ValueError:
+            no = 0
+
+        return self.update(nodeId,
+                           no=no,
+                           user=user,
+                           aka=aka,
+                           lat=parseFloatField(lat),
+                           lon=parseFloatField(lon),
+                           alt=parseFloatField(alt),
+                           battery=parseFloatField(battery),
+                           snr=parseFloatField(snr),
+                           lastHeard=parseLastHeard(lastHeard),
+                           since=since)
+
+    # Remove the node record, return True if the record was exist
+    def remove(self, nodeId):
+        with self._lock:
+            if self._nodes.pop(nodeId, None) == None:
+                return False
+            self.version += 1
+            self._removed[nodeId] = self.version
+            return True
+
+    # Remove the nodes which are not heard since the given epoch time
+    # Return list of removed node ID
+    def removeStale(self, heardBefore):
+        with self._lock:
+            staleIds = [nodeId for nodeId, record in self._nodes.items() \
+                        if record.lastHeard != None and record.lastHeard < heardBefore]
+            for nodeId in staleIds:
+                self.remove(nodeId)
+            return staleIds
+
+    # Changes since the given registry version
+    # Return tuple of (list of changed records legacy view, list of removed node ID, current version)
+    def changesSince(self, version):
+        with self._lock:
+            upserts = [record.toLegacy() for record in self._nodes.values() if record.rev > version]
+            removedIds = [nodeId for nodeId, rev in self._removed.items() if rev > version]
+            return (upserts, removedIds, self.version)
+
+    # Forget the removed node ID up to the given registry version, once delivered
+    def forgetRemoved(self, version):
+        with self._lock:
+            for nodeId in [nodeId for nodeId, rev in self._removed.items() if rev <= version]:
+                del self._removed[nodeId]
+
+    # Legacy list of dictionary view for '/meshnodesinfo' and the node red feed
+    def legacyList(self, now=None):
+        with self._lock:
+            return [record.toLegacy(now) for record in self._nodes.values()]
+
+# Legacy field name to node record attribute, for the query sort key
+LEGACY_SORT_KEYS = {
+    'No' : 'no',
+    'User' : 'user',
+    'AKA' : 'aka',
+    'ID' : 'nodeId',
+    'Latitude' : 'lat',
+    'Longitude' : 'lon',
+    'Altitude' : 'alt',
+    'Battery' : 'battery',
+    'SNR' : 'snr',
+    'LastHeard' : 'lastHeard',
+    'Since' : 'lastHeard',
+}
+
+# Sort key of one record, records without the value sort last, node ID break the ties
+def recordSortKey(record, attr):
+    value = getattr(record, attr)
+    if value == None:
+        return (1, 0, record.nodeId)
+    return (0, value, record.nodeId)
+
+# Opaque pagination cursor, sort order and sort key of the last returned record
+def encodeCursor(sortBy, sortKey):
+    return base64.urlsafe_b64encode(json.dumps([sortBy] + list(sortKey)).encode()).decode()
+
+# Decode the cursor, raise ValueError if it is malformed or was issued for another sort order
+def decodeCursor(cursor, sortBy):
+    try:
+        cursorSortBy, missing, value, nodeId = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if cursorSortBy != sortBy:
+        raise ValueError("cursor was issued for sort=%s" % (cursorSortBy))
+    if missing not in (0, 1) or not isinstance(nodeId, str):
+        raise ValueError("invalid cursor")
+    return (missing, value, nodeId)
+
+# Query indexes of the mesh nodes registry
+# Sorted indexes are built once per registry version and per sort key, so
+# repeated queries between two changes only bisect the indexes
+class NodeQueryIndex(object):
+    def __init__(self, registry):
+        self.registry = registry
+        self._version = -1
+        self._sorted = {}
+        self._lock = threading.Lock()
+
+        # Index counters
+        self.builds = 0
+
+    # Sorted index of (sort keys, records) for the record attribute
+    def _index(self, attr):
+        with self._lock:
+            if self._version != self.registry.version:
+                self._version = self.registry.version
+                self._sorted = {}
+
+            index = self._sorted.get(attr)
+            if index == None:
+                pairs = sorted([(recordSortKey(record, attr), record) for record in self.registry.records()], key=lambda pair: pair[0])
+                index = ([pair[0] for pair in pairs], [pair[1] for pair in pairs])
+                self._sorted[attr] = index
+                self.builds += 1
+            return index
+
+    # Query the mesh nodes
+    # fields     - list of legacy field names to return, None - all fields
+    # heardSince - only the nodes last heard at or after this epoch time
+    # sortBy     - legacy field name, prefix '-' for descending order
+    # limit      - maximum number of nodes, None - no limit
+    # cursor     - 'nextCursor' of the previous page
+    # Return tuple of (list of legacy dictionary, next cursor or None)
+    def query(self, fields=None, heardSince=None, sortBy='No', limit=None, cursor=None):
+        descending = sortBy.startswith('-')
+        sortField = sortBy.lstrip('-')
+        if sortField not in LEGACY_SORT_KEYS:
+            raise ValueError("Unknown sort field: %s" % (sortField))
+        if fields != None:
+            for field in fields:
+                if field not in LEGACY_SORT_KEYS:
+                    raise ValueError("Unknown field: %s" % (field))
+        attr = LEGACY_SORT_KEYS[sortField]
+
+        keys, records = self._index(attr)
+
+        # Last heard filter, bisect the last heard index when sorted by it,
+        # otherwise walk the requested sort index and skip the nodes heard before
+        heardFilter = None
+        if heardSince != None:
+            if attr == 'lastHeard':
+                start = bisect.bisect_left(keys, (0, heardSince, ''))
+                end = bisect.bisect_left(keys, (1, 0, ''))
+                keys, records = keys[start:end], records[start:end]
+            else:
+                heardFilter = lambda record: record.lastHeard != None and record.lastHeard >= heardSince
+
+        # Descending order, walk the index backward
+        if descending:
+            keys = keys[::-1]
+            records = records[::-1]
+
+        # Continue after the cursor record
+        pos = 0
+        if cursor != None:
+            cursorKey = decodeCursor(cursor, sortBy)
+            try:
+                if descending:
+                    pos = len(keys) - bisect.bisect_left(keys[::-1], cursorKey)
+                else:
+                    pos = bisect.bisect_right(keys, cursorKey)
+            # Sort value of another type, e.g. a text where a number is expected
+            except TypeError:
+                raise ValueError("invalid cursor")
+
+        # Index positions of the page records
+        if heardFilter == None:
+            end = len(records) if limit == None else min(pos + limit, len(records))
+            selected = range(pos, end)
+            hasMore = end < len(records)
+        else:
+            selected = []
+            end = pos
+            while end < len(records) and (limit == None or len(selected) < limit):
+                if heardFilter(records[end]):
+                    selected.append(end)
+                end += 1
+            hasMore = any(heardFilter(record) for record in records[end:])
+
+        now = time.time()
+        page = []
+        for n in selected:
+            node = records[n].toLegacy(now)
+            if fields != None:
+                node = dict([(field, node[field]) for field in fields])
+            page.append(node)
+
+        nextCursor = encodeCursor(sortBy, keys[selected[-1]]) if hasMore and len(selected) > 0 else None
+        return (page, nextCursor)
+
+# Serialized '/meshnodesinfo' response
+class NodesInfoEntry(object):
+    __slots__ = ('version', 'validUntil', 'body', 'etag', '_gzipBody')
+
+    def __init__(self, version, validUntil, body):
+        self.version = version
+        self.validUntil = validUntil
+        self.body = body
+        self.etag = '%d-%08x' % (version, zlib.crc32(body))
+        self._gzipBody = None
+
+    # Compressed body, built once on first request
+    @property
+    def gzipBody(self):
+        if self._gzipBody == None:
+            self._gzipBody = gzip.compress(self.body, 6)
+        return self._gzipBody
+
+# Pre serialized '/meshnodesinfo' response cache
+# The response are built once per registry version, and again only when the
+# 'Since' wording of one of the nodes change (e.g. '5 mins ago' -> '6 mins ago')
+class NodesInfoCache(object):
+    def __init__(self, registry, rootKey='MeshNodesInfo'):
+        self.registry = registry
+        self.rootKey = rootKey
+        self._entry = None
+        self._lock = threading.Lock()
+
+        # Cache counters
+        self.hits = 0
+        self.builds = 0
+
+    # Current response entry
+    def get(self, now=None):
+        if now == None:
+            now = time.time()
+
+        entry = self._entry
+        if entry != None and entry.version == self.registry.version and (entry.validUntil == None or now < entry.validUntil):
+            self.hits += 1
+            return entry
+
+        with self._lock:
+            entry = self._entry
+            if entry != None and entry.version == self.registry.version and (entry.validUntil == None or now < entry.validUntil):
+                self.hits += 1
+                return entry
+
+            with self.registry._lock:
+                version = self.registry.version
+                records = self.registry.records()
+                nodeList = [record.toLegacy(now) for record in records]
+
+            validUntil = None
+            for record in records:
+                nextChange = nextTimeAgoChange(record.lastHeard, now)
+                if nextChange != None and (validUntil == None or nextChange < validUntil):
+                    validUntil = nextChange
+
+            # Same encoding as flask jsonify()
+            body = (json.dumps({self.rootKey : nodeList}, sort_keys=True, separators=(',', ':')) + '\n').encode()
+            entry = NodesInfoEntry(version, validUntil, body)
+            self._entry = entry
+            self.builds += 1
+            return entry
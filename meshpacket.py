@@ -0,0 +1,152 @@
+# Meshtastic packet decoder
+# Read the received packet fields directly from the packet dictionary
+# delivered by the "meshtastic.receive" subscription, instead of scanning
+# the packet string representation character by character
+import time
+
+# Meshtastic broadcast node number
+BROADCAST_NUM = 0xFFFFFFFF
+
+# Decoded text message record
+class RxTextMsg(object):
+    __slots__ = ('text', 'rxTime', 'senderId', 'rxSnr', 'hopLimit', 'packetId', 'channel', 'toId')
+
+    def __init__(self, text, rxTime, senderId, rxSnr, hopLimit, packetId, channel, toId):
+        self.text = text
+        self.rxTime = rxTime
+        self.senderId = senderId
+        self.rxSnr = rxSnr
+        self.hopLimit = hopLimit
+        self.packetId = packetId
+        self.channel = channel
+        self.toId = toId
+
+    def __repr__(self):
+        return "RxTextMsg(senderId=%r, text=%r, rxTime=%r)" % (self.senderId, self.text, self.rxTime)
+
+# Get the application port number of the packet, e.g. 'TEXT_MESSAGE_APP'
+# Return empty string if the packet was not decoded by the radio (encrypted)
+def getPortNum(packet):
+    decoded = packet.get('decoded')
+    if not decoded:
+        return ''
+    portNum = decoded.get('portnum', '')
+    # Some firmware/library versions deliver the enum number instead of the name
+    if not isinstance(portNum, str):
+        portNum = str(portNum)
+    return portNum
+
+# Convert a node ID to the format used by the mesh node list data
+# Node list data keep the node ID WITHOUT the leading '!' character
+def normalizeNodeId(nodeId):
+    if not nodeId:
+        return ''
+    if nodeId[0] == '!':
+        return nodeId[1:]
+    return nodeId
+
+# Get the sender ID of the packet
+# Fallback to the numeric 'from' field when 'fromId' are not available
+def getSenderId(packet):
+    fromId = packet.get('fromId')
+    if fromId:
+        return normalizeNodeId(fromId)
+
+    fromNum = packet.get('from')
+    if isinstance(fromNum, int):
+        return '%08x' % (fromNum)
+
+    return ''
+
+# Decode text message packet
+# Return None if the packet is NOT a text message
+def decodeTextPacket(packet):
+    decoded = packet.get('decoded')
+    if not decoded or decoded.get('portnum') != 'TEXT_MESSAGE_APP':
+        return None
+
+    # Text payload, fallback to the raw payload bytes
+    text = decoded.get('text')
+    if text is None:
+        payload = decoded.get('payload', b'')
+        if isinstance(payload, (bytes, bytearray)):
+            text = bytes(payload).decode('utf-8', 'replace')
+        else:
+            text = str(payload)
+
+    # Receive time stamp, fallback to the local time
+    rxTime = packet.get('rxTime')
+    if not rxTime:
+        rxTime = int(time.time())
+
+    # Destination, fallback to the numeric 'to' field
+    toId = packet.get('toId')
+    if toId is None:
+        toNum = packet.get('to', BROADCAST_NUM)
+        toId = '^all' if toNum == BROADCAST_NUM else '!%08x' % (toNum)
+
+    return RxTextMsg(text,
+                     rxTime,
+                     getSenderId(packet),
+                     packet.get('rxSnr'),
+                     packet.get('hopLimit'),
+                     packet.get('id'),
+                     packet.get('channel', 0),
+                     toId)
+
+# Legacy decoder, scan the string representation of the packet
+# Kept ONLY as a reference for the benchmark, do NOT use it on the hot path
+# Return tuple of (text message payload, time stamp, sender ID)
+def scanTextPacketLegacy(rxData):
+    def mid(s, offset, amount):
+        return s[offset-1:offset+amount-1]
+
+    txtMsgPayLoad = ''
+    msgTimeStamp = ''
+    senderId = ''
+    curlyOpenCnt = 0
+    colonCnt = 0
+    apostCnt = 0
+    curlyOpenFnd = False
+    retrTextMsg = False
+    colonFnd = False
+    apostFnd = False
+    retrTimeStmp = False
+    retrSenderId = False
+
+    for a in range(0, (len(rxData) + 1)):
+        oneChar = mid(rxData, a, 1)
+        if oneChar == '{' and curlyOpenFnd == False:
+            curlyOpenCnt += 1
+            if curlyOpenCnt == 3:
+                curlyOpenFnd = True
+        elif curlyOpenFnd == True and retrTextMsg == False:
+            if oneChar == chr(34):
+                retrTextMsg = True
+        elif retrTextMsg == True and colonFnd == False:
+            if oneChar != chr(34):
+                txtMsgPayLoad += oneChar
+            else:
+                colonFnd = True
+        elif colonFnd == True and retrTimeStmp == False:
+            if oneChar == chr(58):
+                colonCnt += 1
+                if colonCnt == 2:
+                    retrTimeStmp = True
+        elif retrTimeStmp == True and retrSenderId == False:
+            if oneChar == '\n':
+                retrSenderId = True
+            elif oneChar != ' ':
+                msgTimeStamp += oneChar
+        elif retrSenderId == True and apostFnd == False:
+            if oneChar == chr(39):
+                apostCnt += 1
+                if apostCnt == 3:
+                    apostFnd = True
+        elif apostFnd == True:
+            if oneChar != chr(39) and oneChar != chr(33):
+                senderId += oneChar
+            elif oneChar == chr(39):
+                break
+
+    return (txtMsgPayLoad, msgTimeStamp, senderId)
@@ -0,0 +1,183 @@
+# Mesh radios
+# Several radios (serial ports, meshtastic TCP interfaces, simulators) managed
+# by one gateway, each with its own reconnect supervision. Received packets are
+# tagged with the radio they came from, outbound text messages are routed to
+# the radio which last heard the destination node, or serving the channel
+import threading
+import time
+
+from meshpacket import normalizeNodeId
+
+# Node number range step between the simulated radios
+SIM_RADIO_NUM_STEP = 0x01000000
+
+# One mesh radio
+# kind     - interface type, see meshiface.py
+# device   - serial port, radio host name or capture file
+# options  - interface keyword arguments (simulator, replay)
+# channels - channel indexes served by the radio, None - every channel
+# retrySec - reconnect attempt interval [s]
+class MeshRadio(object):
+    def __init__(self, name, kind='serial', device=None, options=None, channels=None, retrySec=10.0):
+        self.name = name
+        self.kind = kind
+        self.device = device
+        self.options = options
+        self.channels = tuple(channels) if channels != None else None
+        self.retrySec = retrySec
+
+        self.interface = None
+        self.txLock = threading.Lock()       # Serialize the text messages handed to this radio
+        self.pollCnt = 0                     # Polling counter for nodes info
+        self.firstPoll = False               # First poll for nodes data done
+        self.nextAttempt = 0.0               # Monotonic time of the next connect attempt
+
+        # Radio counters
+        self.connects = 0
+        self.failures = 0
+        self.lost = 0
+        self.sent = 0
+        self.lastError = ''
+        self.connectedSince = None
+
+    @property
+    def connected(self):
+        return self.interface != None
+
+    # Check whether the radio serve the channel index
+    def serves(self, channelIndex):
+        return self.channels == None or channelIndex in self.channels
+
+# Build the radio list from the meshradios setting, list of dictionaries, e.g.
+# [{'name' : 'north', 'interface' : 'serial', 'device' : '/dev/ttyUSB0', 'channels' : [0, 1]},
+#  {'name' : 'south', 'interface' : 'tcp', 'device' : '192.168.1.20', 'channels' : [2]}]
+def radiosFromSettings(radioSettings, defaultOptions=None, retrySec=10.0):
+    radios = []
+    for n, radioSetting in enumerate(radioSettings):
+        kind = radioSetting.get('interface', 'serial')
+        options = radioSetting.get('options')
+        if options == None and defaultOptions != None:
+            options = defaultOptions.get(kind)
+
+        # Each simulated radio get its own node number range, unless given
+        if kind == 'sim' and 'baseNum' not in (options or {}):
+            # Simulator, only loaded when a simulated radio is configured
+            from meshsim import SIM_BASE_NUM
+            options = dict(options or {}, baseNum=SIM_BASE_NUM + n * SIM_RADIO_NUM_STEP)
+        radios.append(MeshRadio(radioSetting.get('name', 'radio%d' % (n)),
+                                kind,
+                                radioSetting.get('device'),
+                                options,
+                                radioSetting.get('channels'),
+                                float(radioSetting.get('retrysec', retrySec))))
+
+    names = [radio.name for radio in radios]
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate mesh radio names: %s" % (names))
+    return radios
+
+# Mesh radios manager
+# openInterface(radio) open the radio interface, raise an exception if the radio is not available
+class RadioManager(object):
+    def __init__(self, radios, openInterface):
+        self.radios = list(radios)
+        self.openInterface = openInterface
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.radios)
+
+    def __iter__(self):
+        return iter(self.radios)
+
+    # Get the radio by name, None if not exist
+    def get(self, name):
+        for radio in self.radios:
+            if radio.name == name:
+                return radio
+        return None
+
+    # Get the radio of the interface delivering a packet, None if not managed
+    def radioOf(self, interface):
+        for radio in self.radios:
+            if radio.interface is interface:
+                return radio
+        return None
+
+    # Open the radio interface if not connected and the retry interval elapsed
+    # Return True if the radio is connected
+    def connect(self, radio):
+        if radio.interface != None:
+            return True
+        now = time.monotonic()
+        if now < radio.nextAttempt:
+            return False
+
+        try:
+            interface = self.openInterface(radio)
+        except Exception as err:
+            radio.failures += 1
+            radio.lastError = str(err)
+            radio.nextAttempt = now + radio.retrySec
+            raise
+
+        with self._lock:
+            radio.interface = interface
+            radio.connects += 1
+            radio.connectedSince = time.time()
+            radio.pollCnt = 0
+            radio.firstPoll = False
+        return True
+
+    # Connection to the interface lost, close it, the supervisor reconnect after the retry interval
+    # Return the radio, None if the interface is not managed
+    def markLost(self, interface):
+        with self._lock:
+            radio = self.radioOf(interface)
+            if radio == None:
+                return None
+            radio.interface = None
+            radio.lost += 1
+            radio.connectedSince = None
+            radio.nextAttempt = time.monotonic() + radio.retrySec
+
+        try:
+            interface.close()
+        except Exception:
+            pass
+        return radio
+
+    # Choose the radio for an outbound text message
+    # Direct message: the radio which last heard the destination node, if it serve the channel
+    # Otherwise the first connected radio serving the channel, None if no radio is ready
+    def route(self, destinationId, channelIndex=0, registry=None):
+        candidates = [radio for radio in self.radios if radio.interface != None and radio.serves(channelIndex)]
+        if len(candidates) == 0:
+            return None
+
+        if registry != None and isinstance(destinationId, str) and destinationId != '^all':
+            record = registry.get(normalizeNodeId(destinationId))
+            if record != None and record.source:
+                for radio in candidates:
+                    if radio.name == record.source:
+                        return radio
+        return candidates[0]
+
+    # Radios stats, nodeCounts - dictionary of node count by radio name
+    def stats(self, nodeCounts=None):
+        radiosStats = {}
+        for radio in self.radios:
+            radiosStats[radio.name] = {
+                'interface' : radio.kind,
+                'device' : radio.device,
+                'channels' : list(radio.channels) if radio.channels != None else None,
+                'connected' : radio.interface != None,
+                'connectedSince' : radio.connectedSince,
+                'connects' : radio.connects,
+                'failures' : radio.failures,
+                'lost' : radio.lost,
+                'sent' : radio.sent,
+                'lastError' : radio.lastError,
+                'nodes' : (nodeCounts or {}).get(radio.name, 0),
+            }
+        return radiosStats
@@ -0,0 +1,259 @@
+# Mesh radio simulator
+# Stand in for the meshtastic serial interface, no radio needed: N virtual
+# nodes move around, drain their battery and send text messages, the packets
+# are published on the same pubsub topics with the same packet dictionaries
+# as a real radio, and the interface provide nodes, showNodes() and sendText()
+import heapq
+import itertools
+import math
+import random
+import threading
+import time
+
+from nodetable import formatNodesTable
+
+# Meshtastic broadcast node number
+BROADCAST_NUM = 0xFFFFFFFF
+
+# First virtual node number, the gateway own node
+SIM_BASE_NUM = 0xa5000000
+
+# Meters per degree of latitude
+METERS_PER_DEG = 111320.0
+
+# Canned text messages sent by the virtual nodes
+SIM_TEXTS = ('Checking in', 'All good here', 'Moving to the next waypoint', 'Battery low, heading back',
+             'Anyone copy?', 'Copy that', 'Signal weak at this spot', 'Arrived at the base camp')
+
+# Simulated packet kinds
+KIND_TEXT = 'text'
+KIND_POSITION = 'position'
+KIND_TELEMETRY = 'telemetry'
+KIND_NODEINFO = 'nodeinfo'
+
+# Packet handed to the mesh by sendText(), like the meshtastic MeshPacket
+class SimSentPacket(object):
+    __slots__ = ('id', 'to', 'text', 'channel')
+
+    def __init__(self, packetId, to, text, channel):
+        self.id = packetId
+        self.to = to
+        self.text = text
+        self.channel = channel
+
+# Gateway own node information, like the meshtastic myInfo
+class SimMyInfo(object):
+    def __init__(self, myNodeNum):
+        self.my_node_num = myNodeNum
+
+# Simulated mesh interface
+# nodeCount     - virtual nodes, including the gateway own node
+# textRate      - text messages per second over the whole mesh
+# positionSec   - position report interval of each node [s]
+# telemetrySec  - device telemetry interval of each node [s]
+# nodeInfoSec   - node information interval of each node [s]
+# speed         - traffic multiplier, e.g. 10 - ten times the real traffic
+# seed          - random seed, None - different mesh every run
+# channels      - channel indexes the text messages are spread on
+# baseNum       - first node number, give each simulated radio its own range
+# publish       - pubsub send function, default pub.sendMessage
+class SimInterface(object):
+    def __init__(self, nodeCount=20, textRate=0.05, positionSec=900.0, telemetrySec=900.0, nodeInfoSec=10800.0,
+                 speed=1.0, seed=None, channels=(0, ), center=(3.1390, 101.6869), radiusM=5000.0, baseNum=SIM_BASE_NUM, publish=None):
+        if publish == None:
+            from pubsub import pub
+            publish = pub.sendMessage
+
+        self.publish = publish
+        self.textRate = float(textRate)
+        self.positionSec = float(positionSec)
+        self.telemetrySec = float(telemetrySec)
+        self.nodeInfoSec = float(nodeInfoSec)
+        self.speed = max(float(speed), 0.001)
+        self.channels = tuple(channels)
+        self.rng = random.Random(seed)
+
+        self.nodes = {}                        # interface.nodes, keyed by node ID
+        self.nodesByNum = {}                   # interface.nodesByNum, keyed by node number
+        self.myInfo = SimMyInfo(baseNum)
+        self.packetCount = 0                   # Published packets
+        self.sentTexts = 0                     # Text messages handed to the mesh by sendText()
+
+        self._packetIds = itertools.count(self.rng.randint(1, 1 << 30))
+        self._motion = {}                      # Node number: [heading [rad], speed [m/s]]
+        self._queue = []                       # Heap of (due monotonic time, sequence, kind, node number)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        now = int(time.time())
+        for n in range(max(int(nodeCount), 1)):
+            num = baseNum + n * 7919
+            node = {
+                'num' : num,
+                'user' : {
+                    'id' : '!%08x' % (num),
+                    'longName' : 'Sim Node %d' % (n + 1) if n > 0 else 'Sim Gateway',
+                    'shortName' : 'S%03d' % (n % 1000),
+                    'hwModel' : 'TBEAM',
+                },
+                'position' : {
+                    'latitude' : center[0] + self.rng.uniform(-radiusM, radiusM) / METERS_PER_DEG,
+                    'longitude' : center[1] + self.rng.uniform(-radiusM, radiusM) / METERS_PER_DEG,
+                    'altitude' : self.rng.randint(0, 300),
+                    'time' : now,
+                },
+                'deviceMetrics' : {'batteryLevel' : self.rng.randint(40, 100)},
+                'snr' : round(self.rng.uniform(-15.0, 12.0), 2),
+                'lastHeard' : now - self.rng.randint(0, 600),
+            }
+            self.nodes[node['user']['id']] = node
+            self.nodesByNum[num] = node
+
+            # Gateway own node do not transmit over the air
+            if n > 0:
+                # Walking to driving pace
+                self._motion[num] = [self.rng.uniform(0, 2 * math.pi), self.rng.uniform(0.5, 15.0)]
+                self._schedule(KIND_POSITION, num, self.rng.uniform(0, self.positionSec))
+                self._schedule(KIND_TELEMETRY, num, self.rng.uniform(0, self.telemetrySec))
+                self._schedule(KIND_NODEINFO, num, self.rng.uniform(0, self.nodeInfoSec))
+
+        if self.textRate > 0 and len(self._motion) > 0:
+            self._schedule(KIND_TEXT, None, self.rng.expovariate(self.textRate))
+
+        # Connected, like the real interface once the radio configuration is read
+        self.publish("meshtastic.connection.established", interface=self)
+
+        # Traffic generator, the reader thread of a real radio
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Schedule a packet after the given simulated delay [s]
+    def _schedule(self, kind, num, delaySec):
+        heapq.heappush(self._queue, (time.monotonic() + delaySec / self.speed, next(self._seq), kind, num))
+
+    # Traffic generator loop, until closed
+    def _run(self):
+        while not self._stop.is_set():
+            if len(self._queue) == 0:
+                return
+            due, seq, kind, num = self._queue[0]
+            waitSec = due - time.monotonic()
+            if waitSec > 0:
+                self._stop.wait(waitSec)
+                continue
+            heapq.heappop(self._queue)
+
+            if kind == KIND_TEXT:
+                num = self.rng.choice(list(self._motion.keys()))
+                packet = self._textPacket(num)
+                self._schedule(KIND_TEXT, None, self.rng.expovariate(self.textRate))
+            elif kind == KIND_POSITION:
+                packet = self._positionPacket(num)
+                self._schedule(kind, num, self.positionSec * self.rng.uniform(0.8, 1.2))
+            elif kind == KIND_TELEMETRY:
+                packet = self._telemetryPacket(num)
+                self._schedule(kind, num, self.telemetrySec * self.rng.uniform(0.8, 1.2))
+            else:
+                packet = self._nodeInfoPacket(num)
+                self._schedule(kind, num, self.nodeInfoSec * self.rng.uniform(0.8, 1.2))
+
+            self.packetCount += 1
+            self.publish("meshtastic.receive", packet=packet, interface=self)
+
+    # Build a received packet, refresh the sender link quality and last heard
+    def _packet(self, num, decoded, toNum=BROADCAST_NUM, channel=0):
+        node = self.nodesByNum[num]
+        rxTime = int(time.time())
+        snr = round(max(-20.0, min(12.0, node['snr'] + self.rng.uniform(-1.5, 1.5))), 2)
+        with self._lock:
+            node['snr'] = snr
+            node['lastHeard'] = rxTime
+
+        packet = {
+            'from' : num,
+            'to' : toNum,
+            'decoded' : decoded,
+            'id' : next(self._packetIds),
+            'rxTime' : rxTime,
+            'rxSnr' : snr,
+            'hopLimit' : self.rng.randint(0, 3),
+            'rxRssi' : int(-120 + (snr + 20) * 2.5),
+            'fromId' : '!%08x' % (num),
+            'toId' : '^all' if toNum == BROADCAST_NUM else '!%08x' % (toNum),
+        }
+        if channel != 0:
+            packet['channel'] = channel
+        return packet
+
+    # Text message, broadcast or direct to the gateway
+    def _textPacket(self, num):
+        text = self.rng.choice(SIM_TEXTS)
+        toNum = self.myInfo.my_node_num if self.rng.random() < 0.1 else BROADCAST_NUM
+        decoded = {'portnum' : 'TEXT_MESSAGE_APP', 'payload' : text.encode(), 'text' : text}
+        return self._packet(num, decoded, toNum, self.rng.choice(self.channels))
+
+    # Position report, the node moved since its previous report
+    def _positionPacket(self, num):
+        node = self.nodesByNum[num]
+        motion = self._motion[num]
+        position = node['position']
+
+        # Distance covered since the previous report, slowly changing heading
+        motion[0] += self.rng.uniform(-0.5, 0.5)
+        distance = motion[1] * self.positionSec
+        latitude = position['latitude'] + distance * math.cos(motion[0]) / METERS_PER_DEG
+        longitude = position['longitude'] + distance * math.sin(motion[0]) / (METERS_PER_DEG * max(math.cos(math.radians(latitude)), 0.01))
+        altitude = max(0, position['altitude'] + self.rng.randint(-5, 5))
+
+        newPosition = {'latitude' : latitude, 'longitude' : longitude, 'altitude' : altitude, 'time' : int(time.time())}
+        with self._lock:
+            node['position'] = newPosition
+        return self._packet(num, {'portnum' : 'POSITION_APP', 'position' : dict(newPosition)})
+
+    # Device telemetry, the battery drain until recharged
+    def _telemetryPacket(self, num):
+        node = self.nodesByNum[num]
+        battery = node['deviceMetrics']['batteryLevel'] - self.rng.randint(0, 2)
+        if battery < 5:
+            battery = 100
+
+        metrics = {'batteryLevel' : battery, 'voltage' : round(3.3 + battery * 0.009, 3),
+                   'channelUtilization' : round(self.rng.uniform(0, 25), 2), 'airUtilTx' : round(self.rng.uniform(0, 5), 2)}
+        with self._lock:
+            node['deviceMetrics'] = metrics
+        return self._packet(num, {'portnum' : 'TELEMETRY_APP', 'telemetry' : {'time' : int(time.time()), 'deviceMetrics' : dict(metrics)}})
+
+    # Node information
+    def _nodeInfoPacket(self, num):
+        return self._packet(num, {'portnum' : 'NODEINFO_APP', 'user' : dict(self.nodesByNum[num]['user'])})
+
+    # Print and return the nodes table, most recently heard first
+    def showNodes(self, includeSelf=True):
+        with self._lock:
+            nodes = [dict(node) for node in self.nodes.values() if includeSelf or node['num'] != self.myInfo.my_node_num]
+        nodes.sort(key=lambda node: node.get('lastHeard') or 0, reverse=True)
+        table = formatNodesTable(nodes)
+        print(table)
+        return table
+
+    # Hand a text message to the mesh, return the sent packet
+    def sendText(self, text, destinationId='^all', wantAck=False, wantResponse=False, onResponse=None, channelIndex=0):
+        if self._stop.is_set():
+            raise RuntimeError("Simulated interface closed")
+
+        if destinationId == '^all' or destinationId == BROADCAST_NUM:
+            toNum = BROADCAST_NUM
+        elif isinstance(destinationId, int):
+            toNum = destinationId
+        else:
+            toNum = int(str(destinationId).lstrip('!'), 16)
+
+        self.sentTexts += 1
+        return SimSentPacket(next(self._packetIds), toNum, text, channelIndex)
+
+    # Stop the traffic generator
+    def close(self):
+        self._stop.set()
+        if self._thread != threading.current_thread():
+            self._thread.join(1.0)
@@ -0,0 +1,304 @@
+# Received text message history
+# Keep the most recent received text messages in a bounded in memory ring,
+# indexed by sequence number, sender and channel, optionally persisted to
+# an indexed SQLite store, for the '/messages' REST API backfill
+import sqlite3
+import threading
+import time
+
+# Rows written to the on disk store at once
+FLUSH_BATCH = 500
+
+# Received text message record
+class MsgRecord(object):
+    __slots__ = ('seq', 'recvTime', 'rxTime', 'fromId', 'user', 'aka', 'toId', 'channel', 'text', 'packetId', 'rxSnr')
+
+    def __init__(self, seq, recvTime, rxTime, fromId, user, aka, toId, channel, text, packetId, rxSnr):
+        self.seq = seq
+        self.recvTime = recvTime
+        self.rxTime = rxTime
+        self.fromId = fromId
+        self.user = user
+        self.aka = aka
+        self.toId = toId
+        self.channel = channel
+        self.text = text
+        self.packetId = packetId
+        self.rxSnr = rxSnr
+
+    def toDict(self):
+        return {
+            'seq' : self.seq,
+            'recvTime' : self.recvTime,
+            'rxTime' : self.rxTime,
+            'from' : self.fromId,
+            'user' : self.user,
+            'aka' : self.aka,
+            'to' : self.toId,
+            'channel' : self.channel,
+            'text' : self.text,
+            'packetId' : self.packetId,
+            'rxSnr' : self.rxSnr,
+        }
+
+    def toRow(self):
+        return (self.seq, self.recvTime, self.rxTime, self.fromId, self.user, self.aka, self.toId, self.channel, self.text, self.packetId, self.rxSnr)
+
+# Ascending list with a moving start offset, oldest entries are trimmed
+# by moving the offset and compacted once half of the list are stale
+class TrimList(object):
+    __slots__ = ('items', 'start')
+
+    def __init__(self):
+        self.items = []
+        self.start = 0
+
+    def __len__(self):
+        return len(self.items) - self.start
+
+    def append(self, item):
+        self.items.append(item)
+
+    def trim(self, count):
+        self.start += count
+        if self.start > 1024 and self.start * 2 > len(self.items):
+            del self.items[:self.start]
+            self.start = 0
+
+    # Position of the first item whose key(item) >= value
+    def bisect(self, value, key):
+        lo = self.start
+        hi = len(self.items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key(self.items[mid]) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+# Received text message history
+# The ring keep the last 'capacity' messages, sequence numbers are contiguous,
+# so the record of a sequence number are found by offset, and the sender and
+# channel indexes keep the ascending sequence numbers of their messages
+class MessageHistory(object):
+    def __init__(self, capacity=10000, path=None, maxRows=1000000):
+        self.capacity = capacity
+        self.path = path
+        self.maxRows = maxRows
+
+        self._ring = TrimList()
+        self._bySender = {}
+        self._byChannel = {}
+        self._lock = threading.RLock()
+        self._dbLock = threading.Lock()
+        self._pending = []
+        self.lastSeq = 0
+        # Oldest persisted message, tuple of (sequence number, receive time), None - store empty
+        self._storeFirst = None
+
+        # History counters
+        self.added = 0
+        self.flushed = 0
+
+        self._db = None
+        self._readDb = None
+        self._readLock = threading.Lock()
+        if path != None:
+            self._openStore(path)
+
+    # Open the on disk store and reload the most recent messages into the ring
+    def _openStore(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS messages (seq INTEGER PRIMARY KEY, recvTime REAL NOT NULL, rxTime INTEGER, "
+                         "fromId TEXT, user TEXT, aka TEXT, toId TEXT, channel INTEGER, text TEXT, packetId INTEGER, rxSnr REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_recv ON messages (recvTime)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_from ON messages (fromId, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS messages_channel ON messages (channel, seq)")
+
+        rows = self._db.execute("SELECT * FROM messages ORDER BY seq DESC LIMIT ?", (self.capacity, )).fetchall()
+        for row in reversed(rows):
+            self._index(MsgRecord(*row))
+        self._storeFirst = self._db.execute("SELECT seq, recvTime FROM messages ORDER BY seq LIMIT 1").fetchone()
+
+        # Separate connection for the REST queries, read the last committed snapshot (WAL)
+        # without waiting for the history writer
+        self._readDb = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+
+    # Add the record to the ring and the indexes, lock must be held
+    def _index(self, record):
+        self._ring.append(record)
+        self._bySender.setdefault(record.fromId, TrimList()).append(record.seq)
+        self._byChannel.setdefault(record.channel, TrimList()).append(record.seq)
+        self.lastSeq = record.seq
+
+        # Ring full, forget the oldest record
+        if len(self._ring) > self.capacity:
+            oldest = self._ring.items[self._ring.start]
+            self._ring.trim(1)
+            for (index, key) in ((self._bySender, oldest.fromId), (self._byChannel, oldest.channel)):
+                seqs = index[key]
+                seqs.trim(1)
+                if len(seqs) == 0:
+                    del index[key]
+
+    # Record one received text message, return the message record
+    def add(self, fromId, text, rxTime=None, user='', aka='', toId='^all', channel=0, packetId=None, rxSnr=None):
+        with self._lock:
+            record = MsgRecord(self.lastSeq + 1, round(time.time(), 3), rxTime, fromId, user, aka, toId, channel, text, packetId, rxSnr)
+            self._index(record)
+            self.added += 1
+            if self._db != None:
+                self._pending.append(record)
+            return record
+
+    # Write the pending records to the on disk store and apply the row limit
+    # Called periodically from a background thread, the receive path never wait on the disk
+    def flush(self):
+        if self._db == None:
+            return 0
+
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            lastSeq = self.lastSeq
+
+        with self._dbLock:
+            for start in range(0, len(pending), FLUSH_BATCH):
+                self._db.execute("BEGIN")
+                self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     [record.toRow() for record in pending[start:start + FLUSH_BATCH]])
+                self._db.execute("COMMIT")
+
+            if len(pending) > 0 and self.maxRows > 0:
+                self._db.execute("DELETE FROM messages WHERE seq <= ?", (lastSeq - self.maxRows, ))
+                self._storeFirst = self._db.execute("SELECT seq, recvTime FROM messages ORDER BY seq LIMIT 1").fetchone()
+            elif len(pending) > 0 and self._storeFirst == None:
+                self._storeFirst = (pending[0].seq, pending[0].recvTime)
+
+        self.flushed += len(pending)
+        return len(pending)
+
+    # Get the record of the sequence number from the ring, lock must be held
+    def _record(self, seq):
+        return self._ring.items[self._ring.start + seq - self._ring.items[self._ring.start].seq]
+
+    # Query the history, ascending sequence order
+    # cursor    - return the messages after this sequence number
+    # since     - return the messages received by the gateway at or after this epoch time
+    # fromId    - sender node ID filter
+    # channel   - channel index filter
+    # Return tuple of (list of message dictionary, next cursor)
+    def query(self, cursor=None, since=None, fromId=None, channel=None, limit=100):
+        with self._lock:
+            if len(self._ring) == 0:
+                return ([], cursor)
+
+            first = self._ring.items[self._ring.start]
+            startSeq = (cursor + 1) if cursor != None else 0
+
+            # Start of the requested range already dropped from the ring and persisted, read it from the on disk store
+            storeFirst = self._storeFirst
+            withStore = self._db != None and storeFirst != None and storeFirst[0] < first.seq and \
+                        (startSeq < first.seq if cursor != None else since != None and since < first.recvTime)
+            if withStore == False:
+                results = self._queryRing(startSeq, since, fromId, channel, limit)
+                nextCursor = results[-1].seq if len(results) >= limit else self.lastSeq
+                return ([record.toDict() for record in results], nextCursor)
+
+            # Both filters, the ring indexes size estimate which store index has the fewer rows
+            bySender = fromId != None and (channel == None or \
+                       len(self._bySender.get(fromId, ())) <= len(self._byChannel.get(channel, ())))
+
+        # Persisted messages older than the ring, then the ring for the rest
+        results = self._queryStore(startSeq, first.seq, since, fromId, channel, limit, bySender)
+        if len(results) < limit:
+            with self._lock:
+                results += self._queryRing(first.seq, since, fromId, channel, limit - len(results))
+                lastSeq = self.lastSeq
+        nextCursor = results[-1].seq if len(results) >= limit else lastSeq
+        return ([record.toDict() for record in results], nextCursor)
+
+    # Query the ring through its indexes, lock must be held and the ring not empty
+    # Return list of message record
+    def _queryRing(self, startSeq, since, fromId, channel, limit):
+        startSeq = max(startSeq, self._ring.items[self._ring.start].seq)
+
+        # Start position by receive time
+        if since != None:
+            pos = self._ring.bisect(since, lambda record: record.recvTime)
+            if pos >= len(self._ring.items):
+                return []
+            startSeq = max(startSeq, self._ring.items[pos].seq)
+
+        # Narrowest index of the filters
+        candidates = None
+        if fromId != None:
+            candidates = self._bySender.get(fromId)
+            if candidates == None:
+                return []
+        if channel != None:
+            channelSeqs = self._byChannel.get(channel)
+            if channelSeqs == None:
+                return []
+            if candidates == None or len(channelSeqs) < len(candidates):
+                candidates = channelSeqs
+
+        results = []
+        if candidates == None:
+            for seq in range(startSeq, self.lastSeq + 1):
+                if len(results) >= limit:
+                    break
+                results.append(self._record(seq))
+        else:
+            for pos in range(candidates.bisect(startSeq, lambda seq: seq), len(candidates.items)):
+                if len(results) >= limit:
+                    break
+                record = self._record(candidates.items[pos])
+                if (fromId == None or record.fromId == fromId) and (channel == None or record.channel == channel):
+                    results.append(record)
+        return results
+
+    # Query the on disk store through its indexes, the messages before endSeq
+    # bySender - walk the sender index, otherwise the channel index if filtered by channel
+    # Read the committed rows only, the history writer thread flush the pending ones
+    # Return list of message record
+    def _queryStore(self, startSeq, endSeq, since, fromId, channel, limit, bySender):
+        with self._readLock:
+            index = ''
+            if bySender:
+                index = " INDEXED BY messages_from"
+            elif channel != None:
+                index = " INDEXED BY messages_channel"
+
+            sql = "SELECT * FROM messages" + index + " WHERE seq >= ? AND seq < ?"
+            args = [startSeq, endSeq]
+            if since != None:
+                sql += " AND recvTime >= ?"
+                args.append(since)
+            if fromId != None:
+                sql += " AND fromId = ?"
+                args.append(fromId)
+            if channel != None:
+                sql += " AND channel = ?"
+                args.append(channel)
+            sql += " ORDER BY seq LIMIT ?"
+            args.append(limit)
+
+            return [MsgRecord(*row) for row in self._readDb.execute(sql, args).fetchall()]
+
+    def __len__(self):
+        return len(self._ring)
+
+    def stats(self):
+        return {
+            'capacity' : self.capacity,
+            'size' : len(self._ring),
+            'lastSeq' : self.lastSeq,
+            'added' : self.added,
+            'persisted' : self.path != None,
+            'flushed' : self.flushed,
+            'pending' : len(self._pending),
+        }
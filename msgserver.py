@@ -0,0 +1,327 @@
+# Inbound TCP server for node red text message injection
+# Selector based, serve many clients at the same time on one thread,
+# every received message are handed to one shared outbound mesh transmit path
+import codecs
+import json
+import selectors
+import socket
+import time
+
+# Receive chunk size
+RECV_SIZE = 4096
+
+# Framing mode
+# 'raw'    - every received chunk are one text message, no acknowledgement
+# 'ndjson' - newline delimited JSON, one message per line:
+#            {"text": "...", "destination": "^all", "channelIndex": 0, "wantAck": false, "priority": "normal", "id": 1}
+#            only "text" are mandatory, every line get one acknowledgement line back:
+#            {"id": 1, "status": "queued"}                - accepted by the transmit scheduler
+#            {"id": 1, "status": "error", "error": "..."} - rejected
+#            "queued" do NOT mean the radio sent it, the transmission happen later on the
+#            scheduler thread, a message lost after queuing are only counted in '/txstats'
+FRAMING_RAW = 'raw'
+FRAMING_NDJSON = 'ndjson'
+
+# Maximum length of one framed message line
+MAX_LINE = 65536
+
+# Maximum pending acknowledgement data of one client, the client which do not read it are disconnected
+MAX_TX_BUF = 262144
+
+# Framed message error, keep the client message reference if available
+class FrameError(ValueError):
+    def __init__(self, text, msgRef=None):
+        ValueError.__init__(self, text)
+        self.msgRef = msgRef
+
+# Decode one framed message line to the message dictionary
+def parseFrame(line):
+    try:
+        msg = json.loads(line)
+    except ValueError as err:
+        raise FrameError("invalid JSON: %s" % (err))
+
+    if not isinstance(msg, dict):
+        raise FrameError("message must be a JSON object")
+    if not isinstance(msg.get('text'), str):
+        raise FrameError("missing text", msg.get('id'))
+    if not isinstance(msg.get('destination', '^all'), str):
+        raise FrameError("destination must be a string", msg.get('id'))
+    if not isinstance(msg.get('channelIndex', 0), int):
+        raise FrameError("channelIndex must be an integer", msg.get('id'))
+    if msg.get('priority', 'normal') not in ('high', 'normal', 'low'):
+        raise FrameError("priority must be high, normal or low", msg.get('id'))
+
+    return {
+        'id' : msg.get('id'),
+        'text' : msg['text'],
+        'destination' : msg.get('destination', '^all'),
+        'channelIndex' : msg.get('channelIndex', 0),
+        'wantAck' : bool(msg.get('wantAck', False)),
+        'priority' : msg.get('priority', 'normal'),
+    }
+
+# Encode one acknowledgement line, queued if no error
+def formatAck(msgRef, error=None):
+    if error == None:
+        ack = {'id' : msgRef, 'status' : 'queued'}
+    else:
+        ack = {'id' : msgRef, 'status' : 'error', 'error' : error}
+    return (json.dumps(ack, separators=(',', ':')) + '\n').encode()
+
+# One connected client
+class ClientConn(object):
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.name = '%s:%s' % (addr[0], addr[1])
+        # Per connection read buffer, keep partial UTF-8 sequence between reads
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.rxBuf = ''
+        # Discard the received data until the next newline, rest of a line too long
+        self.discarding = False
+        # Pending data to write back to the client
+        self.txBuf = bytearray()
+
+        self.connectedAt = time.time()
+        self.lastActive = time.monotonic()
+
+        # Per client throughput counters
+        self.rxBytes = 0
+        self.rxMsgs = 0
+        self.txBytes = 0
+        self.rxErrors = 0
+
+    def stats(self):
+        return {
+            'client' : self.name,
+            'connectedAt' : int(self.connectedAt),
+            'idleSec' : round(time.monotonic() - self.lastActive, 1),
+            'rxBytes' : self.rxBytes,
+            'rxMsgs' : self.rxMsgs,
+            'txBytes' : self.txBytes,
+            'rxErrors' : self.rxErrors,
+        }
+
+# Multi client inbound TCP server
+# onMessage(msg, client) are called on the server thread for every received message,
+# msg are dictionary of 'id', 'text', 'destination', 'channelIndex', 'wantAck' and 'priority',
+# raise an exception if the message was rejected, the return value are ignored
+# onEvent(text) are called on the server thread for connection events (for logging)
+class MeshMsgServer(object):
+    def __init__(self, host, port, onMessage, maxClients=16, idleTimeout=300, onEvent=None, framing=FRAMING_RAW):
+        if framing not in (FRAMING_RAW, FRAMING_NDJSON):
+            raise ValueError("Unknown framing mode: %s" % (framing))
+
+        self.host = host
+        self.port = port
+        self.onMessage = onMessage
+        self.onEvent = onEvent
+        self.maxClients = maxClients
+        self.idleTimeout = idleTimeout
+        self.framing = framing
+
+        self._sel = selectors.DefaultSelector()
+        self._srv = None
+        self._clients = {}
+
+        # Server counters
+        self.accepted = 0
+        self.rejected = 0
+        self.timedOut = 0
+        self.overflowed = 0
+
+    # Report connection events
+    def _event(self, text):
+        if self.onEvent != None:
+            self.onEvent(text)
+
+    # Bind and listen
+    def start(self):
+        srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        srv.bind((self.host, self.port))
+        srv.listen(self.maxClients)
+        srv.setblocking(False)
+        self._srv = srv
+        self._sel.register(srv, selectors.EVENT_READ, None)
+        self._event("Messaging TCP Server starting up on %s port %s" % (self.host, self.port))
+
+    # Server loop, never return
+    def serveForever(self):
+        if self._srv == None:
+            self.start()
+
+        while True:
+            self.serveOnce(1.0)
+
+    # One pass of the server loop
+    def serveOnce(self, timeout):
+        for key, mask in self._sel.select(timeout):
+            # New client connection
+            if key.data == None:
+                self._accept()
+                continue
+
+            client = key.data
+            if mask & selectors.EVENT_READ:
+                self._read(client)
+            if mask & selectors.EVENT_WRITE and client.sock.fileno() != -1:
+                self._write(client)
+
+        self._sweepIdle()
+
+    def _accept(self):
+        try:
+            sock, addr = self._srv.accept()
+        except OSError:
+            return
+
+        # Connection limit reached
+        if len(self._clients) >= self.maxClients:
+            self.rejected += 1
+            sock.close()
+            self._event("Client connection from %s:%s REJECTED, limit %s reached" % (addr[0], addr[1], self.maxClients))
+            return
+
+        sock.setblocking(False)
+        client = ClientConn(sock, addr)
+        self._clients[sock.fileno()] = client
+        self._sel.register(sock, selectors.EVENT_READ, client)
+        self.accepted += 1
+        self._event("Get client connection from %s" % (client.name))
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+
+        # Connection closed by the client
+        if data == b'':
+            self._close(client, "Client disconnected! %s" % (client.name))
+            return
+
+        client.lastActive = time.monotonic()
+        client.rxBytes += len(data)
+        client.rxBuf += client.decoder.decode(data)
+        self.handleData(client)
+
+    # Handle the received data in the client read buffer
+    def handleData(self, client):
+        # Raw mode, every received chunk are one text message
+        if self.framing == FRAMING_RAW:
+            if client.rxBuf != '':
+                text = client.rxBuf
+                client.rxBuf = ''
+                client.rxMsgs += 1
+                try:
+                    self.onMessage({'id' : None, 'text' : text, 'destination' : '^all', 'channelIndex' : 0, 'wantAck' : False, 'priority' : 'normal'}, client)
+                except Exception:
+                    client.rxErrors += 1
+            return
+
+        # Framed mode, handle every complete line, many lines may arrive in one read
+        lines = client.rxBuf.split('\n')
+        client.rxBuf = lines.pop()
+
+        acks = bytearray()
+        for line in lines:
+            # End of the line already dropped as too long
+            if client.discarding:
+                client.discarding = False
+                continue
+
+            # Complete line too long, drop it
+            if len(line) > MAX_LINE:
+                client.rxErrors += 1
+                acks += formatAck(None, error="line too long")
+                continue
+
+            line = line.strip()
+            if line == '':
+                continue
+
+            msgRef = None
+            try:
+                msg = parseFrame(line)
+                msgRef = msg['id']
+                client.rxMsgs += 1
+                self.onMessage(msg, client)
+                acks += formatAck(msgRef)
+            except FrameError as err:
+                client.rxErrors += 1
+                acks += formatAck(err.msgRef, error=str(err))
+            except Exception as err:
+                client.rxErrors += 1
+                acks += formatAck(msgRef, error=str(err))
+
+        # Incomplete line too long, drop it and the rest of it up to the next newline
+        if len(client.rxBuf) > MAX_LINE and not client.discarding:
+            client.rxErrors += 1
+            client.discarding = True
+            acks += formatAck(None, error="line too long")
+        if client.discarding:
+            client.rxBuf = ''
+
+        if len(acks) > 0:
+            self.reply(client, acks)
+
+    # Queue data to write back to the client, disconnect the client which do not read its acknowledgements
+    def reply(self, client, data):
+        if client.sock.fileno() == -1:
+            return
+        if len(client.txBuf) + len(data) > MAX_TX_BUF:
+            self.overflowed += 1
+            self._close(client, "Client not reading its acknowledgements, disconnected! %s" % (client.name))
+            return
+        client.txBuf += data
+        self._sel.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+
+    def _write(self, client):
+        try:
+            sent = client.sock.send(client.txBuf)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._close(client, "Client write ERROR! %s" % (client.name))
+            return
+
+        client.txBytes += sent
+        del client.txBuf[:sent]
+        if len(client.txBuf) == 0:
+            self._sel.modify(client.sock, selectors.EVENT_READ, client)
+
+    # Close the client connection which are idle too long
+    def _sweepIdle(self):
+        if self.idleTimeout <= 0:
+            return
+
+        deadline = time.monotonic() - self.idleTimeout
+        for client in [client for client in self._clients.values() if client.lastActive < deadline]:
+            self.timedOut += 1
+            self._close(client, "Client idle timeout! %s" % (client.name))
+
+    def _close(self, client, reason):
+        self._clients.pop(client.sock.fileno(), None)
+        try:
+            self._sel.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        self._event(reason)
+
+    # Server and per client stats
+    def stats(self):
+        return {
+            'port' : self.port,
+            'clients' : len(self._clients),
+            'maxClients' : self.maxClients,
+            'accepted' : self.accepted,
+            'rejected' : self.rejected,
+            'timedOut' : self.timedOut,
+            'overflowed' : self.overflowed,
+            'perClient' : [client.stats() for client in list(self._clients.values())],
+        }
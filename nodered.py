@@ -0,0 +1,324 @@
+# Node red TCP server connection manager
+# Keep a long lived connection to each node red TCP server port (sink),
+# reconnect with exponential backoff and keep per sink connection stats
+import collections
+import select
+import socket
+import threading
+import time
+
+# Reconnect backoff [s]
+BACKOFF_MIN = 0.5
+BACKOFF_MAX = 30.0
+
+# Socket timeout for connect and send [s]
+SOCK_TIMEOUT = 5.0
+
+# Enable TCP keepalive on the socket, use the platform specific tuning if available
+def setKeepAlive(sock, idleSec=30, intvlSec=10, probeCnt=3):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idleSec)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, intvlSec)
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, probeCnt)
+
+# Persistent connection to one node red TCP server port
+class NodeRedSink(object):
+    def __init__(self, name, host, port, delimiter=b'\n'):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.delimiter = delimiter
+
+        self._sock = None
+        self._lock = threading.Lock()
+        self._backoff = BACKOFF_MIN
+        self._nextConnect = 0.0
+
+        # Connection stats
+        self.connects = 0
+        self.connectFails = 0
+        self.disconnects = 0
+        self.sentMsgs = 0
+        self.sentBytes = 0
+        self.sendFails = 0
+        self.lastError = ''
+
+    # Open the connection, return False if still inside the backoff window or connect failed
+    def _connect(self):
+        now = time.monotonic()
+        if now < self._nextConnect:
+            return False
+
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=SOCK_TIMEOUT)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            setKeepAlive(sock)
+        except OSError as err:
+            self.connectFails += 1
+            self.lastError = str(err)
+            # Exponential backoff before next attempt
+            self._nextConnect = now + self._backoff
+            self._backoff = min(self._backoff * 2, BACKOFF_MAX)
+            return False
+
+        self._sock = sock
+        self._backoff = BACKOFF_MIN
+        self._nextConnect = 0.0
+        self.connects += 1
+        return True
+
+    # Drop the current connection
+    def _drop(self):
+        if self._sock != None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+            self.disconnects += 1
+
+    # Check whether the server already closed the connection
+    # Node red never send data on these ports, readable socket means closed (or data to discard)
+    def _peerClosed(self):
+        try:
+            readable, writable, errored = select.select([self._sock], [], [], 0)
+            if readable:
+                return self._sock.recv(4096) == b''
+        except OSError:
+            return True
+        return False
+
+    # Send one message, the delimiter are appended to let node red split the stream
+    # Return True if the whole message was written to the socket
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if self.delimiter:
+            data += self.delimiter
+
+        with self._lock:
+            # Retry once on a fresh connection, an idle connection may already closed by the server
+            for attempt in range(0, 2):
+                if self._sock != None and self._peerClosed() == True:
+                    self._drop()
+
+                if self._sock == None and self._connect() == False:
+                    self.sendFails += 1
+                    return False
+
+                try:
+                    self._sock.sendall(data)
+                    self.sentMsgs += 1
+                    self.sentBytes += len(data)
+                    return True
+                except OSError as err:
+                    self.lastError = str(err)
+                    self._drop()
+
+            self.sendFails += 1
+            return False
+
+    # Close the connection
+    def close(self):
+        with self._lock:
+            self._drop()
+
+    @property
+    def connected(self):
+        return self._sock != None
+
+    # Per sink connection stats
+    def stats(self):
+        return {
+            'name' : self.name,
+            'host' : self.host,
+            'port' : self.port,
+            'connected' : self.connected,
+            'connects' : self.connects,
+            'connectFails' : self.connectFails,
+            'disconnects' : self.disconnects,
+            'sentMsgs' : self.sentMsgs,
+            'sentBytes' : self.sentBytes,
+            'sendFails' : self.sendFails,
+            'lastError' : self.lastError,
+        }
+
+# Change notification with a generation counter
+# Producers call notify() on every change, the consumer wait for a generation
+# different from the last one it handled, so concurrent changes coalesce
+# into one wake up and a change during a send is never lost
+class ChangeNotifier(object):
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.generation = 0
+
+    # Publish a change
+    def notify(self):
+        with self._cond:
+            self.generation += 1
+            self._cond.notify_all()
+
+    # Wait until the generation differ from the handled one, or timeout (None - forever)
+    # Return the current generation
+    def wait(self, handledGen, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self.generation != handledGen, timeout)
+            return self.generation
+
+# Outbound queue overflow policy
+DROP_OLDEST = 'drop-oldest'
+DROP_NEWEST = 'drop-newest'
+BLOCK = 'block'
+
+# Bounded outbound queue between packet decoding and delivery to node red
+# The producer (meshtastic reader thread) never wait on the network,
+# except with the 'block' overflow policy, bounded by the block timeout
+class OutboundQueue(object):
+    def __init__(self, maxSize=1000, overflow=DROP_OLDEST, blockTimeout=0.5):
+        if overflow not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError("Unknown overflow policy: %s" % (overflow))
+
+        self.maxSize = maxSize
+        self.overflow = overflow
+        self.blockTimeout = blockTimeout
+
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+        # Queue counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.delivered = 0
+        self.failed = 0
+        self.spooled = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    # Enqueue one item, return False if the item was dropped
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxSize:
+                # Discard the oldest item to make room
+                if self.overflow == DROP_OLDEST:
+                    self._items.popleft()
+                    self.dropped += 1
+
+                # Discard the new item
+                elif self.overflow == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+
+                # Wait for room, discard the new item on timeout
+                elif self._cond.wait_for(lambda: len(self._items) < self.maxSize, self.blockTimeout) == False:
+                    self.dropped += 1
+                    return False
+
+            self._items.append((time.monotonic(), item))
+            self.enqueued += 1
+            self._cond.notify_all()
+            return True
+
+    # Dequeue one item, return None on timeout
+    def get(self, timeout=None):
+        timedItem = self.getTimed(timeout)
+        if timedItem == None:
+            return None
+        return timedItem[1]
+
+    # Dequeue one item with its enqueue time, return tuple of (monotonic enqueue time, item), None on timeout
+    def getTimed(self, timeout=None):
+        with self._cond:
+            if self._cond.wait_for(lambda: len(self._items) > 0, timeout) == False:
+                return None
+            timedItem = self._items.popleft()
+            self._cond.notify_all()
+            return timedItem
+
+    # Queue counters
+    def stats(self):
+        return {
+            'depth' : len(self._items),
+            'maxSize' : self.maxSize,
+            'overflow' : self.overflow,
+            'enqueued' : self.enqueued,
+            'dropped' : self.dropped,
+            'delivered' : self.delivered,
+            'failed' : self.failed,
+            'spooled' : self.spooled,
+        }
+
+# Outbound worker loop, drain the queue of (sink, payload) and deliver to node red
+# With a spool, undelivered payloads are stored and replayed in order once the sink
+# is back, a sink with pending spooled payloads get the new payloads spooled behind them
+# onDelivered(sink, latency) are called for every payload delivered straight from the queue
+# Run it in a dedicated thread
+def runOutboundWorker(outQueue, onFailed=None, spool=None, sinks=(), replaySec=1.0, onDelivered=None):
+    sinksByName = dict([(sink.name, sink) for sink in sinks])
+
+    while True:
+        timedItem = outQueue.getTimed(replaySec if spool != None else None)
+
+        # Replay the spooled payloads before the new one
+        if spool != None:
+            for sink in list(sinksByName.values()):
+                if spool.hasPending(sink.name):
+                    outQueue.delivered += spool.replay(sink.name, sink.send)
+
+        if timedItem == None:
+            continue
+
+        queuedAt, (sink, payload) = timedItem
+        sinksByName.setdefault(sink.name, sink)
+
+        # Keep the order, sink still have older payloads in the spool
+        if spool != None and spool.hasPending(sink.name):
+            spool.append(sink.name, payload)
+            outQueue.spooled += 1
+            continue
+
+        if sink.send(payload) == True:
+            outQueue.delivered += 1
+            if onDelivered != None:
+                onDelivered(sink, time.monotonic() - queuedAt)
+        else:
+            outQueue.failed += 1
+            if onFailed != None:
+                onFailed(sink, payload)
+            if spool != None:
+                spool.append(sink.name, payload)
+                outQueue.spooled += 1
+
+# Mesh nodes data fields order on the wire
+NODE_FIELDS = ('No', 'User', 'AKA', 'ID', 'Latitude', 'Longitude', 'Altitude', 'Battery', 'SNR', 'LastHeard', 'Since')
+
+# Mesh nodes delta wire format (NODEDELTA macro)
+# Each entry starts with an operation character followed by '!' separated fields:
+#   '+!No!User!AKA!ID!Latitude!Longitude!Altitude!Battery!SNR!LastHeard!Since' - node upsert
+#   '-!ID'                                                                    - node removal
+# Full resync message starts with '=', node red replace its table with the following upserts
+OP_UPSERT = '+'
+OP_REMOVE = '-'
+OP_RESYNC = '='
+
+# Format one node legacy dictionary as '!No!User!...!Since'
+def formatNodeRecord(node):
+    return '!' + '!'.join([node[field] for field in NODE_FIELDS])
+
+# Format the full legacy snapshot, all node records concatenated
+def formatNodeSnapshot(nodeList):
+    return ''.join([formatNodeRecord(node) for node in nodeList])
+
+# Format a delta (or full resync) message
+def formatNodeDelta(upserts, removedIds, fullResync=False):
+    parts = []
+    if fullResync:
+        parts.append(OP_RESYNC)
+    for node in upserts:
+        parts.append(OP_UPSERT + formatNodeRecord(node))
+    for nodeId in removedIds:
+        parts.append(OP_REMOVE + '!' + nodeId)
+    return ''.join(parts)
@@ -0,0 +1,552 @@
+# Legacy showNodes() table scraper
+# Parse the fancy grid table printed by the meshtastic showNodes() into the
+# mesh nodes registry, kept for the NODETABLE macro and the benchmarks
+# Also format the same table, for the radio simulator and the benchmark fixtures
+import logging
+import time
+from io import StringIO
+
+from meshnodes import formatTimeAgo
+
+logger = logging.getLogger('lorameshgw')
+
+# showNodes() columns scraped by the legacy table parser
+SHOWNODES_COLUMNS = ('N', 'User', 'AKA', 'ID', 'Latitude', 'Longitude', 'Altitude', 'Battery', 'SNR', 'LastHeard', 'Since')
+
+# showNodes() row values of one interface.nodes style dictionary
+def showNodesRow(index, node, now):
+    user = node.get('user') or {}
+    position = node.get('position')
+    metrics = node.get('deviceMetrics')
+    lastHeard = node.get('lastHeard')
+    return (
+        str(index),
+        user.get('longName', 'N/A'),
+        user.get('shortName', 'N/A'),
+        user.get('id', 'N/A'),
+        '%.4f°' % (position['latitude']) if position else 'N/A',
+        '%.4f°' % (position['longitude']) if position else 'N/A',
+        '%d m' % (position['altitude']) if position else 'N/A',
+        '%d%%' % (metrics['batteryLevel']) if metrics else 'N/A',
+        '%.2f dB' % (node['snr']) if node.get('snr') != None else 'N/A',
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(lastHeard)) if lastHeard else 'N/A',
+        formatTimeAgo(lastHeard, now),
+    )
+
+# Format the nodes like the showNodes() tabulate 'fancy_grid' table
+def formatNodesTable(nodes, now=None):
+    if now == None:
+        now = time.time()
+    rows = [showNodesRow(n + 1, node, now) for n, node in enumerate(nodes)]
+    widths = [max([len(column)] + [len(row[i]) for row in rows]) for i, column in enumerate(SHOWNODES_COLUMNS)]
+
+    def border(left, fill, middle, right):
+        return left + middle.join([fill * (width + 2) for width in widths]) + right
+
+    def line(values):
+        return '│' + '│'.join([' ' + value.ljust(width) + ' ' for value, width in zip(values, widths)]) + '│'
+
+    lines = [border('╒', '═', '╤', '╕'), line(SHOWNODES_COLUMNS), border('╞', '═', '╪', '╡')]
+    for n, row in enumerate(rows):
+        if n > 0:
+            lines.append(border('├', '─', '┼', '┤'))
+        lines.append(line(row))
+    lines.append(border('╘', '═', '╧', '╛'))
+    return '\n'.join(lines)
+
+# Doing string manipulations
+def mid(s, offset, amount):
+    return s[offset-1:offset+amount-1]
+
+# Parse the showNodes() table text, update the mesh nodes registry
+# Return True if there is a NEW node or a node position changed
+def parseNodesTable(nodesData, meshNodeRegistry):
+    # Heavy import, only needed by this legacy path
+    import pandas as pd
+
+    # Nodes data process variable
+    nodesColData = ''
+    pdNodesData = ''
+    oneChar = ''
+    forCastOneChar = ''
+    nodesIndx = 0
+    lengthColData = 0
+    rowCnt = 3
+    
+    # Nodes data for each devices
+    nodeNumber = ''
+    nodeUser = ''
+    nodeAka = ''
+    nodeId = ''
+    nodeLat = ''
+    nodeLon = ''
+    nodeAlt = ''
+    nodeBatt = ''
+    nodeSnr = ''
+    nodeLastHeard = ''
+    nodeSince = ''
+    
+    unicodeChar = False
+    unicodeCharFnd = False
+    unicodeBuff = ''
+    
+    nodeNumbFnd = False
+    usrNameFnd = False
+    akaFnd = False
+    nodeIdFnd = False
+    nodeLatFnd = False
+    nodeLonFnd = False
+    nodeAltFnd = False
+    nodeBattFnd = False
+    nodeSnrFnd = False
+    nodeLastHeardFnd = False
+    startExtract = False
+    endOfLatLon = False
+    endOfAlt = False
+    endOfBatt = False
+    endOfSnr = False
+    updateRecord = False
+
+    # Start gets the nodes record count
+    # First, get the total mesh nodes raw data 
+    # Second, get the record count summary
+    # Lastly, get the total mesh nodes actual records
+    pdNodesData = pd.read_table(StringIO(nodesData), header=0)
+    nodesIndx = pdNodesData.index
+    nodesIndx = len(nodesIndx)
+
+    # Go through each index
+    for a in range(0, (nodesIndx)):
+        # Read mesh nodes data according to the current row index
+        if a == rowCnt:
+            # Read the row nodes data table using pandas 
+            pdNodesData = pd.read_table(StringIO(nodesData), header=a)
+            # Get the selected columns data
+            nodesColData = pdNodesData.columns 
+
+            logger.debug("DEBUG_THD_SERIAL_MESH: Unprocess ROW mesh node data: %s", nodesColData)
+
+            # Convert pandas object to string
+            nodesColData = str(nodesColData)
+            # Convert string to ascii
+            nodesColData = ascii(nodesColData)
+            # Get the column data length
+            lengthColData = len(nodesColData)
+
+            logger.debug("DEBUG_THD_SERIAL_MESH: ASCII ROW mesh node data: %s", nodesColData)
+
+            # Go through the data
+            for b in range(0, (lengthColData + 1)):
+                oneChar = mid(nodesColData, b, 1)
+                # Check for unicode data separator
+                if unicodeCharFnd == False:
+                    # Start checking for unicode char - '\' character
+                    if oneChar == chr(92) and unicodeChar == False:
+                        unicodeChar = True
+                    # Found '\' character
+                    elif unicodeChar == True:
+                        # Check for digit
+                        if oneChar.isdigit(): 
+                            unicodeBuff += oneChar
+                            # Complete unicode data
+                            if unicodeBuff == '2502':
+                                unicodeCharFnd = True
+
+                # Check for mesh nodes data
+                else:
+                    # Forecast next character to find '\' character
+                    forCastOneChar = mid(nodesColData, b + 1, 1)
+                    # Search for node number
+                    if nodeNumbFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            nodeNumbFnd = True
+
+                            # Reset necessary variable
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the record number index
+                        else:
+                            # Check for digit
+                            if oneChar.isdigit():
+                                nodeNumber += oneChar
+
+                    # Search for node user name
+                    elif usrNameFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            usrNameFnd = True
+
+                            # Reset necessary variable
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node user name
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character either alphabet or number
+                                if oneChar.isalpha() or oneChar.isdigit():
+                                    nodeUser += oneChar
+                                    startExtract = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                nodeUser += oneChar
+
+                    # Search for node a.k.a
+                    elif akaFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            akaFnd = True
+
+                            # Reset necessary variable
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node a.k.a
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character either alphabet or number
+                                if oneChar.isalpha() or oneChar.isdigit():
+                                    nodeAka += oneChar
+                                    startExtract = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                if oneChar != ' ':
+                                    nodeAka += oneChar
+
+                    # Search for node ID
+                    elif nodeIdFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            nodeIdFnd = True
+
+                            # Reset necessary variable
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node ID
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character either alphabet or number
+                                if oneChar.isalpha() or oneChar.isdigit():
+                                    nodeId += oneChar
+                                    startExtract = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                if oneChar != ' ':
+                                    nodeId += oneChar
+
+                    # Search for node latitude
+                    elif nodeLatFnd == False:
+                        # Confirm next character are '0'
+                        if oneChar == '0' and endOfLatLon == True:
+                            nodeLat += " [degree]"
+
+                            nodeLatFnd = True
+
+                            # Reset necessary variable
+                            endOfLatLon = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Previously there is NO latitude data
+                        elif nodeLat == 'N/A' and endOfLatLon == True:
+                            nodeLatFnd = True
+
+                            # Reset necessary variable
+                            endOfLatLon = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node latitude
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character number
+                                if oneChar.isdigit():
+                                    nodeLat += oneChar
+                                    startExtract = True
+
+                                # Latitude data are not available
+                                elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeLat += oneChar
+
+                                    if nodeLat == 'N/A':
+                                        endOfLatLon = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                # Get the latitude data as long as not found unicode '\' character
+                                if endOfLatLon == False:
+                                    if oneChar.isdigit() or oneChar == '.':
+                                        nodeLat += oneChar
+
+                                    # End of latitude data - Found unicode '\' character
+                                    elif oneChar == chr(92):
+                                        endOfLatLon = True
+
+                    # Search for node longitude
+                    elif nodeLonFnd == False:
+                        # Confirm next character are '0'
+                        if oneChar == '0' and endOfLatLon == True:
+                            nodeLon += " [degree]"
+
+                            nodeLonFnd = True
+
+                            # Reset necessary variable
+                            endOfLatLon = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Previously there is NO longitude data
+                        elif nodeLon == 'N/A' and endOfLatLon == True:
+                            nodeLonFnd = True
+
+                            # Reset necessary variable
+                            endOfLatLon = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = '' 
+
+                        # Start get the node longitude
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character number
+                                if oneChar.isdigit():
+                                    nodeLon += oneChar
+                                    startExtract = True
+
+                                # Longitude data are not available
+                                elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeLon += oneChar
+
+                                    if nodeLon == 'N/A':
+                                        endOfLatLon = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                # Get the longitude data as long as not found unicode '\' character
+                                if endOfLatLon == False:
+                                    if oneChar.isdigit() or oneChar == '.':
+                                        nodeLon += oneChar
+
+                                    # End of latitude data - Found unicode '\' character
+                                    elif oneChar == chr(92):
+                                        endOfLatLon = True
+
+                    # Search for node altitude
+                    elif nodeAltFnd == False:
+                        # Confirm altitude data was completed
+                        if endOfAlt == True:
+                            nodeAltFnd = True
+
+                            # Reset necessary variable
+                            endOfAlt = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node altitude
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character number
+                                if oneChar.isdigit():
+                                    nodeAlt += oneChar
+                                    startExtract = True
+
+                                # Altitude data are not available
+                                elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeAlt += oneChar
+
+                                    if nodeAlt == 'N/A':
+                                        endOfAlt = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                if oneChar.isdigit() or oneChar == '.' or oneChar == 'm':
+                                    nodeAlt += oneChar
+                                    # End of altitude data
+                                    if 'm' in nodeAlt:
+                                        endOfAlt = True
+
+                    # Search for node battery status
+                    elif nodeBattFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            nodeBatt += "[VDC]"
+
+                            nodeBattFnd = True
+
+                            # Reset necessary variable
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Previously there is no battery voltage data
+                        elif endOfBatt == True:
+                            nodeBattFnd = True
+
+                            # Reset necessary variable
+                            endOfBatt = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node battery status
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character number
+                                if oneChar.isdigit():
+                                    nodeBatt += oneChar
+                                    startExtract = True
+
+                                # Battery data are not available
+                                elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeBatt += oneChar
+
+                                    if nodeBatt == 'N/A':
+                                        endOfBatt = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                if oneChar.isdigit() or oneChar == '.' or oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeBatt += oneChar
+
+                    # Search for node SNR status
+                    elif nodeSnrFnd == False:
+                        # Confirm SNR data was completed
+                        if endOfSnr == True:
+                            nodeSnrFnd = True
+
+                            # Reset necessary variable
+                            endOfSnr = False
+                            startExtract = False
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node SNR status
+                        else:
+                            # Check for first character
+                            if startExtract == False:
+                                # Check for the first character number
+                                if oneChar.isdigit():
+                                    nodeSnr += oneChar
+                                    startExtract = True
+
+                                # SNR data are not available
+                                elif oneChar == 'N' or oneChar == 'A' or oneChar == '/':
+                                    nodeSnr += oneChar
+
+                                    if nodeSnr == 'N/A':
+                                        endOfSnr = True
+
+                            # Start append data
+                            elif startExtract == True:
+                                if oneChar.isdigit() or oneChar == '.' or oneChar == 'd' or oneChar == 'B':
+                                    nodeSnr += oneChar
+                                    # End of SNR data
+                                    if 'B' in nodeSnr:
+                                        endOfSnr = True
+
+                    # Search for node last heard
+                    elif nodeLastHeardFnd == False:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            nodeLastHeardFnd = True
+
+                            # Reset necessary variable
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                        # Start get the node last heard
+                        else:
+                            nodeLastHeard += oneChar
+
+                    # Search for node since - End of data for selected row
+                    elif nodeNumbFnd == True and usrNameFnd == True and akaFnd == True and nodeIdFnd == True and nodeLatFnd == True and nodeLonFnd == True \
+                         and nodeAltFnd == True and nodeBattFnd == True and nodeSnrFnd == True and nodeLastHeardFnd == True:
+                        # Confirm next character are '\'
+                        if forCastOneChar == chr(92):
+                            logger.debug("DEBUG_THD_SERIAL_MESH: No: [%s], User Name: [%s], A.K.A: [%s], Node ID: [%s], Lat: [%s], Lon: [%s], Alt: [%s], " \
+                                         "Batt: [%s], SNR: [%s], LastHeard: [%s], Since: [%s]", nodeNumber, nodeUser, nodeAka, nodeId, nodeLat, nodeLon, nodeAlt, \
+                                         nodeBatt, nodeSnr, nodeLastHeard, nodeSince)
+
+                            # Update mesh nodes registry with retrieve nodes info
+                            # NEW record are created if the node ID are not exist
+                            newRecord, posChanged, anyChanged = meshNodeRegistry.updateFromLegacy(nodeNumber, nodeUser, nodeAka, nodeId, \
+                                nodeLat, nodeLon, nodeAlt, nodeBatt, nodeSnr, nodeLastHeard, nodeSince)
+
+                            # There is a changes on the mesh data that need to be send to the node red TCP server
+                            # NEW mesh data also need to send to node red TCP server
+                            if newRecord == True or posChanged == True:
+                                # Set the updating flag
+                                updateRecord = True
+
+                            # Reset necessary variable
+                            nodeNumbFnd = False
+                            usrNameFnd = False
+                            akaFnd = False
+                            nodeIdFnd = False
+                            nodeLatFnd = False
+                            nodeLonFnd = False
+                            nodeAltFnd = False
+                            nodeBattFnd = False
+                            nodeSnrFnd = False
+                            nodeLastHeardFnd = False
+
+                            nodeNumber = ''
+                            nodeUser = ''
+                            nodeAka = ''
+                            nodeId = ''
+                            nodeLat = ''
+                            nodeLon = ''
+                            nodeAlt = ''
+                            nodeBatt = ''
+                            nodeSnr = ''
+                            nodeLastHeard = ''
+                            nodeSince = ''
+
+                            unicodeCharFnd = False
+                            unicodeChar = False
+                            unicodeBuff = ''
+
+                            # Initialize back row counter by factor of 2
+                            rowCnt += 2
+
+                            # Exit current loop
+                            break
+
+                    # Start get the node since
+                        else:
+                            nodeSince += oneChar
+
+    return updateRecord
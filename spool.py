@@ -0,0 +1,140 @@
+# Durable store and forward spool
+# Append only SQLite (WAL mode) spool for the messages which could not be
+# delivered to node red, replayed in order and in batches once the sink is back
+import sqlite3
+import threading
+import time
+
+# Check the disk usage and retention every N appends
+CHECK_EVERY = 100
+
+# Rows deleted at once when the spool exceed the maximum size
+TRIM_BATCH = 100
+
+class Spool(object):
+    def __init__(self, path, maxBytes=50 * 1024 * 1024, retentionSec=7 * 86400):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.retentionSec = retentionSec
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS spool (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "sink TEXT NOT NULL, createdAt REAL NOT NULL, payload TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS spool_sink ON spool (sink, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS spool_created ON spool (createdAt)")
+
+        # Sinks with pending messages, filled lazily from the index, no full spool scan
+        self._pending = {}
+        self._appendCnt = 0
+
+        # Spool counters
+        self.appended = 0
+        self.replayed = 0
+        self.trimmed = 0
+        self.expired = 0
+
+    # Check whether the sink have pending messages
+    def hasPending(self, sink):
+        pending = self._pending.get(sink)
+        if pending == None:
+            with self._lock:
+                row = self._db.execute("SELECT 1 FROM spool WHERE sink = ? LIMIT 1", (sink, )).fetchone()
+            pending = row != None
+            self._pending[sink] = pending
+        return pending
+
+    # Append one undelivered message
+    def append(self, sink, payload):
+        with self._lock:
+            self._db.execute("INSERT INTO spool (sink, createdAt, payload) VALUES (?, ?, ?)", (sink, time.time(), payload))
+            self._pending[sink] = True
+            self.appended += 1
+
+            self._appendCnt += 1
+            if self._appendCnt >= CHECK_EVERY:
+                self._appendCnt = 0
+                self._enforceLimits()
+
+    # Oldest pending messages of the sink, list of (seq, payload)
+    def peekBatch(self, sink, limit=100):
+        with self._lock:
+            rows = self._db.execute("SELECT seq, payload FROM spool WHERE sink = ? ORDER BY seq LIMIT ?", (sink, limit)).fetchall()
+        if len(rows) == 0:
+            self._pending[sink] = False
+        return rows
+
+    # Remove the delivered messages of the sink up to the sequence number
+    def ack(self, sink, seq, count):
+        with self._lock:
+            self._db.execute("DELETE FROM spool WHERE sink = ? AND seq <= ?", (sink, seq))
+            self.replayed += count
+
+    # Replay the pending messages of the sink in order, in batches
+    # send(payload) return True if delivered, stop at the first failure
+    # Return number of replayed messages
+    def replay(self, sink, send, batchSize=100):
+        total = 0
+        while True:
+            rows = self.peekBatch(sink, batchSize)
+            if len(rows) == 0:
+                return total
+
+            lastSeq = None
+            count = 0
+            for (seq, payload) in rows:
+                if send(payload) == False:
+                    break
+                lastSeq = seq
+                count += 1
+
+            if lastSeq != None:
+                self.ack(sink, lastSeq, count)
+                total += count
+
+            # Sink gone again, keep the rest for later
+            if count < len(rows):
+                return total
+
+    # Apply the retention and the maximum disk usage, lock must be held
+    def _enforceLimits(self):
+        if self.retentionSec > 0:
+            cursor = self._db.execute("DELETE FROM spool WHERE createdAt < ?", (time.time() - self.retentionSec, ))
+            self.expired += max(cursor.rowcount, 0)
+
+        # Used pages only, freed pages are reused by the next appends
+        while self.maxBytes > 0 and self._usedBytes() > self.maxBytes:
+            cursor = self._db.execute("DELETE FROM spool WHERE seq IN (SELECT seq FROM spool ORDER BY seq LIMIT ?)", (TRIM_BATCH, ))
+            if cursor.rowcount <= 0:
+                break
+            self.trimmed += cursor.rowcount
+
+        # Pending state may changed, check again from the index on demand
+        self._pending = {}
+
+    def _usedBytes(self):
+        pageCount = self._db.execute("PRAGMA page_count").fetchone()[0]
+        freeCount = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        pageSize = self._db.execute("PRAGMA page_size").fetchone()[0]
+        return (pageCount - freeCount) * pageSize
+
+    def stats(self):
+        with self._lock:
+            usedBytes = self._usedBytes()
+        return {
+            'path' : self.path,
+            'usedBytes' : usedBytes,
+            'maxBytes' : self.maxBytes,
+            'retentionSec' : self.retentionSec,
+            'pendingSinks' : [sink for sink, pending in self._pending.items() if pending],
+            'appended' : self.appended,
+            'replayed' : self.replayed,
+            'trimmed' : self.trimmed,
+            'expired' : self.expired,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,48 @@
+# Transmit scheduler tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from txscheduler import MAX_PAYLOAD
+from txscheduler import TxCoalescer
+from txscheduler import TxScheduler
+from txscheduler import packCoalesced
+
+# Text longer than one mesh packet are rejected at submit, not lost on the scheduler thread
+def test_submit_rejects_oversized_text():
+    scheduler = TxScheduler(lambda item: None)
+    with pytest.raises(ValueError, match="exceeds %d bytes" % (MAX_PAYLOAD)):
+        scheduler.submit('x' * (MAX_PAYLOAD + 1))
+    assert scheduler.submitted == 0
+
+    scheduler.submit('x' * MAX_PAYLOAD)
+    assert scheduler.submitted == 1
+
+# Multi byte characters count by their UTF-8 size
+def test_submit_counts_utf8_bytes():
+    scheduler = TxScheduler(lambda item: None)
+    with pytest.raises(ValueError):
+        scheduler.submit('é' * (MAX_PAYLOAD // 2 + 1))
+
+def test_coalescer_rejects_oversized_text():
+    coalescer = TxCoalescer(TxScheduler(lambda item: None))
+    with pytest.raises(ValueError):
+        coalescer.submit('x' * (MAX_PAYLOAD + 1))
+    assert coalescer.received == 0
+
+# Messages of different sources never share a payload, each source keep its own fair share
+def test_coalescer_keeps_sources_apart():
+    sent = []
+    scheduler = TxScheduler(lambda item: None)
+    scheduler.submit = lambda text, destinationId, channelIndex, wantAck, source, priority: sent.append((source, text))
+    coalescer = TxCoalescer(scheduler, windowSec=10.0)
+    coalescer.submit('a', source='north')
+    coalescer.submit('b', source='south')
+    coalescer.submit('c', source='north')
+    with coalescer._cond:
+        for key in list(coalescer._batches.keys()):
+            coalescer._flush(key)
+    assert sorted(sent) == [('north', packCoalesced(['a', 'c'])), ('south', 'b')]
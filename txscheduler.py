@@ -0,0 +1,371 @@
+# LoRa airtime aware transmit scheduler
+# Every outbound mesh text message go through the scheduler, which estimate
+# the time on air from the modem preset and payload length, enforce the
+# duty cycle budget, serve priority classes and queue fairly per source
+import collections
+import math
+import threading
+import time
+
+# Meshtastic modem presets: (spreading factor, bandwidth [Hz], coding rate 4/x)
+MODEM_PRESETS = {
+    'SHORT_TURBO' : (7, 500000, 5),
+    'SHORT_FAST' : (7, 250000, 5),
+    'SHORT_SLOW' : (8, 250000, 5),
+    'MEDIUM_FAST' : (9, 250000, 5),
+    'MEDIUM_SLOW' : (10, 250000, 5),
+    'LONG_FAST' : (11, 250000, 5),
+    'LONG_MODERATE' : (11, 125000, 8),
+    'LONG_SLOW' : (12, 125000, 8),
+    'VERY_LONG_SLOW' : (12, 62500, 8),
+}
+
+# Meshtastic radio settings
+PREAMBLE_LEN = 16
+# Mesh packet header and protobuf envelope added to the text payload [bytes]
+PACKET_OVERHEAD = 16 + 6
+# Maximum text payload of one mesh packet [bytes]
+MAX_PAYLOAD = 228
+
+# Priority classes, lower value served first
+PRIO_HIGH = 0
+PRIO_NORMAL = 1
+PRIO_LOW = 2
+PRIORITIES = (PRIO_HIGH, PRIO_NORMAL, PRIO_LOW)
+
+# Transmit queue full
+class TxQueueFull(Exception):
+    pass
+
+# Estimate the LoRa time on air of one packet [s] (Semtech SX127x/SX126x formula)
+def timeOnAir(payloadLen, preset='LONG_FAST', overhead=PACKET_OVERHEAD):
+    spreadFactor, bandWidth, codingRate = MODEM_PRESETS[preset]
+
+    symbolTime = (2 ** spreadFactor) / float(bandWidth)
+    # Low data rate optimization are mandatory when symbol time exceed 16 ms
+    lowDataRate = 1 if symbolTime > 0.016 else 0
+
+    payloadBytes = payloadLen + overhead
+    # Explicit header, CRC on
+    numerator = 8 * payloadBytes - 4 * spreadFactor + 28 + 16
+    payloadSymbols = 8 + max(math.ceil(numerator / float(4 * (spreadFactor - 2 * lowDataRate))) * codingRate, 0)
+
+    return (PREAMBLE_LEN + 4.25 + payloadSymbols) * symbolTime
+
+# One outbound transmit request
+# target - radio name the item must be sent on, None - routed by the transmit callback
+class TxItem(object):
+    __slots__ = ('text', 'destinationId', 'channelIndex', 'wantAck', 'source', 'priority', 'airtime', 'queuedAt', 'target')
+
+    def __init__(self, text, destinationId, channelIndex, wantAck, source, priority, airtime, target=None):
+        self.text = text
+        self.destinationId = destinationId
+        self.channelIndex = channelIndex
+        self.wantAck = wantAck
+        self.source = source
+        self.priority = priority
+        self.airtime = airtime
+        self.queuedAt = time.monotonic()
+        self.target = target
+
+# Transmit scheduler
+# transmit(item) are called on the scheduler thread to hand the item to the radio,
+# onError(item, err) are called if transmit raise an exception
+class TxScheduler(object):
+    def __init__(self, transmit, preset='LONG_FAST', dutyCycle=100.0, windowSec=3600.0, maxQueue=500, onError=None):
+        if preset not in MODEM_PRESETS:
+            raise ValueError("Unknown modem preset: %s" % (preset))
+
+        self.transmit = transmit
+        self.onError = onError
+        self.preset = preset
+        self.dutyCycle = dutyCycle
+        self.windowSec = windowSec
+        self.maxQueue = maxQueue
+
+        # Per priority: source -> queue, and the round robin order of sources with pending items
+        self._queues = [{} for prio in PRIORITIES]
+        self._rotation = [collections.deque() for prio in PRIORITIES]
+        self._depth = 0
+        self._cond = threading.Condition()
+
+        # Airtime history inside the duty cycle window: (send time, airtime)
+        self._history = collections.deque()
+        self._airtimeUsed = 0.0
+
+        # Scheduler stats
+        self.submitted = 0
+        self.sent = 0
+        self.rejected = 0
+        self.failed = 0
+        self.totalAirtime = 0.0
+        self.totalWait = 0.0
+        self.maxWait = 0.0
+        self.budgetWaits = 0
+
+    # Airtime budget inside the duty cycle window [s]
+    @property
+    def budget(self):
+        return self.windowSec * self.dutyCycle / 100.0
+
+    # Queue one text message, return the estimated airtime [s]
+    # Raise ValueError if the text do not fit one mesh packet, the radio would refuse it after the queuing
+    def submit(self, text, destinationId='^all', channelIndex=0, wantAck=False, source='gateway', priority=PRIO_NORMAL, target=None):
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown priority: %s" % (priority))
+        textSize = len(text.encode())
+        if textSize > MAX_PAYLOAD:
+            raise ValueError("text exceeds %d bytes" % (MAX_PAYLOAD))
+
+        item = TxItem(text, destinationId, channelIndex, wantAck, source, priority,
+                      timeOnAir(textSize, self.preset), target)
+
+        with self._cond:
+            if self._depth >= self.maxQueue:
+                self.rejected += 1
+                raise TxQueueFull("TX queue full")
+
+            queues = self._queues[priority]
+            sourceQueue = queues.get(source)
+            # Source become active in this priority class
+            if sourceQueue == None:
+                sourceQueue = collections.deque()
+                queues[source] = sourceQueue
+                self._rotation[priority].append(source)
+
+            sourceQueue.append(item)
+            self._depth += 1
+            self.submitted += 1
+            self._cond.notify_all()
+
+        return item.airtime
+
+    # Take the next item: highest priority first, round robin across the sources
+    def _nextItem(self):
+        for prio in PRIORITIES:
+            rotation = self._rotation[prio]
+            if len(rotation) == 0:
+                continue
+
+            source = rotation.popleft()
+            sourceQueue = self._queues[prio][source]
+            item = sourceQueue.popleft()
+
+            # Source still have pending items, move to the end of the round
+            if len(sourceQueue) > 0:
+                rotation.append(source)
+            else:
+                del self._queues[prio][source]
+
+            self._depth -= 1
+            return item
+
+        return None
+
+    # Forget the airtime outside the duty cycle window
+    def _expireHistory(self, now):
+        while len(self._history) > 0 and self._history[0][0] <= now - self.windowSec:
+            sentAt, airtime = self._history.popleft()
+            self._airtimeUsed -= airtime
+
+    # Time to wait until the airtime are available inside the budget [s]
+    def _budgetWait(self, airtime, now):
+        if self.dutyCycle >= 100.0:
+            return 0.0
+
+        self._expireHistory(now)
+        excess = self._airtimeUsed + airtime - self.budget
+        if excess <= 0:
+            return 0.0
+
+        # Walk the history until enough airtime expire
+        for (sentAt, usedAirtime) in self._history:
+            excess -= usedAirtime
+            if excess <= 0:
+                return max(sentAt + self.windowSec - now, 0.0)
+
+        return self.windowSec
+
+    # Scheduler loop, never return, run it in a dedicated thread
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._depth > 0)
+                item = self._nextItem()
+
+            # Wait for the duty cycle budget
+            with self._cond:
+                waitSec = self._budgetWait(item.airtime, time.monotonic())
+            if waitSec > 0:
+                self.budgetWaits += 1
+                time.sleep(waitSec)
+
+            now = time.monotonic()
+            waited = now - item.queuedAt
+            self.totalWait += waited
+            self.maxWait = max(self.maxWait, waited)
+
+            try:
+                self.transmit(item)
+            except Exception as err:
+                self.failed += 1
+                if self.onError != None:
+                    self.onError(item, err)
+                continue
+
+            self.sent += 1
+            self.totalAirtime += item.airtime
+            with self._cond:
+                self._history.append((now, item.airtime))
+                self._airtimeUsed += item.airtime
+
+            # Radio busy for the airtime of this packet, pace the next one
+            time.sleep(item.airtime)
+
+    # Queue depth and wait time stats
+    def stats(self):
+        with self._cond:
+            depthByPrio = [sum([len(q) for q in queues.values()]) for queues in self._queues]
+            self._expireHistory(time.monotonic())
+            airtimeUsed = self._airtimeUsed
+
+        return {
+            'preset' : self.preset,
+            'dutyCycle' : self.dutyCycle,
+            'windowSec' : self.windowSec,
+            'budgetSec' : round(self.budget, 3),
+            'airtimeUsedSec' : round(airtimeUsed, 3),
+            'depth' : self._depth,
+            'depthByPriority' : {'high' : depthByPrio[PRIO_HIGH], 'normal' : depthByPrio[PRIO_NORMAL], 'low' : depthByPrio[PRIO_LOW]},
+            'submitted' : self.submitted,
+            'sent' : self.sent,
+            'rejected' : self.rejected,
+            'failed' : self.failed,
+            'budgetWaits' : self.budgetWaits,
+            'totalAirtimeSec' : round(self.totalAirtime, 3),
+            'avgWaitSec' : round(self.totalWait / self.sent, 3) if self.sent > 0 else 0.0,
+            'maxWaitSec' : round(self.maxWait, 3),
+        }
+
+# Coalesced payload format
+# Many short text messages packed into one payload: RS + text1 + RS + text2 ...
+# A payload not starting with RS are one plain text message
+COALESCE_SEP = '\x1e'
+
+# Split a received text payload back into the individual text messages
+def splitCoalesced(text):
+    if text.startswith(COALESCE_SEP):
+        return text[1:].split(COALESCE_SEP)
+    return [text]
+
+# Pack the text messages into one payload
+def packCoalesced(texts):
+    if len(texts) == 1:
+        return texts[0]
+    return COALESCE_SEP + COALESCE_SEP.join(texts)
+
+# Pending coalesced payload for one (destination, channel, priority, source)
+class CoalesceBatch(object):
+    __slots__ = ('texts', 'size', 'wantAck', 'source', 'deadline')
+
+    def __init__(self, source, deadline):
+        self.texts = []
+        # Packed size [bytes], leading separator included
+        self.size = 1
+        self.wantAck = False
+        self.source = source
+        self.deadline = deadline
+
+# Coalescing stage in front of the transmit scheduler
+# Text messages bound for the same destination and channel inside the window
+# are packed into one payload up to the maximum payload size
+# Only the messages of one source share a payload, the scheduler keep charging each source its own airtime
+class TxCoalescer(object):
+    def __init__(self, scheduler, windowSec=0.2, maxPayload=MAX_PAYLOAD):
+        self.scheduler = scheduler
+        self.windowSec = windowSec
+        self.maxPayload = maxPayload
+
+        self._batches = {}
+        self._cond = threading.Condition()
+
+        # Coalescing stats
+        self.received = 0
+        self.payloads = 0
+        self.dropped = 0
+
+    # Add one text message, raise an exception if the transmit queue are full or the text do not fit one mesh packet
+    # A coalesced payload refused by the full transmit queue are counted as dropped
+    def submit(self, text, destinationId='^all', channelIndex=0, wantAck=False, source='gateway', priority=PRIO_NORMAL):
+        textSize = len(text.encode()) + 1
+        if textSize - 1 > MAX_PAYLOAD:
+            raise ValueError("text exceeds %d bytes" % (MAX_PAYLOAD))
+
+        # Message too long to share a payload, or ambiguous for the splitter, send it alone
+        if textSize > self.maxPayload or COALESCE_SEP in text:
+            self.scheduler.submit(text, destinationId, channelIndex, wantAck, source, priority)
+            self.received += 1
+            self.payloads += 1
+            return
+
+        key = (destinationId, channelIndex, priority, source)
+        with self._cond:
+            batch = self._batches.get(key)
+
+            # No room left in the pending payload, send it first
+            # The pending payload is lost if the transmit queue are full, the new message start the next one
+            if batch != None and batch.size + textSize > self.maxPayload:
+                batch = None
+                try:
+                    self._flush(key)
+                except TxQueueFull:
+                    self.dropped += 1
+
+            if batch == None:
+                batch = CoalesceBatch(source, time.monotonic() + self.windowSec)
+                self._batches[key] = batch
+                self._cond.notify_all()
+
+            batch.texts.append(text)
+            batch.size += textSize
+            batch.wantAck = batch.wantAck or wantAck
+            self.received += 1
+
+    # Hand the pending payload to the transmit scheduler, lock must be held
+    # The payload leave the pending batches even if the scheduler refuse it
+    def _flush(self, key):
+        batch = self._batches.pop(key)
+        destinationId, channelIndex, priority, source = key
+        self.scheduler.submit(packCoalesced(batch.texts), destinationId, channelIndex, batch.wantAck, source, priority)
+        self.payloads += 1
+
+    # Coalescing loop, never return, run it in a dedicated thread
+    def run(self):
+        while True:
+            with self._cond:
+                # Wait for the earliest window to close
+                if len(self._batches) == 0:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                deadline = min([batch.deadline for batch in self._batches.values()])
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+
+                for key in [key for key, batch in self._batches.items() if batch.deadline <= now]:
+                    try:
+                        self._flush(key)
+                    except TxQueueFull:
+                        self.dropped += 1
+
+    def stats(self):
+        return {
+            'windowSec' : self.windowSec,
+            'maxPayload' : self.maxPayload,
+            'received' : self.received,
+            'payloads' : self.payloads,
+            'dropped' : self.dropped,
+            'pending' : len(self._batches),
+        }